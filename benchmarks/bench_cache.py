@@ -0,0 +1,91 @@
+"""
+每次访问 access_token 的开销，缓存中已有未过期的 token。
+各后端的数据不经过进程内一级缓存，最后一行为一级缓存命中时的开销。
+
+    $ python benchmarks/bench_cache.py
+"""
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wework.base import BaseWechatAPI
+from wework.cache import MemoryCache, SQLiteCache, FileCache, DjangoCache
+from wework.helpers import BaseHelper
+from wework.settings import Settings
+
+
+class LegacyFileHelper(BaseHelper):
+    """旧版本 DjangoHelper 的实现，每次读取都打开并解析整个文件"""
+    filename = None
+
+    @classmethod
+    def cache_get(cls, key):
+        try:
+            with open(cls.filename, 'r') as f:
+                data = f.read()
+                data = {} if len(data) == 0 else json.loads(data)
+                return data.get(key)
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def cache_set(cls, key, value, **kwargs):
+        try:
+            with open(cls.filename, 'r') as f:
+                data = f.read()
+                data = {} if len(data) == 0 else json.loads(data)
+        except FileNotFoundError:
+            data = {}
+        with open(cls.filename, 'w+') as f:
+            data[key] = value
+            f.write(json.dumps(data))
+
+
+class API(BaseWechatAPI):
+    def __init__(self, helper, l1=False):
+        self.settings = Settings({'HELPER': helper, 'L1_CACHE': l1})
+        self._global_access_token = {'name': ('bench_access_token', 'bench_expires_time')}
+
+    def _get_access_token(self):
+        return 'token', 7200
+
+
+def django_cache():
+    try:
+        import django
+        from django.conf import settings
+    except ImportError:
+        return None
+    settings.configure(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    django.setup()
+    return DjangoCache()
+
+
+def main(number=20000):
+    directory = tempfile.mkdtemp()
+    LegacyFileHelper.filename = os.path.join(directory, 'legacy.txt')
+    backends = [
+        ('legacy file', LegacyFileHelper),
+        ('memory', MemoryCache()),
+        ('sqlite', SQLiteCache(os.path.join(directory, 'cache.sqlite3'))),
+        ('file', FileCache(os.path.join(directory, 'wework_cache.txt'))),
+        ('django locmem', django_cache()),
+        ('file + L1', FileCache(os.path.join(directory, 'wework_cache.txt'))),
+    ]
+    for name, backend in backends:
+        if backend is None:
+            print('{:<15} skipped'.format(name))
+            continue
+        helper = backend if isinstance(backend, type) else type('Helper', (BaseHelper, ), {'cache': backend})
+        api = API(helper, None if name.endswith('L1') else False)
+        api.access_token
+        seconds = timeit.timeit(lambda: api.access_token, number=number)
+        print('{:<15} {:>8.2f} us/access'.format(name, seconds / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+拉取 100000 个成员的通讯录：根部门 fetch_child=1 一次拉取全部成员，与 DirectoryCrawler 按部门并发拉取比较。
+请求发送到本地模拟的接口，每个请求有 latency 秒的固定延迟，加上每个成员 per_user 秒的处理时间。
+
+    $ python benchmarks/bench_crawler.py
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wework import CorpAPI, Transport, DirectoryCrawler
+from wework.registry import TokenRegistry
+
+
+def build(department_count=1000, user_count=100000):
+    departments = [{'id': 1, 'name': '公司', 'parentid': 0, 'order': 0}]
+    departments += [{'id': i, 'name': '部门{}'.format(i), 'parentid': 1, 'order': 0}
+                    for i in range(2, department_count + 1)]
+    users = {d['id']: [] for d in departments}
+    for i in range(user_count):
+        # 每 10 个成员中有 1 个同时属于两个部门
+        ids = [i % department_count + 1]
+        if i % 10 == 0:
+            ids.append((i + 7) % department_count + 1)
+        user = {'userid': 'user{}'.format(i), 'name': '成员{}'.format(i), 'department': ids,
+                'is_leader_in_dept': [0] * len(ids), 'mobile': '138{:08d}'.format(i), 'status': 1}
+        for id in ids:
+            users[id].append(user)
+    return departments, users
+
+
+def create_server(departments, users, latency, per_user):
+    def dumps(data):
+        return json.dumps(dict(data, errcode=0, errmsg='ok'), ensure_ascii=False).encode('utf-8')
+
+    responses = {id: (len(items), dumps({'userlist': items})) for id, items in users.items()}
+    everyone = {u['userid']: u for items in users.values() for u in items}
+    responses['all'] = (len(everyone), dumps({'userlist': list(everyone.values())}))
+    department_list = dumps({'department': departments})
+    token = dumps({'access_token': 'TOKEN', 'expires_in': 7200})
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            query = parse_qs(url.query)
+            count = 0
+            if url.path == '/cgi-bin/gettoken':
+                body = token
+            elif url.path == '/cgi-bin/department/list':
+                body = department_list
+            else:
+                if query['fetch_child'] == ['1']:
+                    count, body = responses['all']
+                else:
+                    count, body = responses[int(query['department_id'][0])]
+            time.sleep(latency + count * per_user)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+
+
+class LocalTransport(Transport):
+    """把企业微信的接口地址换成本地的模拟服务"""
+    def __init__(self, base_url, **kwargs):
+        super(LocalTransport, self).__init__(**kwargs)
+        self.base_url = base_url
+
+    def request(self, method, url, **kwargs):
+        url = url.replace('https://qyapi.weixin.qq.com', self.base_url)
+        return super(LocalTransport, self).request(method, url, **kwargs)
+
+
+def main(latency=0.02, per_user=2e-6):
+    departments, users = build()
+    server = create_server(departments, users, latency, per_user)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+    def create_api(pool_size):
+        transport = LocalTransport(base_url, pool_connections=1, pool_maxsize=pool_size)
+        api = CorpAPI('corp', 'secret', 1, transport, TokenRegistry())
+        api.access_token
+        return api
+
+    api = create_api(1)
+    start = time.perf_counter()
+    count = len(api.get_department_user_detail_list(1, fetch_child=True))
+    elapsed = time.perf_counter() - start
+    print('{:<18} {:>7} users {:>8.2f} s  first user {:>8.3f} s'.format('fetch_child', count, elapsed, elapsed))
+
+    for workers in (1, 8, 32):
+        api = create_api(workers)
+        first = []
+
+        def callback(user):
+            if not first:
+                first.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        count = DirectoryCrawler(api, max_workers=workers).crawl(callback)
+        elapsed = time.perf_counter() - start
+        print('{:<18} {:>7} users {:>8.2f} s  first user {:>8.3f} s'.format(
+            'crawler x{}'.format(workers), count, elapsed, first[0]))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+DirectoryIndex 的查询开销，模拟 2000 个部门（每个部门 10 个子部门）、80000 个成员的企业。
+
+    $ python benchmarks/bench_directory.py
+"""
+import os
+import random
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wework.directory import DirectorySnapshot
+
+
+def build(department_count=2000, user_count=80000):
+    departments = [{'id': 1, 'parentid': 0}]
+    departments += [{'id': i, 'parentid': (i - 2) // 10 + 1} for i in range(2, department_count + 1)]
+    users = []
+    for i in range(user_count):
+        ids = random.sample(range(1, department_count + 1), 2)
+        users.append({'userid': 'user{}'.format(i), 'department': ids, 'is_leader_in_dept': [int(i % 50 == 0), 0]})
+    return departments, users
+
+
+def main(number=100000):
+    departments, users = build()
+    start = time.perf_counter()
+    snapshot = DirectorySnapshot(departments, users)
+    print('build                      {:>8.1f} ms'.format((time.perf_counter() - start) * 1e3))
+    cases = [
+        ('is_leader', lambda: snapshot.is_leader('user1', 1500)),
+        ('is_in_department', lambda: snapshot.is_in_department('user1', 2)),
+        ('department users', lambda: snapshot.get_department_users(20)),
+        ('recursive users (cached)', lambda: snapshot.get_department_users(2, recursive=True)),
+    ]
+    for name, fn in cases:
+        seconds = timeit.timeit(fn, number=number)
+        print('{:<26} {:>8.2f} us'.format(name, seconds / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+解析成员列表响应的耗时与内存峰值：一次解析为 list（json 与 orjson）与 iter_json_array 边读边解析。
+响应体按 64KB 分块提供，与 requests 的 iter_content 相同，响应体本身不计入内存峰值。
+耗时与内存峰值分开测量，tracemalloc 会明显拖慢解析。
+
+    $ python benchmarks/bench_jsonstream.py
+"""
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wework import jsonstream
+from wework.jsonstream import iter_json_array
+
+
+def build(user_count):
+    users = [{
+        'userid': 'user{}'.format(i), 'name': '成员{}'.format(i), 'department': [i % 1000 + 1, 1],
+        'order': [0, 0], 'position': '职务{}'.format(i % 50), 'mobile': '138{:08d}'.format(i),
+        'gender': '1', 'email': 'user{}@example.com'.format(i), 'is_leader_in_dept': [0, 0], 'status': 1,
+        'avatar': 'https://wework.qpic.cn/wwhead/{}/0'.format(i),
+        'extattr': {'attrs': [{'type': 0, 'name': '工号', 'text': {'value': str(i)}}]},
+    } for i in range(user_count)]
+    return json.dumps({'errcode': 0, 'errmsg': 'ok', 'userlist': users}, ensure_ascii=False).encode('utf-8')
+
+
+def chunks(body, size=64 * 1024):
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+
+def full(body, loads):
+    users = loads(b''.join(chunks(body)))['userlist']
+    return len(users)
+
+
+def streaming(body):
+    fields, items = iter_json_array(chunks(body), 'userlist')
+    count = 0
+    for _ in items:
+        count += 1
+    return count
+
+
+def measure(fn):
+    gc.collect()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    for user_count in (10000, 50000):
+        body = build(user_count)
+        print('{} users, {:.1f} MB'.format(user_count, len(body) / 1024 / 1024))
+        cases = [('json full', lambda: full(body, json.loads))]
+        if jsonstream.orjson is not None:
+            cases.append(('orjson full', lambda: full(body, jsonstream.orjson.loads)))
+        cases.append(('streaming', lambda: streaming(body)))
+        for name, fn in cases:
+            elapsed, peak = measure(fn)
+            print('  {:<12} {:>8.1f} ms  peak {:>7.1f} MB'.format(name, elapsed * 1e3, peak / 1024 / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+进程启动时加载通讯录：在内存中建立 DirectorySnapshot 与通过 mmap 打开 dump_snapshot 写入的文件。
+企业有 2000 个部门、80000 个成员，不包含调用接口的时间。
+
+    $ python benchmarks/bench_mapped.py
+"""
+import gc
+import os
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_directory import build
+from wework.directory import DirectorySnapshot
+from wework.mapped import MappedSnapshot, dump_snapshot
+
+
+def measure(fn):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, elapsed, size
+
+
+def main(number=10000):
+    departments, users = build()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'directory.snapshot')
+        start = time.perf_counter()
+        dump_snapshot(DirectorySnapshot(departments, users), path)
+        print('dump                   {:>8.1f} ms  {:>6.1f} MB on disk'.format(
+            (time.perf_counter() - start) * 1e3, os.path.getsize(path) / 1024 / 1024))
+
+        snapshot, elapsed, size = measure(lambda: DirectorySnapshot(departments, users))
+        print('DirectorySnapshot      {:>8.1f} ms  {:>6.1f} MB heap'.format(elapsed * 1e3, size / 1024 / 1024))
+        mapped, elapsed, size = measure(lambda: MappedSnapshot(path))
+        print('MappedSnapshot         {:>8.1f} ms  {:>6.1f} MB heap'.format(elapsed * 1e3, size / 1024 / 1024))
+
+        cases = [
+            ('get_user', lambda s: s.get_user('user12345')),
+            ('is_leader', lambda s: s.is_leader('user1', 1500)),
+            ('is_in_department', lambda s: s.is_in_department('user1', 2)),
+            ('department users', lambda s: s.get_department_users(20)),
+        ]
+        for name, fn in cases:
+            memory = timeit.timeit(lambda: fn(snapshot), number=number) / number * 1e6
+            disk = timeit.timeit(lambda: fn(mapped), number=number) / number * 1e6
+            print('{:<22} {:>8.2f} us  mmap {:>8.2f} us'.format(name, memory, disk))
+        mapped.close()
+
+
+if __name__ == '__main__':
+    main()
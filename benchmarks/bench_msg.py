@@ -0,0 +1,38 @@
+"""
+构造一次 message/send 请求体的开销：校验后用 json.dumps 序列化整个消息，与 MessageTemplate.render 只序列化变化的字段。
+
+    $ python benchmarks/bench_msg.py
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wework.msg import MSG
+from wework.template import MessageTemplate
+
+
+def main(number=50000):
+    articles = [{'title': '标题{}'.format(i), 'thumb_media_id': 'media', 'content': '<p>正文</p>' * 200}
+                for i in range(4)]
+    msg = MSG('token', 1, object())
+
+    def build():
+        data = {'articles': articles[:1] + [dict(articles[1], title='你好 UserID1')] + articles[2:]}
+        msg.check_msg('mpnews', data)
+        return json.dumps(msg._get_send_data('mpnews', data, 'UserID1', None, None, 0)).encode('utf-8')
+
+    template = MessageTemplate('mpnews', {'articles': articles}, 1, fields={'title': 'articles.1.title'})
+
+    def render():
+        return template.render(touser='UserID1', title='你好 UserID1')
+
+    for name, fn in (('check + dumps', build), ('template', render)):
+        seconds = timeit.timeit(fn, number=number)
+        print('{:<15} {:>8.2f} us/msg'.format(name, seconds / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
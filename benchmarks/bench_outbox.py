@@ -0,0 +1,62 @@
+"""
+发件箱 enqueue 的延迟与后台线程的发送吞吐量，发送使用模拟的 HTTP 会话，每次请求耗时 latency 秒。
+
+    $ python benchmarks/bench_outbox.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wework.msg import MSG
+from wework.outbox import Outbox
+from wework.transport import Transport
+
+
+class Response(object):
+    def json(self):
+        return {'errcode': 0}
+
+
+class Session(object):
+    def __init__(self, latency):
+        self.latency = latency
+
+    def request(self, method, url, **kwargs):
+        time.sleep(self.latency)
+        return Response()
+
+
+class API(object):
+    def __init__(self, latency):
+        self.transport = Transport(session=Session(latency))
+
+    @property
+    def msg(self):
+        return MSG('token', 1, self.transport)
+
+
+def main(number=5000, latency=0.005):
+    path = os.path.join(tempfile.mkdtemp(), 'outbox.sqlite3')
+    for workers in (1, 4, 16):
+        if os.path.exists(path):
+            os.remove(path)
+        outbox = Outbox(API(latency), path, workers=workers, poll_interval=0.01)
+        start = time.perf_counter()
+        for i in range(number):
+            outbox.enqueue('text', {'content': 'hello'}, touser='user{}'.format(i))
+        enqueue = (time.perf_counter() - start) / number
+
+        start = time.perf_counter()
+        with outbox:
+            while outbox.pending():
+                time.sleep(0.01)
+        seconds = time.perf_counter() - start
+        print('workers={:<3} enqueue {:>6.1f} us/msg  drain {:>8.0f} msg/s'.format(
+            workers, enqueue * 1e6, number / seconds))
+
+
+if __name__ == '__main__':
+    main()
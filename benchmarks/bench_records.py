@@ -0,0 +1,67 @@
+"""
+100000 个成员保存为 dict 与 UserRecord 的内存占用，以及读取字段的耗时。
+dict 为 json.loads 接口响应得到的形式，每个成员都有独立的字符串。
+
+    $ python benchmarks/bench_records.py
+"""
+import gc
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wework.records import compact
+from wework.wechat import WechatUser
+
+
+def build(user_count=100000, department_count=1000):
+    users = []
+    for i in range(user_count):
+        users.append({
+            'userid': 'user{}'.format(i), 'name': '成员{}'.format(i),
+            'department': [i % department_count + 1, 1], 'order': [0, 0],
+            'position': '职务{}'.format(i % 50), 'mobile': '138{:08d}'.format(i), 'gender': str(i % 2 + 1),
+            'email': 'user{}@example.com'.format(i), 'is_leader_in_dept': [0, 0], 'status': 1,
+            'avatar': 'https://wework.qpic.cn/wwhead/{}/0'.format(i), 'main_department': i % department_count + 1,
+            'extattr': {'attrs': [{'type': 0, 'name': '工号', 'text': {'value': str(i)}}]},
+            'external_profile': {'external_corp_name': '企业简称', 'external_attr': []},
+        })
+    # 与接口响应一样，每个字符串都是独立的对象
+    return json.dumps({'userlist': users}, ensure_ascii=False)
+
+
+def measure(fn):
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def main(number=1000000):
+    body = build()
+    users, dict_size = measure(lambda: json.loads(body)['userlist'])
+    (_, records, _), record_size = measure(lambda: compact([], json.loads(body)['userlist']))
+    print('dict            {:>8.1f} MB'.format(dict_size / 1024 / 1024))
+    print('UserRecord      {:>8.1f} MB'.format(record_size / 1024 / 1024))
+
+    user, record, wrapped = users[100], records[100], WechatUser(users[100])
+    cases = [
+        ('dict[key]', lambda: user['name']),
+        ('WechatUser.attr', lambda: wrapped.name),
+        ('UserRecord.attr', lambda: record.name),
+        ('UserRecord[key]', lambda: record['name']),
+        ('UserRecord.extattr', lambda: record.extattr),
+    ]
+    for name, fn in cases:
+        n = number // 100 if name == 'UserRecord.extattr' else number
+        seconds = timeit.timeit(fn, number=n)
+        print('{:<18} {:>8.3f} us'.format(name, seconds / n * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+并发调用 get_department_list：不使用缓存、使用 ResponseCache。
+请求发送到模拟的 session，每个请求有 latency 秒的延迟。
+
+    $ python benchmarks/bench_respcache.py
+"""
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wework import CorpAPI, Transport, ResponseCache
+
+
+class FakeResponse(object):
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class LatencySession(object):
+    def __init__(self, latency):
+        self.latency = latency
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        with self.lock:
+            self.count += 1
+        time.sleep(self.latency)
+        departments = [{'id': i, 'name': 'dept{}'.format(i), 'parentid': i // 10} for i in range(1, 1000)]
+        return FakeResponse({'errcode': 0, 'errmsg': 'ok', 'department': departments})
+
+
+def run(api, calls, workers):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as executor:
+        list(executor.map(lambda _: api.get_department_list(), range(calls)))
+    return time.perf_counter() - start
+
+
+def main(calls=2000, workers=32, latency=0.02):
+    session = LatencySession(latency)
+    api = CorpAPI.new('token', 1, transport=Transport(session=session))
+    api.corp_id = 'corp'
+
+    for name, cache in (('no cache', None), ('ResponseCache', ResponseCache())):
+        api.response_cache = cache
+        session.count = 0
+        seconds = run(api, calls, workers)
+        print('{:<16} {:>8.1f} ms {:>6} requests'.format(name, seconds * 1e3, session.count))
+
+    api.response_cache.invalidate('corp', 'department/list')
+    session.count = 0
+    seconds = run(api, calls, workers)
+    print('{:<16} {:>8.1f} ms {:>6} requests'.format('after invalidate', seconds * 1e3, session.count))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+上传 20MB 文件时的内存峰值：requests 的 files 参数会在内存中拼出完整的请求体，
+MultipartEncoder 按块读取文件并发送。每种方式在单独的子进程中运行，发送到本地的 HTTP 服务。
+
+    $ python benchmarks/bench_upload.py
+"""
+import importlib
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        while length:
+            length -= len(self.rfile.read(min(length, 1024 * 1024)))
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 的单位为字节，Linux 为 KB
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+
+def upload(mode, url, path):
+    import requests
+    from wework.multipart import MultipartEncoder
+    # 导入 wework 后再记录基线，只比较上传本身的开销
+    importlib.import_module('wework.msg')
+    baseline = peak_rss_mb()
+    with open(path, 'rb') as f:
+        if mode == 'files':
+            requests.post(url, files={'media': ('video.mp4', f)})
+        else:
+            encoder = MultipartEncoder('media', f, 'video.mp4')
+            requests.post(url, data=encoder, headers=encoder.headers)
+    print('{:<10} peak rss +{:>6.1f} MB'.format(mode, peak_rss_mb() - baseline))
+
+
+def main(size=20 * 1024 * 1024):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+    with tempfile.NamedTemporaryFile() as f:
+        f.write(os.urandom(size))
+        f.flush()
+        for mode in ('files', 'streaming'):
+            subprocess.run([sys.executable, __file__, mode, url, f.name], check=True)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4:
+        upload(*sys.argv[1:])
+    else:
+        main()
@@ -0,0 +1,58 @@
+"""
+为 1000 个 userid 获取成员详情：逐个调用 get_user_detail 与 get_users 并发请求、读取缓存。
+请求发送到模拟的 session，每个请求有 latency 秒的延迟。
+
+    $ python benchmarks/bench_users.py
+"""
+import os
+import sys
+import time
+from urllib.parse import urlsplit, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wework import CorpAPI, Transport, UserCache
+
+
+class FakeResponse(object):
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class LatencySession(object):
+    def __init__(self, latency):
+        self.latency = latency
+
+    def request(self, method, url, **kwargs):
+        time.sleep(self.latency)
+        userid = parse_qs(urlsplit(url).query)['userid'][0]
+        return FakeResponse({'errcode': 0, 'errmsg': 'ok', 'userid': userid, 'name': userid})
+
+
+def main(count=1000, latency=0.01):
+    api = CorpAPI.new('token', 1, transport=Transport(session=LatencySession(latency)))
+    api.corp_id = 'corp'
+    userids = ['user{}'.format(i % (count // 2)) for i in range(count)]
+
+    start = time.perf_counter()
+    for userid in userids:
+        api.get_user_detail(userid)
+    print('{:<28} {:>8.1f} ms'.format('get_user_detail loop', (time.perf_counter() - start) * 1e3))
+
+    api.user_cache = UserCache()
+    for workers in (8, 32):
+        api.user_cache.cache.clear()
+        start = time.perf_counter()
+        api.get_users(userids, max_workers=workers)
+        print('{:<28} {:>8.1f} ms'.format('get_users x{}'.format(workers), (time.perf_counter() - start) * 1e3))
+    start = time.perf_counter()
+    results = api.get_users(userids)
+    assert all(r.cached for r in results)
+    print('{:<28} {:>8.1f} ms'.format('get_users cached', (time.perf_counter() - start) * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -8,8 +8,9 @@ setup(
     description='dead simple work wechat sdk',
     author='Quseit',
     author_email='river@quseit.com',
-    packages=['wework'],
+    packages=['wework', 'wework.helpers', 'wework.wxcrypt', 'wework.aio'],
     include_package_data=True,
     license='Apache License',
     install_requires=('requests', ),
+    extras_require={'async': ('aiohttp', ), 'fast': ('orjson', )},
 )
\ No newline at end of file
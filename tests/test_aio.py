@@ -0,0 +1,91 @@
+import asyncio
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from wework.aio import AsyncCorpAPI, AsyncMSG, AsyncTransport
+from wework.ierror import APIValueError
+from wework.registry import TokenRegistry
+
+
+class FakeAsyncTransport(AsyncTransport):
+    def __init__(self, data, delay=0):
+        super().__init__()
+        self.data = data
+        self.delay = delay
+        self.calls = []
+
+    async def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        await asyncio.sleep(self.delay)
+        return dict(self.data)
+
+
+class JSONHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = json.dumps({'errcode': 0, 'errmsg': 'ok', 'taglist': [{'tagid': 1, 'tagname': '标签'}]}).encode()
+        self.send_response(200)
+        # 企业微信部分接口返回 text/plain
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalAsyncTransport(AsyncTransport):
+    """把请求发送到本地的 server，经过 aiohttp 的连接池与响应解析"""
+    def __init__(self, port):
+        super().__init__()
+        self.port = port
+
+    async def request(self, method, url, **kwargs):
+        url = url.replace('https://qyapi.weixin.qq.com', 'http://127.0.0.1:{}'.format(self.port))
+        return await super().request(method, url, **kwargs)
+
+
+class TestAsyncTransport(unittest.TestCase):
+    def test_request(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), JSONHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        transport = LocalAsyncTransport(server.server_address[1])
+        api = AsyncCorpAPI.new('token', 1, transport=transport)
+
+        async def main():
+            try:
+                return await api.get_tag_list()
+            finally:
+                await transport.close()
+        try:
+            self.assertEqual(asyncio.run(main()), [{'tagid': 1, 'tagname': '标签'}])
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TestAsyncCorpAPI(unittest.TestCase):
+    def test_get_tag_list(self):
+        t = FakeAsyncTransport({'errcode': 0, 'access_token': 'token', 'expires_in': 7200, 'taglist': [1]})
+        api = AsyncCorpAPI('corp', 'secret', 1, transport=t, registry=TokenRegistry())
+        self.assertEqual(asyncio.run(api.get_tag_list()), [1])
+        self.assertIn('access_token=token', t.calls[-1][1])
+
+    def test_concurrent_send(self):
+        t = FakeAsyncTransport({'errcode': 0}, delay=0.01)
+        msg = AsyncMSG('token', 1, transport=t)
+        msg.touser = ['a', 'b']
+
+        async def main():
+            return await asyncio.gather(*[msg.send('text', {'content': 'hi'}) for _ in range(1000)])
+        results = asyncio.run(main())
+        self.assertEqual(len(results), 1000)
+        self.assertEqual(t.calls[0][2]['json']['touser'], 'a|b')
+
+    def test_errcode(self):
+        msg = AsyncMSG('token', 1, transport=FakeAsyncTransport({'errcode': 40013}))
+        msg.touser = 'a'
+        with self.assertRaises(APIValueError):
+            asyncio.run(msg.send('text', {'content': 'hi'}))
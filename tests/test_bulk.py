@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import unittest
+from wework.aio import AsyncMSG
+from wework.bulk import iter_batches
+from wework.ierror import SendMsgError
+from wework.msg import MSG
+from wework.retry import NO_RETRY
+from wework.transport import Transport
+from tests.test_aio import FakeAsyncTransport
+from tests.test_retry import FakeResponse
+
+
+class RecordingSession(object):
+    """记录每次发送的接收者，touser 中包含 fail 时返回错误，以 x 开头的成员视为无效"""
+    def __init__(self):
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def request(self, method, url, json=None, **kwargs):
+        with self.lock:
+            self.batches.append(json)
+        users = (json['touser'] or '').split('|')
+        if 'fail' in users:
+            return FakeResponse({'errcode': 81013, 'errmsg': 'user & party & tag all invalid'})
+        return FakeResponse({'errcode': 0, 'invaliduser': '|'.join(u for u in users if u.startswith('x'))})
+
+
+class TestBatches(unittest.TestCase):
+    def test_iter_batches(self):
+        batches = list(iter_batches(('u%d' % i for i in range(2500)), range(150), 'a|b'))
+        self.assertEqual(len(batches), 3)
+        self.assertEqual(len(batches[0][0].split('|')), 1000)
+        self.assertEqual(len(batches[2][0].split('|')), 500)
+        self.assertEqual(batches[0][1].count('|'), 99)
+        self.assertEqual(batches[1][1].count('|'), 49)
+        self.assertEqual(batches[0][2], 'a|b')
+        self.assertIsNone(batches[1][2])
+        self.assertIsNone(batches[2][1])
+
+
+class TestSendBulk(unittest.TestCase):
+    def test_send_bulk(self):
+        session = RecordingSession()
+        msg = MSG('token', 1, transport=Transport(session=session, retry_policy=NO_RETRY))
+        users = ['u%d' % i for i in range(4500)] + ['x1', 'x2']
+        result = msg.send_bulk('text', {'content': 'hi'}, users=iter(users), max_workers=3)
+        self.assertEqual(len(session.batches), 5)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.invaliduser, ['x1', 'x2'])
+        self.assertEqual([b.index for b in result.batches], list(range(5)))
+        sent = [u for batch in session.batches for u in batch['touser'].split('|')]
+        self.assertEqual(sorted(sent), sorted(users))
+        self.assertTrue(all(batch['agentid'] == 1 for batch in session.batches))
+
+    def test_partial_failure(self):
+        session = RecordingSession()
+        msg = MSG('token', 1, transport=Transport(session=session, retry_policy=NO_RETRY))
+        users = ['u%d' % i for i in range(1000)] + ['fail', 'x1']
+        result = msg.send_bulk('text', {'content': 'hi'}, users=users)
+        self.assertFalse(result.ok)
+        self.assertEqual([b.index for b in result.failed], [1])
+        self.assertEqual(result.invaliduser, [])
+
+    def test_check(self):
+        msg = MSG('token', 1, transport=Transport(session=RecordingSession()))
+        with self.assertRaises(SendMsgError):
+            msg.send_bulk('text', {'content': 'hi'})
+        with self.assertRaises(SendMsgError):
+            msg.send_bulk('text', {}, users=['a'])
+
+    def test_async(self):
+        t = FakeAsyncTransport({'errcode': 0, 'invalidparty': '3'}, delay=0.01)
+        msg = AsyncMSG('token', 1, transport=t)
+        result = asyncio.run(msg.send_bulk('text', {'content': 'hi'}, users=range(2001), parties=[1, 2, 3]))
+        self.assertEqual(len(t.calls), 3)
+        self.assertEqual(result.invalidparty, ['3', '3', '3'])
+        self.assertEqual(t.calls[0][2]['json']['toparty'], '1|2|3')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from wework import settings
+from wework.cache import MemoryCache, SQLiteCache, FileCache, create_cache
+from wework.helpers import BaseHelper
+
+
+class CacheTestMixin(object):
+    def test_get_set(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.set('a', {'b': 1})
+        self.assertEqual(self.cache.get('a'), {'b': 1})
+        self.cache.delete('a')
+        self.assertEqual(self.cache.get('a', 'default'), 'default')
+
+    def test_ttl(self):
+        self.cache.set('a', 1, ttl=0.05)
+        self.cache.set('b', 2)
+        self.assertEqual(self.cache.get('a'), 1)
+        time.sleep(0.06)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('b'), 2)
+
+    def test_many(self):
+        self.cache.set_many({'a': 1, 'b': 'x'}, ttl=10)
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 'x'})
+
+    def test_concurrent_set(self):
+        threads = [threading.Thread(target=self.cache.set, args=('k{}'.format(i), i)) for i in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(self.cache.get_many(['k{}'.format(i) for i in range(20)])), 20)
+
+
+class TestMemoryCache(CacheTestMixin, unittest.TestCase):
+    def setUp(self):
+        self.cache = MemoryCache()
+
+    def test_maxsize(self):
+        cache = MemoryCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'c': 3})
+
+
+class TestSQLiteCache(CacheTestMixin, unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = SQLiteCache(os.path.join(self.directory, 'cache.sqlite3'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+class TestFileCache(CacheTestMixin, unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = FileCache(os.path.join(self.directory, 'wework_cache.txt'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_legacy_format(self):
+        with open(self.cache.filename, 'w') as f:
+            f.write(json.dumps({'wework_suite_ticket': 'ticket'}))
+        self.assertEqual(self.cache.get('wework_suite_ticket'), 'ticket')
+
+    def test_shared_between_instances(self):
+        self.cache.set('a', 1)
+        other = FileCache(self.cache.filename)
+        self.assertEqual(other.get('a'), 1)
+        other.set('a', 2)
+        self.assertEqual(self.cache.get('a'), 2)
+
+
+class TestHelperCache(unittest.TestCase):
+    def test_init_cache(self):
+        helper = type('MyHelper', (BaseHelper, ), {})
+        t = settings.init(REGISTER_URL='www.quseit.com/', HELPER=helper, CACHE='memory')
+        t.settings.HELPER.cache_set('a', 1)
+        self.assertEqual(t.settings.HELPER.cache_get('a'), 1)
+        self.assertIsNone(helper.cache)
+
+    def test_create_cache(self):
+        self.assertIsInstance(create_cache('wework.cache.MemoryCache', {'maxsize': 1}), MemoryCache)
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+import unittest
+from wework.aio import AsyncMSG
+from wework.coalesce import SendCoalescer, AsyncSendCoalescer
+from wework.ierror import APIValueError
+from wework.msg import MSG
+from wework.retry import NO_RETRY
+from wework.transport import Transport
+from tests.test_aio import FakeAsyncTransport
+from tests.test_retry import FakeResponse
+
+
+class FakeSession(object):
+    """以 x 开头的成员视为无效"""
+    def __init__(self, errcode=0, delay=0.01):
+        self.calls = []
+        self.errcode = errcode
+        self.delay = delay
+
+    def request(self, method, url, json=None, **kwargs):
+        self.calls.append(json)
+        time.sleep(self.delay)
+        invalid = [u for u in json['touser'].split('|') if u.startswith('x')]
+        return FakeResponse({'errcode': self.errcode, 'errmsg': 'ok', 'invaliduser': '|'.join(invalid)})
+
+
+def send_concurrently(transport, users_list, content='alert'):
+    results = [None] * len(users_list)
+    errors = [None] * len(users_list)
+
+    def send(i, users):
+        msg = MSG('token', 1, transport)
+        msg.touser = users
+        try:
+            results[i] = msg.send('text', {'content': content})
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=send, args=(i, users)) for i, users in enumerate(users_list)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+class TestSendCoalescer(unittest.TestCase):
+    def create_transport(self, session, **kwargs):
+        return Transport(session=session, retry_policy=NO_RETRY, coalescer=SendCoalescer(**kwargs))
+
+    def test_merge(self):
+        session = FakeSession()
+        t = self.create_transport(session, window=100)
+        users_list = [['u{}'.format(i), 'x{}'.format(i)] for i in range(20)]
+        results, errors = send_concurrently(t, users_list)
+        self.assertEqual(len(session.calls), 1)
+        self.assertEqual(len(session.calls[0]['touser'].split('|')), 40)
+        for i, result in enumerate(results):
+            self.assertEqual(result['invaliduser'], 'x{}'.format(i))
+
+    def test_max_users(self):
+        session = FakeSession()
+        t = self.create_transport(session, window=100, max_users=10)
+        results, errors = send_concurrently(t, [['u{}'.format(i), 'v{}'.format(i)] for i in range(20)])
+        self.assertEqual(len(session.calls), 4)
+        self.assertTrue(all(len(call['touser'].split('|')) <= 10 for call in session.calls))
+        self.assertEqual(errors, [None] * 20)
+
+    def test_different_content(self):
+        session = FakeSession()
+        t = self.create_transport(session, window=50)
+        msg = MSG('token', 1, t)
+        msg.toparty = '1'
+        msg.touser = 'a'
+        msg.send('text', {'content': 'a'})
+        send_concurrently(t, [['a'], ['b']], content='b')
+        self.assertEqual(session.calls[0]['toparty'], '1')
+        self.assertEqual(len(session.calls), 2)
+
+    def test_error(self):
+        t = self.create_transport(FakeSession(errcode=40003), window=50)
+        results, errors = send_concurrently(t, [['a'], ['b'], ['c']])
+        self.assertTrue(all(isinstance(e, APIValueError) for e in errors))
+
+    def test_async(self):
+        t = FakeAsyncTransport({'errcode': 0, 'invaliduser': 'x1|x2'}, delay=0.01)
+        t.coalescer = AsyncSendCoalescer(window=50)
+
+        async def send(users):
+            msg = AsyncMSG('token', 1, t)
+            msg.touser = users
+            return await msg.send('text', {'content': 'hi'})
+
+        async def main():
+            return await asyncio.gather(send(['a', 'x1']), send(['b', 'x2']), send(['c']))
+
+        results = asyncio.run(main())
+        self.assertEqual(len(t.calls), 1)
+        self.assertEqual(t.calls[0][2]['json']['touser'], 'a|x1|b|x2|c')
+        self.assertEqual([r['invaliduser'] for r in results], ['x1', 'x2', ''])
+
+    def test_async_leader_cancelled(self):
+        t = FakeAsyncTransport({'errcode': 0, 'invaliduser': 'x2'}, delay=0.01)
+        t.coalescer = AsyncSendCoalescer(window=50)
+
+        async def send(users):
+            msg = AsyncMSG('token', 1, t)
+            return await msg.send('text', {'content': 'hi'}, touser=users)
+
+        async def main():
+            leader = asyncio.ensure_future(send(['a']))
+            await asyncio.sleep(0.01)
+            followers = [asyncio.ensure_future(send(['b'])), asyncio.ensure_future(send(['x2']))]
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return await asyncio.gather(leader, *followers, return_exceptions=True)
+
+        leader, *followers = asyncio.run(main())
+        # 第一个调用者被取消，合并到同一个批次的其它调用者仍然得到结果
+        self.assertIsInstance(leader, asyncio.CancelledError)
+        self.assertEqual([r['invaliduser'] for r in followers], ['', 'x2'])
+        self.assertEqual(len(t.calls), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import threading
+import time
+import unittest
+from wework.crawler import DirectoryCrawler
+from wework.directory import DirectoryIndex
+from tests.test_directory import DEPARTMENTS, USERS
+
+
+class CrawlAPI(object):
+    """按部门返回 USERS 中直属于该部门的成员"""
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.requested = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def get_department_list(self, id=None):
+        return DEPARTMENTS
+
+    def get_department_user_detail_list(self, department_id, fetch_child=False):
+        assert not fetch_child
+        with self.lock:
+            self.requested.append(department_id)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        return [u for u in USERS if department_id in u['department']]
+
+
+class TestDirectoryCrawler(unittest.TestCase):
+    def test_iter_users(self):
+        api = CrawlAPI()
+        users = list(DirectoryCrawler(api, max_workers=2).iter_users())
+        # bob 同时属于部门 3 和 4，只返回一次
+        self.assertEqual(sorted(u['userid'] for u in users), ['alice', 'bob', 'carol', 'ceo', 'cto'])
+        self.assertEqual(sorted(api.requested), [1, 2, 3, 4, 5])
+
+    def test_bounded(self):
+        api = CrawlAPI(delay=0.02)
+        count = DirectoryCrawler(api, max_workers=2).crawl(lambda user: None)
+        self.assertEqual(count, 5)
+        self.assertLessEqual(api.max_active, 2)
+        self.assertEqual(api.max_active, 2)
+
+    def test_stop_early(self):
+        api = CrawlAPI(delay=0.02)
+        users = DirectoryCrawler(api, max_workers=1).iter_users()
+        next(users)
+        users.close()
+        self.assertLess(len(api.requested), 5)
+
+    def test_error(self):
+        api = CrawlAPI()
+        api.get_department_user_detail_list = lambda id, fetch_child=False: 1 / 0
+        with self.assertRaises(ZeroDivisionError):
+            list(DirectoryCrawler(api).iter_users())
+
+    def test_directory_index(self):
+        index = DirectoryIndex(CrawlAPI(), fetch_tags=False, max_workers=4)
+        index.refresh()
+        self.assertEqual(len(index.users), 5)
+        self.assertTrue(index.is_leader('cto', 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
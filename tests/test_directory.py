@@ -0,0 +1,133 @@
+import threading
+import unittest
+from wework.directory import DirectorySnapshot, DirectoryIndex
+
+
+DEPARTMENTS = [
+    {'id': 1, 'name': '公司', 'parentid': 0, 'order': 1},
+    {'id': 2, 'name': '研发', 'parentid': 1, 'order': 1},
+    {'id': 3, 'name': '销售', 'parentid': 1, 'order': 2},
+    {'id': 4, 'name': '后端', 'parentid': 2, 'order': 1},
+    {'id': 5, 'name': '前端', 'parentid': 2, 'order': 1},
+]
+USERS = [
+    {'userid': 'ceo', 'department': [1], 'is_leader_in_dept': [1]},
+    {'userid': 'cto', 'department': [2], 'is_leader_in_dept': [1]},
+    {'userid': 'alice', 'department': [4], 'is_leader_in_dept': [0]},
+    {'userid': 'bob', 'department': [4, 3], 'is_leader_in_dept': [1, 0]},
+    {'userid': 'carol', 'department': [5]},
+]
+TAGS = [{'tagid': 1, 'tagname': 'oncall', 'userlist': ['alice', 'carol']}]
+
+
+class FakeAPI(object):
+    def __init__(self):
+        self.departments = DEPARTMENTS
+        self.calls = 0
+
+    def get_department_list(self, id=None):
+        self.calls += 1
+        return self.departments
+
+    def get_department_user_detail_list(self, department_id, fetch_child=False):
+        self.calls += 1
+        return USERS
+
+    def get_tag_list(self):
+        return [{'tagid': 1, 'tagname': 'oncall'}]
+
+    def get_tag_user_list(self, tag_id):
+        return [{'userid': 'alice'}, {'userid': 'carol'}]
+
+
+class TestDirectorySnapshot(unittest.TestCase):
+    def setUp(self):
+        self.s = DirectorySnapshot(DEPARTMENTS, USERS, TAGS)
+
+    def test_tree(self):
+        self.assertEqual(self.s.roots, (1, ))
+        self.assertEqual(self.s.get_children(1), (3, 2))
+        self.assertEqual(self.s.get_ancestors(4), (2, 1))
+        self.assertEqual(self.s.get_descendants(2), {2, 4, 5})
+        self.assertEqual(self.s.get_descendants(2, include_self=False), {4, 5})
+
+    def test_users(self):
+        self.assertEqual(self.s.get_department_users(4), {'alice', 'bob'})
+        self.assertEqual(self.s.get_department_users(2, recursive=True), {'cto', 'alice', 'bob', 'carol'})
+        self.assertEqual(len(self.s.get_department_users(1, recursive=True)), 5)
+        self.assertEqual(self.s.get_user_departments('bob'), (4, 3))
+        self.assertTrue(self.s.is_in_department('carol', 2))
+        self.assertFalse(self.s.is_in_department('carol', 3))
+
+    def test_leader(self):
+        self.assertTrue(self.s.is_leader('bob', 4))
+        self.assertFalse(self.s.is_leader('bob', 3))
+        self.assertTrue(self.s.is_leader('cto', 5))
+        self.assertFalse(self.s.is_leader('cto', 5, ancestors=False))
+        self.assertTrue(self.s.is_leader('ceo', 3))
+        self.assertFalse(self.s.is_leader('alice', 4))
+
+    def test_tags(self):
+        self.assertEqual(self.s.get_tag_users(1), {'alice', 'carol'})
+        self.assertEqual(self.s.get_user_tags('alice'), {1})
+        self.assertEqual(self.s.get_user_tags('bob'), set())
+
+    def test_cycle(self):
+        s = DirectorySnapshot([{'id': 1, 'parentid': 2}, {'id': 2, 'parentid': 1}, {'id': 3, 'parentid': 0}], [])
+        self.assertEqual(s.roots, (3, ))
+        self.assertEqual(len(s.get_ancestors(1)), 1)
+
+    def test_deep(self):
+        departments = [{'id': i, 'parentid': i - 1} for i in range(1, 1001)]
+        s = DirectorySnapshot(departments, [{'userid': 'u', 'department': [1000], 'is_leader_in_dept': [0]},
+                                            {'userid': 'root', 'department': [1], 'is_leader_in_dept': [1]}])
+        self.assertEqual(len(s.get_ancestors(1000)), 999)
+        self.assertEqual(s.get_department_users(1, recursive=True), {'u', 'root'})
+        self.assertTrue(s.is_leader('root', 1000))
+
+
+class TestDirectoryIndex(unittest.TestCase):
+    def test_refresh(self):
+        api = FakeAPI()
+        index = DirectoryIndex(api)
+        self.assertEqual(index.get_department_users(1, recursive=True), set())
+        index.refresh()
+        calls = api.calls
+        self.assertTrue(index.is_leader('cto', 4))
+        self.assertEqual(index.get_tag_users(1), {'alice', 'carol'})
+        self.assertEqual(api.calls, calls)
+
+    def test_snapshot_swap(self):
+        api = FakeAPI()
+        index = DirectoryIndex(api)
+        index.refresh()
+        old = index.snapshot
+        api.departments = DEPARTMENTS[:3]
+        index.refresh()
+        self.assertIsNot(index.snapshot, old)
+        self.assertIn(4, old.departments)
+        self.assertNotIn(4, index.departments)
+
+    def test_concurrent_readers(self):
+        index = DirectoryIndex(FakeAPI())
+        index.refresh()
+        errors = []
+
+        def read():
+            for _ in range(1000):
+                snapshot = index.snapshot
+                if snapshot.get_department_users(2, recursive=True) != {'cto', 'alice', 'bob', 'carol'}:
+                    errors.append(1)
+
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for _ in range(5):
+            index.refresh()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import json
+import unittest
+import requests
+from wework import jsonstream
+from wework.corp import WorkWechatCorpAPI
+from wework.ierror import APIValueError
+from wework.jsonstream import iter_json_array
+from wework.retry import RetryPolicy
+from wework.transport import Transport
+
+
+USERS = [
+    {'userid': 'zhangsan', 'name': '张三', 'department': [1, 2], 'extattr': {'attrs': [{'name': '[}{"\\', 'value': 1}]}},
+    {'userid': 'lisi', 'name': 'a "quoted" \\ name', 'department': [], 'enable': True, 'alias': None},
+    {'userid': 'wangwu', 'order': [-1, 2.5e3]},
+]
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class StreamResponse(object):
+    def __init__(self, data):
+        self.body = json.dumps(data, ensure_ascii=False, indent=1).encode('utf-8')
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        return iter(chunked(self.body, 7))
+
+    def json(self):
+        return json.loads(self.body)
+
+    def close(self):
+        self.closed = True
+
+
+class StreamSession(object):
+    def __init__(self, responses):
+        self.responses = [StreamResponse(data) for data in responses]
+        self.sent = list(self.responses)
+        self.kwargs = []
+
+    def request(self, method, url, **kwargs):
+        self.kwargs.append(kwargs)
+        return self.responses.pop(0)
+
+
+class TestIterJsonArray(unittest.TestCase):
+    def test_chunk_sizes(self):
+        body = json.dumps({'errcode': 0, 'errmsg': 'ok', 'userlist': USERS}, ensure_ascii=False).encode('utf-8')
+        for size in (1, 2, 3, 16, len(body)):
+            fields, items = iter_json_array(chunked(body, size), 'userlist')
+            self.assertEqual(fields, {'errcode': 0, 'errmsg': 'ok'})
+            self.assertEqual(list(items), USERS)
+
+    def test_fields_around_array(self):
+        body = b' { "other" : [1, {"userlist": 2}], "userlist" : [ ] , "errcode" : 40001, "next": {"a": "}"} } '
+        fields, items = iter_json_array(chunked(body, 5), 'userlist')
+        self.assertEqual(fields, {'other': [1, {'userlist': 2}]})
+        self.assertEqual(list(items), [])
+        self.assertEqual(fields['errcode'], 40001)
+        self.assertEqual(fields['next'], {'a': '}'})
+
+    def test_missing_key(self):
+        fields, items = iter_json_array([b'{"errcode": 60011, "errmsg": "no privilege"}'], 'userlist')
+        self.assertEqual(fields['errcode'], 60011)
+        self.assertEqual(list(items), [])
+
+    def test_incomplete(self):
+        fields, items = iter_json_array([b'{"errcode": 0, "userlist": [{"userid": "a"}, {"userid'], 'userlist')
+        self.assertEqual(next(items), {'userid': 'a'})
+        with self.assertRaises(ValueError):
+            next(items)
+
+    def test_large(self):
+        users = [{'userid': 'user{}'.format(i), 'name': '成员{}'.format(i)} for i in range(20000)]
+        body = json.dumps({'errcode': 0, 'userlist': users}, ensure_ascii=False).encode('utf-8')
+        fields, items = iter_json_array(chunked(body, 65536), 'userlist')
+        count = 0
+        for user in items:
+            count += 1
+        self.assertEqual(count, 20000)
+
+    def test_numbers_split_across_chunks(self):
+        fields, items = iter_json_array([b'{"userlist": [12', b'34, tr', b'ue, -1.5e', b'3]}'], 'userlist')
+        self.assertEqual(list(items), [1234, True, -1500.0])
+
+    def test_utf8_split_across_chunks(self):
+        body = '{"userlist": ["张三"]}'.encode('utf-8')
+        fields, items = iter_json_array(chunked(body, 1), 'userlist')
+        self.assertEqual(list(items), ['张三'])
+
+    def test_backend(self):
+        self.assertIn(jsonstream.loads, (json.loads, getattr(jsonstream.orjson, 'loads', None)))
+        response = requests.Response()
+        response._content = rb'{"errcode": 0, "name": "\u5f20\u4e09"}'
+        self.assertEqual(jsonstream.decode_response(response), {'errcode': 0, 'name': '张三'})
+
+
+class TestStream(unittest.TestCase):
+    def create_api(self, responses):
+        session = StreamSession(responses)
+        transport = Transport(session=session, retry_policy=RetryPolicy(backoff=0))
+        return WorkWechatCorpAPI.new('token', 1, transport=transport), session
+
+    def test_iter_department_user_detail_list(self):
+        api, session = self.create_api([{'errcode': 0, 'errmsg': 'ok', 'userlist': USERS}])
+        users = api.iter_department_user_detail_list(1, fetch_child=True)
+        self.assertEqual(next(users), USERS[0])
+        self.assertEqual(list(users), USERS[1:])
+        self.assertTrue(session.sent[0].closed)
+        self.assertTrue(session.kwargs[0]['stream'])
+
+    def test_retry_before_first_item(self):
+        api, session = self.create_api([{'errcode': -1, 'errmsg': 'busy'}, {'errcode': 0, 'userlist': USERS[:1]}])
+        self.assertEqual(list(api.iter_tag_user_list(1)), USERS[:1])
+        self.assertEqual(api.transport.metrics.get('retry', reason='errcode'), 1)
+
+    def test_error(self):
+        api, session = self.create_api([{'errcode': 60011, 'errmsg': 'no privilege'}])
+        with self.assertRaises(APIValueError):
+            api.iter_department_user_list(1)
+
+    def test_error_after_array(self):
+        api, session = self.create_api([{'userlist': USERS[:1], 'errcode': 60011}])
+        users = api.iter_department_user_list(1)
+        self.assertEqual(next(users), USERS[0])
+        with self.assertRaises(APIValueError):
+            next(users)
+
+    def test_close_early(self):
+        api, session = self.create_api([{'errcode': 0, 'userlist': USERS}])
+        users = api.iter_department_user_detail_list(1)
+        next(users)
+        users.close()
+        self.assertTrue(session.sent[0].closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
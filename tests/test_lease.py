@@ -0,0 +1,170 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from wework.aio.base import AsyncBaseWechatAPI
+from wework.base import BaseWechatAPI
+from wework.cache import default_l1_cache
+from wework.corp import WorkWechatCorpAPI
+from wework.helpers import BaseHelper
+from wework.lease import FileLease, TokenLease
+from wework.registry import TokenRegistry
+from wework.settings import Settings
+
+
+class DirHelper(BaseHelper):
+    directory = None
+
+    @classmethod
+    def cache_get(cls, key):
+        try:
+            with open(os.path.join(cls.directory, key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def cache_set(cls, key, value, **kwargs):
+        path = os.path.join(cls.directory, key)
+        with open(path + '.tmp{}'.format(os.getpid()), 'w') as f:
+            json.dump(value, f)
+        os.replace(f.name, path)
+
+
+class LeasedAPI(BaseWechatAPI):
+    def __init__(self, directory, expires_in):
+        self.settings = Settings({
+            'HELPER': DirHelper,
+            'TOKEN_LEASE': TokenLease(FileLease(directory), stale_window=60),
+        })
+        self._global_access_token = {'name': ('lease_access_token', 'lease_expires_time')}
+        self.directory = directory
+        self.expires_in = expires_in
+
+    def _get_access_token(self):
+        with open(os.path.join(self.directory, 'upstream_calls'), 'a') as f:
+            f.write('{}\n'.format(os.getpid()))
+        time.sleep(0.2)
+        return 'token-{}'.format(os.getpid()), self.expires_in
+
+
+class AsyncLeasedAPI(AsyncBaseWechatAPI):
+    def __init__(self, directory, expires_in):
+        LeasedAPI.__init__(self, directory, expires_in)
+
+    async def _get_access_token(self):
+        with open(os.path.join(self.directory, 'upstream_calls'), 'a') as f:
+            f.write('{}\n'.format(os.getpid()))
+        await asyncio.sleep(0.2)
+        return 'token-{}'.format(os.getpid()), self.expires_in
+
+
+def worker(directory, expires_in, start, queue, mode, expires_time):
+    DirHelper.directory = directory
+    start.wait()
+    if mode == 'access':
+        queue.put(LeasedAPI(directory, expires_in).access_token)
+    elif mode == 'refresh':
+        queue.put(LeasedAPI(directory, expires_in).refresh_access_token(expires_time))
+    elif mode == 'async_access':
+        queue.put(asyncio.run(AsyncLeasedAPI(directory, expires_in).access_token))
+    else:
+        queue.put(asyncio.run(AsyncLeasedAPI(directory, expires_in).refresh_access_token(expires_time)))
+
+
+class TestTokenLease(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        DirHelper.directory = self.directory
+        # fork 出的进程会继承一级缓存中的 token
+        default_l1_cache.invalidate()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def upstream_calls(self):
+        try:
+            with open(os.path.join(self.directory, 'upstream_calls')) as f:
+                return f.read().split()
+        except FileNotFoundError:
+            return []
+
+    def run_workers(self, n=16, expires_in=7200, mode='access', expires_time=None):
+        ctx = multiprocessing.get_context('fork')
+        start, queue = ctx.Event(), ctx.Queue()
+        processes = [ctx.Process(target=worker, args=(self.directory, expires_in, start, queue, mode, expires_time))
+                     for _ in range(n)]
+        for p in processes:
+            p.start()
+        start.set()
+        tokens = [queue.get(timeout=10) for _ in processes]
+        for p in processes:
+            p.join()
+        return tokens
+
+    def test_single_refresh_across_processes(self):
+        tokens = self.run_workers()
+        self.assertEqual(len(self.upstream_calls()), 1)
+        self.assertEqual(len(set(tokens)), 1)
+
+    def test_stale_while_refreshing(self):
+        DirHelper.cache_set('lease_access_token', 'old')
+        DirHelper.cache_set('lease_expires_time', int(time.time()) + 30)
+        tokens = self.run_workers(expires_in=7200)
+        self.assertEqual(len(self.upstream_calls()), 1)
+        # 未抢到租约的进程直接使用尚未过期的旧 token
+        self.assertIn('old', tokens)
+        self.assertEqual(DirHelper.cache_get('lease_access_token'), 'token-{}'.format(self.upstream_calls()[0]))
+
+    def test_forced_refresh_across_processes(self):
+        # 后台刷新在 token 远未过期时触发，多个进程的刷新线程同一个周期内只获取一次
+        expires_time = int(time.time()) + 3600
+        DirHelper.cache_set('lease_access_token', 'old')
+        DirHelper.cache_set('lease_expires_time', expires_time)
+        tokens = self.run_workers(mode='refresh', expires_time=expires_time)
+        self.assertEqual(len(self.upstream_calls()), 1)
+        self.assertEqual(set(tokens), {'token-{}'.format(self.upstream_calls()[0])})
+
+    def test_async_single_refresh_across_processes(self):
+        tokens = self.run_workers(mode='async_access')
+        self.assertEqual(len(self.upstream_calls()), 1)
+        self.assertEqual(len(set(tokens)), 1)
+
+    def test_async_forced_refresh_across_processes(self):
+        expires_time = int(time.time()) + 3600
+        DirHelper.cache_set('lease_access_token', 'old')
+        DirHelper.cache_set('lease_expires_time', expires_time)
+        tokens = self.run_workers(mode='async_refresh', expires_time=expires_time)
+        self.assertEqual(len(self.upstream_calls()), 1)
+        self.assertEqual(set(tokens), {'token-{}'.format(self.upstream_calls()[0])})
+
+    def test_forced_refresh_without_expires_time(self):
+        api = LeasedAPI(self.directory, 7200)
+        DirHelper.cache_set('lease_access_token', 'old')
+        DirHelper.cache_set('lease_expires_time', int(time.time()) + 3600)
+        self.assertEqual(api.refresh_access_token(), 'token-{}'.format(os.getpid()))
+        self.assertEqual(len(self.upstream_calls()), 1)
+
+    def test_lease_expires(self):
+        lease = FileLease(self.directory)
+        self.assertTrue(lease.acquire('name', 'a', 0.1))
+        self.assertFalse(lease.acquire('name', 'b', 0.1))
+        time.sleep(0.15)
+        self.assertTrue(lease.acquire('name', 'b', 0.1))
+        lease.release('name', 'a')
+        self.assertFalse(lease.acquire('name', 'c', 0.1))
+        lease.release('name', 'b')
+        self.assertTrue(lease.acquire('name', 'c', 0.1))
+
+    def test_corp_api_with_helper(self):
+        api = WorkWechatCorpAPI('corp', 'secret', 1, registry=TokenRegistry(), helper=DirHelper,
+                                lease=FileLease(self.directory))
+        api._get_access_token = lambda: ('token', 7200)
+        self.assertEqual(api.access_token, 'token')
+        name = api._global_access_token['name'][0]
+        self.assertEqual(DirHelper.cache_get(name), 'token')
+        self.assertNotIn('secret', name)
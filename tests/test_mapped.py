@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+from wework.directory import DirectorySnapshot, DirectoryIndex
+from wework.mapped import MappedSnapshot, dump_snapshot, read_version
+from wework.records import compact
+from tests.test_directory import DEPARTMENTS, USERS, TAGS, FakeAPI
+
+
+class TestMappedSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'directory.snapshot')
+        self.snapshot = DirectorySnapshot(DEPARTMENTS, USERS + [{'userid': '用户'}], TAGS)
+        dump_snapshot(self.snapshot, self.path)
+        self.m = MappedSnapshot(self.path)
+
+    def tearDown(self):
+        self.m.close()
+        shutil.rmtree(self.dir)
+
+    def test_same_queries(self):
+        s, m = self.snapshot, self.m
+        self.assertEqual(m.roots, s.roots)
+        for id in list(s.departments) + [100]:
+            self.assertEqual(m.get_department(id), s.get_department(id))
+            self.assertEqual(m.get_children(id), s.get_children(id))
+            self.assertEqual(m.get_ancestors(id), s.get_ancestors(id))
+            self.assertEqual(m.get_descendants(id), s.get_descendants(id))
+            self.assertEqual(m.get_descendants(id, include_self=False), s.get_descendants(id, include_self=False))
+            self.assertEqual(m.get_department_users(id), s.get_department_users(id))
+            self.assertEqual(m.get_department_users(id, recursive=True), s.get_department_users(id, recursive=True))
+            for userid in list(s.users) + ['nobody']:
+                self.assertEqual(m.is_in_department(userid, id), s.is_in_department(userid, id))
+                self.assertEqual(m.is_leader(userid, id), s.is_leader(userid, id))
+                self.assertEqual(m.is_leader(userid, id, False), s.is_leader(userid, id, False))
+        for userid in list(s.users) + ['nobody']:
+            self.assertEqual(m.get_user(userid), s.get_user(userid))
+            self.assertEqual(m.get_user_departments(userid), s.get_user_departments(userid))
+            self.assertEqual(m.get_user_tags(userid), s.get_user_tags(userid))
+        self.assertEqual(m.get_tag_users(1), s.get_tag_users(1))
+        self.assertEqual(m.get_tag_users(2), s.get_tag_users(2))
+
+    def test_mappings(self):
+        self.assertEqual(len(self.m.users), 6)
+        self.assertEqual(sorted(self.m.users), sorted(self.snapshot.users))
+        self.assertIn('bob', self.m.users)
+        self.assertNotIn('nobody', self.m.users)
+        self.assertEqual(self.m.departments[4]['name'], '后端')
+        self.assertEqual(self.m.tags[1]['userlist'], ['alice', 'carol'])
+
+    def test_version_and_swap(self):
+        self.assertEqual(self.m.version, 1)
+        self.assertFalse(self.m.changed())
+        snapshot = DirectorySnapshot(DEPARTMENTS[:2], USERS[:1])
+        self.assertEqual(dump_snapshot(snapshot, self.path), 2)
+        self.assertEqual(read_version(self.path), 2)
+        self.assertTrue(self.m.changed())
+        # 已经打开的旧快照不受影响
+        self.assertEqual(len(self.m.users), 6)
+        with MappedSnapshot(self.path) as m:
+            self.assertEqual(m.version, 2)
+            self.assertEqual(len(m.users), 1)
+        self.assertEqual(os.listdir(self.dir), ['directory.snapshot'])
+
+    def test_records(self):
+        departments, users, tags = compact(DEPARTMENTS, USERS, TAGS)
+        dump_snapshot(DirectorySnapshot(departments, users, tags), self.path, version=10)
+        with MappedSnapshot(self.path) as m:
+            self.assertEqual(m.version, 10)
+            self.assertEqual(m.get_user('bob'), self.snapshot.get_user('bob'))
+
+    def test_invalid(self):
+        path = os.path.join(self.dir, 'invalid')
+        with open(path, 'wb') as f:
+            f.write(b'\0' * 64)
+        with self.assertRaises(ValueError):
+            MappedSnapshot(path)
+        self.assertIsNone(read_version(path))
+
+    def test_directory_index(self):
+        writer = DirectoryIndex(FakeAPI())
+        writer.refresh()
+        writer.dump(self.path)
+        index = DirectoryIndex(None)
+        snapshot = index.load_file(self.path)
+        self.assertIsInstance(snapshot, MappedSnapshot)
+        self.assertTrue(index.is_leader('cto', 4))
+        self.assertIs(index.load_file(self.path), snapshot)
+        writer.dump(self.path)
+        self.assertIsNot(index.load_file(self.path), snapshot)
+        self.assertEqual(index.snapshot.version, snapshot.version + 1)
+        snapshot.close()
+        index.snapshot.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import asyncio
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+from wework.aio import AsyncCorpAPI
+from wework.cache import MemoryCache
+from wework.corp import WorkWechatCorpAPI
+from wework.media import MediaCache, media_digest
+from wework.msg import MSG
+from wework.registry import TokenRegistry
+from wework.transport import Transport
+from tests.test_aio import FakeAsyncTransport
+from tests.test_retry import FakeResponse
+
+
+class UploadSession(object):
+    def __init__(self):
+        self.uploads = []
+
+    def request(self, method, url, data=None, **kwargs):
+        if '/cgi-bin/gettoken' in url:
+            return FakeResponse({'errcode': 0, 'access_token': 'token', 'expires_in': 7200})
+        self.uploads.append(b''.join(data))
+        return FakeResponse({'errcode': 0, 'type': 'image', 'media_id': 'media{}'.format(len(self.uploads)),
+                             'created_at': str(int(time.time()))})
+
+
+class TestMediaCache(unittest.TestCase):
+    def create_api(self, media_cache, corp_id='corp'):
+        session = UploadSession()
+        api = WorkWechatCorpAPI(corp_id, 'secret', 1, Transport(session=session), TokenRegistry(),
+                                media_cache=media_cache)
+        return api, session
+
+    def test_dedup(self):
+        api, session = self.create_api(MediaCache())
+        content = os.urandom(1000)
+        first = api.msg.upload_temp_media('image', content, 'a.png')
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(content)
+            f.flush()
+            second = api.msg.upload_temp_media('image', f.name, 'b.png')
+        third = api.msg.upload_temp_media('image', io.BytesIO(content), 'c.png')
+        self.assertEqual(len(session.uploads), 1)
+        self.assertEqual(first['media_id'], second['media_id'])
+        self.assertEqual(third['media_id'], 'media1')
+        # 类型或内容不同时重新上传
+        api.msg.upload_temp_media('file', content, 'a.png')
+        api.msg.upload_temp_media('image', content + b'x', 'a.png')
+        self.assertEqual(len(session.uploads), 3)
+
+    def test_shared_across_corps(self):
+        cache = MediaCache()
+        api1, session1 = self.create_api(cache, 'corp1')
+        api2, session2 = self.create_api(cache, 'corp2')
+        api1.msg.upload_temp_media('image', b'hello world', 'a.png')
+        api2.msg.upload_temp_media('image', b'hello world', 'a.png')
+        self.assertEqual((len(session1.uploads), len(session2.uploads)), (1, 1))
+
+    def test_iterator(self):
+        api, session = self.create_api(MediaCache())
+        api.msg.upload_temp_media('image', iter([b'hello ', b'world']), 'a.png', size=11)
+        api.msg.upload_temp_media('image', b'hello world', 'a.png')
+        self.assertEqual(len(session.uploads), 1)
+        self.assertIn(b'hello world', session.uploads[0])
+
+    def test_unseekable_file(self):
+        class Unseekable(io.BytesIO):
+            def seekable(self):
+                return False
+
+        api, session = self.create_api(MediaCache())
+        api.msg.upload_temp_media('image', Unseekable(b'hello world'), 'a.png', size=11)
+        api.msg.upload_temp_media('image', b'hello world', 'a.png')
+        self.assertEqual(len(session.uploads), 1)
+        self.assertIn(b'hello world', session.uploads[0])
+
+    def test_margin(self):
+        cache = MediaCache(margin=3600)
+        digest = media_digest(b'hello world')
+        cache.set('corp', 'image', digest, 'old', time.time() - MediaCache.EXPIRES_IN + 1800)
+        self.assertIsNone(cache.get('corp', 'image', digest))
+        cache.set('corp', 'image', digest, 'new', time.time())
+        self.assertEqual(cache.get('corp', 'image', digest)['media_id'], 'new')
+
+    def test_l1(self):
+        backend = MemoryCache()
+        cache = MediaCache(backend, maxsize=2)
+        cache.set('corp', 'image', 'a', 'media', time.time())
+        backend.clear()
+        self.assertEqual(cache.get('corp', 'image', 'a')['media_id'], 'media')
+        cache.set('corp', 'image', 'b', 'media', time.time())
+        cache.set('corp', 'image', 'c', 'media', time.time())
+        self.assertIsNone(cache.get('corp', 'image', 'a'))
+
+    def test_without_corp(self):
+        session = UploadSession()
+        msg = MSG('token', 1, Transport(session=session), media_cache=MediaCache())
+        msg.upload_temp_media('image', b'hello world', 'a.png')
+        msg.upload_temp_media('image', b'hello world', 'a.png')
+        self.assertEqual(len(session.uploads), 2)
+
+    def test_async(self):
+        t = FakeAsyncTransport({'errcode': 0, 'access_token': 'token', 'expires_in': 7200,
+                                'media_id': 'media', 'created_at': str(int(time.time()))})
+        api = AsyncCorpAPI('corp', 'secret', 1, t, TokenRegistry(), media_cache=MediaCache())
+
+        async def main():
+            msg = api.msg
+            await msg.upload_temp_media('image', b'hello world', 'a.png')
+            return await msg.upload_temp_media('image', b'hello world', 'a.png')
+
+        self.assertEqual(asyncio.run(main())['media_id'], 'media')
+        self.assertEqual(len([call for call in t.calls if 'media/upload' in call[1]]), 1)
+
+    def test_async_digest_off_loop(self):
+        t = FakeAsyncTransport({'errcode': 0, 'access_token': 'token', 'expires_in': 7200,
+                                'media_id': 'media', 'created_at': str(int(time.time()))})
+        api = AsyncCorpAPI('corp', 'secret', 1, t, TokenRegistry(), media_cache=MediaCache())
+        threads = []
+
+        class ThreadFile(io.BytesIO):
+            def read(self, *args):
+                threads.append(threading.get_ident())
+                return super().read(*args)
+
+        async def main():
+            msg = api.msg
+            return await msg.upload_temp_media('image', ThreadFile(b'hello world'), 'a.png')
+        asyncio.run(main())
+        # 计算摘要时读取文件不在事件循环的线程中
+        self.assertTrue(threads)
+        self.assertNotIn(threading.get_ident(), threads)
+
+
+if __name__ == '__main__':
+    unittest.main()
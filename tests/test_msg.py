@@ -0,0 +1,189 @@
+import asyncio
+import json
+import threading
+import unittest
+from wework.aio import AsyncMSG, AsyncCorpAPI
+from wework.corp import WorkWechatCorpAPI
+from wework.ierror import SendMsgError
+from wework.msg import MSG
+from wework.registry import TokenRegistry
+from wework.template import MessageTemplate
+from wework.transport import Transport
+from wework.validators import validate
+from tests.test_aio import FakeAsyncTransport
+from tests.test_retry import ScriptedSession, FakeResponse
+
+
+class TestValidators(unittest.TestCase):
+    def test_required(self):
+        validate('text', {'content': 'hi'})
+        with self.assertRaisesRegex(SendMsgError, 'content'):
+            validate('text', {})
+        with self.assertRaisesRegex(SendMsgError, 'url'):
+            validate('news', {'articles': [{'title': 'a'}]})
+        with self.assertRaisesRegex(SendMsgError, 'thumb_media_id'):
+            validate('mpnews', {'articles': [{'title': 'a', 'content': 'b'}]})
+        with self.assertRaises(SendMsgError):
+            validate('unknown', {})
+
+    def test_byte_limits(self):
+        validate('text', {'content': 'a' * 2048})
+        with self.assertRaisesRegex(SendMsgError, '2048'):
+            validate('text', {'content': 'a' * 2049})
+        # 中文字符 utf-8 编码后为 3 个字节
+        validate('markdown', {'content': '中' * 682})
+        with self.assertRaises(SendMsgError):
+            validate('markdown', {'content': '中' * 683})
+        with self.assertRaisesRegex(SendMsgError, 'title'):
+            validate('textcard', {'title': '中' * 43, 'description': 'b', 'url': 'c'})
+        with self.assertRaisesRegex(SendMsgError, 'btntxt'):
+            validate('textcard', {'title': 'a', 'description': 'b', 'url': 'c', 'btntxt': '查看详情啊'})
+        with self.assertRaisesRegex(SendMsgError, 'articles.description'):
+            validate('news', {'articles': [{'title': 'a', 'url': 'b', 'description': 'x' * 513}]})
+
+    def test_articles(self):
+        article = {'title': 'a', 'url': 'b'}
+        validate('news', {'articles': [article] * 8})
+        with self.assertRaises(SendMsgError):
+            validate('news', {'articles': [article] * 9})
+        with self.assertRaises(SendMsgError):
+            validate('news', {'articles': []})
+
+    def test_msg_check(self):
+        msg = MSG('token', 1, Transport(session=ScriptedSession([])))
+        with self.assertRaises(SendMsgError):
+            msg.check('text', {'content': 'hi'})
+        msg.touser = 'a'
+        msg.check('text', {'content': 'hi'})
+        with self.assertRaises(SendMsgError):
+            msg.check('text', {'content': 'a' * 3000})
+
+
+class TestMessageTemplate(unittest.TestCase):
+    def test_render(self):
+        template = MessageTemplate('textcard', {'title': '审批', 'url': 'http://a'}, 1, fields=['description'])
+        body = template.render(touser=['a', 'b'], description='内容 "quoted"')
+        self.assertIsInstance(body, bytes)
+        self.assertEqual(json.loads(body.decode('utf-8')), {
+            'touser': 'a|b',
+            'toparty': None,
+            'totag': None,
+            'msgtype': 'textcard',
+            'textcard': {'title': '审批', 'url': 'http://a', 'description': '内容 "quoted"'},
+            'agentid': 1,
+            'safe': 0,
+        })
+
+    def test_nested_fields(self):
+        template = MessageTemplate('news', {'articles': [{'title': 't', 'url': 'u'}]}, 1,
+                                   fields={'title': 'articles.0.title'})
+        data = json.loads(template.render(toparty='1', title='hello'))
+        self.assertEqual(data['news']['articles'][0], {'title': 'hello', 'url': 'u'})
+        self.assertEqual(data['toparty'], '1')
+
+    def test_validate(self):
+        with self.assertRaises(SendMsgError):
+            MessageTemplate('textcard', {'title': 'a'}, 1, fields=['description'])
+        template = MessageTemplate('text', {}, 1, fields=['content'])
+        with self.assertRaises(SendMsgError):
+            template.render(touser='a', content='a' * 2049)
+        with self.assertRaises(SendMsgError):
+            template.render(touser='a')
+        with self.assertRaises(SendMsgError):
+            template.render(content='a')
+
+    def test_send_template(self):
+        session = ScriptedSession([{'errcode': 0}])
+        msg = MSG('token', 1, Transport(session=session))
+        template = msg.template('text', {}, fields=['content'])
+        msg.send_template(template, touser='a', content='hi')
+        self.assertIn('access_token=token', session.urls[0])
+
+    def test_async_send_template(self):
+        t = FakeAsyncTransport({'errcode': 0})
+        msg = AsyncMSG('token', 1, transport=t)
+        msg.touser = 'a'
+        template = msg.template('text', {'content': 'hi'})
+        asyncio.run(msg.send_template(template))
+        kwargs = t.calls[0][2]
+        self.assertEqual(json.loads(kwargs['data'])['touser'], 'a')
+        self.assertIn('application/json', kwargs['headers']['Content-Type'])
+
+
+class TokenSession(ScriptedSession):
+    """gettoken 返回递增的 token，其余请求按顺序返回预设的响应"""
+    def __init__(self, responses):
+        super().__init__(responses)
+        self.tokens = 0
+        self.bodies = []
+
+    def request(self, method, url, **kwargs):
+        if '/cgi-bin/gettoken' in url:
+            self.tokens += 1
+            return FakeResponse({'errcode': 0, 'access_token': 'token{}'.format(self.tokens), 'expires_in': 7200})
+        self.bodies.append(kwargs.get('json'))
+        return super().request(method, url, **kwargs)
+
+
+class TestTokenProvider(unittest.TestCase):
+    def create_api(self, responses):
+        session = TokenSession(responses)
+        return WorkWechatCorpAPI('corp', 'secret', 1, Transport(session=session), TokenRegistry()), session
+
+    def test_lazy_token(self):
+        api, session = self.create_api([{'errcode': 0}] * 2)
+        msg = api.msg
+        self.assertIs(api.msg, msg)
+        self.assertEqual(session.tokens, 0)
+        msg.send('text', {'content': 'hi'}, touser='a')
+        api.refresh_access_token()
+        msg.send('text', {'content': 'hi'}, touser='b')
+        self.assertEqual(session.tokens, 2)
+        self.assertIn('access_token=token1', session.urls[0])
+        self.assertIn('access_token=token2', session.urls[1])
+        self.assertEqual([body['touser'] for body in session.bodies], ['a', 'b'])
+
+    def test_token_invalid(self):
+        api, session = self.create_api([{'errcode': 42001}, {'errcode': 0}])
+        api.msg.send('text', {'content': 'hi'}, touser=['a', 'b'], toparty=[1])
+        self.assertIn('access_token=token2', session.urls[1])
+        self.assertEqual(session.bodies[1]['touser'], 'a|b')
+        self.assertEqual(session.bodies[1]['toparty'], '1')
+
+    def test_new_is_lazy(self):
+        msg = MSG.new('corp', 'secret', 1, Transport(session=TokenSession([])))
+        self.assertEqual(msg.transport.session.tokens, 0)
+        self.assertEqual(msg.access_token, 'token1')
+
+    def test_threads(self):
+        api, session = self.create_api([{'errcode': 0}] * 200)
+        msg = api.msg
+
+        def send(i):
+            msg.send('text', {'content': str(i)}, touser='u{}'.format(i))
+
+        threads = [threading.Thread(target=send, args=(i, )) for i in range(200)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(session.tokens, 1)
+        self.assertEqual(sorted((b['touser'], b['text']['content']) for b in session.bodies),
+                         sorted(('u{}'.format(i), str(i)) for i in range(200)))
+
+    def test_async(self):
+        t = FakeAsyncTransport({'errcode': 0, 'access_token': 'token', 'expires_in': 7200})
+        api = AsyncCorpAPI('corp', 'secret', 1, transport=t, registry=TokenRegistry())
+
+        async def main():
+            msg = api.msg
+            self.assertIs(api.msg, msg)
+            await msg.send('text', {'content': 'hi'}, touser='a')
+
+        asyncio.run(main())
+        self.assertIn('access_token=token', t.calls[-1][1])
+        self.assertEqual(t.calls[-1][2]['json']['touser'], 'a')
+
+
+if __name__ == '__main__':
+    unittest.main()
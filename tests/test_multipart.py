@@ -0,0 +1,148 @@
+import asyncio
+import io
+import os
+import tempfile
+import threading
+import unittest
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from wework.aio import AsyncMSG
+from wework.ierror import UploadError, UploadTypeError
+from wework.msg import MSG
+from wework.multipart import MultipartEncoder
+from wework.transport import Transport
+from tests.test_aio import FakeAsyncTransport
+from tests.test_retry import FakeResponse
+
+
+def parse(body, content_type):
+    message = BytesParser().parsebytes(b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + body)
+    part = message.get_payload()[0]
+    return part.get_param('filename', header='content-disposition'), part.get_payload(decode=True)
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append((self.headers, body))
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+class UploadSession(object):
+    def __init__(self):
+        self.body = None
+        self.headers = None
+
+    def request(self, method, url, data=None, headers=None, **kwargs):
+        self.headers = headers
+        self.body = b''.join(data)
+        return FakeResponse({'errcode': 0, 'type': 'file', 'media_id': 'id'})
+
+
+class TestMultipartEncoder(unittest.TestCase):
+    def test_sources(self):
+        content = os.urandom(200000)
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(content)
+            f.flush()
+            sources = [
+                (f.name, None),
+                (io.BytesIO(content), None),
+                (content, None),
+                ((content[i:i + 1000] for i in range(0, len(content), 1000)), len(content)),
+            ]
+            for source, size in sources:
+                encoder = MultipartEncoder('media', source, 'a.bin', size=size, chunk_size=4096)
+                body = b''.join(encoder)
+                self.assertEqual(len(body), len(encoder))
+                self.assertEqual(parse(body, encoder.content_type), ('a.bin', content))
+
+    def test_size_mismatch(self):
+        encoder = MultipartEncoder('media', iter([b'abcdef']), 'a.txt', size=3)
+        with self.assertRaises(UploadError):
+            b''.join(encoder)
+        with self.assertRaises(UploadError):
+            MultipartEncoder('media', iter([b'abcdef']), 'a.txt')
+
+    def test_progress(self):
+        calls = []
+        encoder = MultipartEncoder('media', b'x' * 10000, 'a.txt', chunk_size=4096,
+                                   progress=lambda sent, total: calls.append((sent, total)))
+        b''.join(encoder)
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(calls[-1], (len(encoder), len(encoder)))
+        self.assertEqual(sorted(calls), calls)
+
+    def test_async_iter_off_loop(self):
+        threads = []
+
+        class ThreadFile(io.BytesIO):
+            def read(self, *args):
+                threads.append(threading.get_ident())
+                return super().read(*args)
+
+        async def read(encoder):
+            return b''.join([chunk async for chunk in encoder])
+        encoder = MultipartEncoder('media', ThreadFile(b'x' * 10000), 'a.bin', chunk_size=4096)
+        body = asyncio.run(read(encoder))
+        self.assertEqual(parse(body, encoder.content_type), ('a.bin', b'x' * 10000))
+        # 读取文件不阻塞事件循环
+        self.assertNotIn(threading.get_ident(), threads)
+        with self.assertRaises(UploadError):
+            asyncio.run(read(MultipartEncoder('media', iter([b'abcdef']), 'a.txt', size=3)))
+
+    def test_requests_streaming(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        server.requests = []
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            encoder = MultipartEncoder('media', io.BytesIO(b'hello world'), 'hello.txt')
+            url = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+            requests.post(url, data=encoder, headers=encoder.headers)
+        finally:
+            server.shutdown()
+            server.server_close()
+        headers, body = server.requests[0]
+        self.assertEqual(int(headers['Content-Length']), len(encoder))
+        self.assertNotIn('Transfer-Encoding', headers)
+        self.assertEqual(parse(body, headers['Content-Type']), ('hello.txt', b'hello world'))
+
+
+class TestUploadTempMedia(unittest.TestCase):
+    def test_upload(self):
+        session = UploadSession()
+        msg = MSG('token', 1, Transport(session=session))
+        data = msg.upload_temp_media('file', io.BytesIO(b'hello world'), 'hello.txt')
+        self.assertEqual(data['media_id'], 'id')
+        self.assertEqual(parse(session.body, session.headers['Content-Type']), ('hello.txt', b'hello world'))
+
+    def test_limits(self):
+        session = UploadSession()
+        msg = MSG('token', 1, Transport(session=session))
+        with self.assertRaises(UploadTypeError):
+            msg.upload_temp_media('doc', b'hello world', 'a.doc')
+        with self.assertRaises(UploadError):
+            msg.upload_temp_media('voice', iter([]), 'a.amr', size=2 * 1024 * 1024 + 1)
+        with self.assertRaises(UploadError):
+            msg.upload_temp_media('file', b'1234', 'a.txt')
+        self.assertIsNone(session.body)
+
+    def test_async_upload(self):
+        t = FakeAsyncTransport({'errcode': 0, 'media_id': 'id'})
+        msg = AsyncMSG('token', 1, transport=t)
+        asyncio.run(msg.upload_temp_media('image', b'\x89PNG....', 'a.png'))
+        kwargs = t.calls[0][2]
+        self.assertIsInstance(kwargs['data'], MultipartEncoder)
+        self.assertEqual(kwargs['headers']['Content-Length'], str(len(kwargs['data'])))
+
+
+if __name__ == '__main__':
+    unittest.main()
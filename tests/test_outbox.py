@@ -0,0 +1,170 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from wework.msg import MSG
+from wework.outbox import Outbox
+from wework.retry import RetryPolicy, NO_RETRY
+from wework.transport import Transport
+from tests.test_retry import FakeResponse
+
+
+class FakeSession(object):
+    """touser 为 fail 时返回系统繁忙，invalid 时返回无效的 UserID，fail_times 为每个接收者失败的次数"""
+    def __init__(self, fail_times=0):
+        self.sent = []
+        self.fail_times = fail_times
+        self.failures = {}
+        self.lock = threading.Lock()
+
+    def request(self, method, url, json=None, **kwargs):
+        with self.lock:
+            touser = json['touser']
+            if touser == 'invalid':
+                return FakeResponse({'errcode': 40003, 'errmsg': 'invalid userid'})
+            if touser == 'fail' or self.failures.get(touser, 0) < self.fail_times:
+                self.failures[touser] = self.failures.get(touser, 0) + 1
+                return FakeResponse({'errcode': -1, 'errmsg': 'system busy'})
+            self.sent.append(touser)
+        return FakeResponse({'errcode': 0})
+
+
+class FakeAPI(object):
+    def __init__(self, session):
+        self.transport = Transport(session=session, retry_policy=NO_RETRY)
+
+    @property
+    def msg(self):
+        return MSG('token', 1, self.transport)
+
+
+class TestOutbox(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'outbox.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def create_outbox(self, session, **kwargs):
+        kwargs.setdefault('retry_policy', RetryPolicy(max_retries=2, backoff=0, jitter=0))
+        return Outbox(FakeAPI(session), self.path, **kwargs)
+
+    def test_drain(self):
+        session = FakeSession()
+        outbox = self.create_outbox(session, batch_size=7)
+        for i in range(20):
+            outbox.enqueue('text', {'content': 'hi'}, touser='u{}'.format(i))
+        self.assertEqual(outbox.pending(), 20)
+        self.assertEqual(outbox.drain(), 20)
+        self.assertEqual(session.sent, ['u{}'.format(i) for i in range(20)])
+        self.assertEqual(outbox.pending(), 0)
+
+    def test_retry_and_dead_letter(self):
+        session = FakeSession(fail_times=1)
+        outbox = self.create_outbox(session)
+        outbox.enqueue('text', {'content': 'hi'}, touser='a')
+        outbox.enqueue('text', {'content': 'hi'}, touser='fail')
+        outbox.enqueue('text', {}, touser='b')
+        outbox.drain()
+        self.assertEqual(session.sent, ['a'])
+        dead = outbox.dead_letters()
+        self.assertEqual([d['touser'] for d in dead], ['fail', 'b'])
+        self.assertEqual(dead[0]['attempts'], 3)
+        # 不合法的消息不重试
+        self.assertEqual(dead[1]['attempts'], 1)
+        self.assertIn('SendMsgError', dead[1]['error'])
+        self.assertEqual(outbox.pending(), 0)
+
+        self.assertTrue(outbox.requeue(dead[0]['id']))
+        self.assertEqual(outbox.pending(), 1)
+        self.assertEqual(len(outbox.dead_letters()), 1)
+
+    def test_permanent_error(self):
+        session = FakeSession()
+        outbox = self.create_outbox(session)
+        outbox.enqueue('text', {'content': 'hi'}, touser='invalid')
+        outbox.enqueue('text', {'content': 'hi'}, touser='a')
+        outbox.drain()
+        self.assertEqual(session.sent, ['a'])
+        dead = outbox.dead_letters()
+        # 40003 不是临时错误，第一次失败后就移入 dead_letter
+        self.assertEqual([d['touser'] for d in dead], ['invalid'])
+        self.assertEqual(dead[0]['attempts'], 1)
+        self.assertIn('40003', dead[0]['error'])
+
+    def test_crash_recovery(self):
+        session = FakeSession()
+        outbox = self.create_outbox(session, visibility_timeout=0.05)
+        outbox.enqueue('text', {'content': 'hi'}, touser='a')
+        # 取出后没有确认，模拟进程崩溃
+        self.assertEqual(len(outbox.claim()), 1)
+        self.assertEqual(outbox.claim(), [])
+        time.sleep(0.06)
+        other = self.create_outbox(session)
+        self.assertEqual(other.drain(), 1)
+        self.assertEqual(session.sent, ['a'])
+
+    def test_slow_batch(self):
+        session = FakeSession()
+        request = session.request
+
+        def slow_request(*args, **kwargs):
+            time.sleep(0.03)
+            return request(*args, **kwargs)
+        session.request = slow_request
+        outbox = self.create_outbox(session, batch_size=10, visibility_timeout=0.1)
+        for i in range(10):
+            outbox.enqueue('text', {'content': 'hi'}, touser='u{}'.format(i))
+        thread = threading.Thread(target=outbox.process, args=(outbox.claim(), ))
+        thread.start()
+        # 批次的发送时间超过 visibility_timeout，其它进程不会重新取出尚未发送的消息
+        other = self.create_outbox(session)
+        claimed = []
+        while thread.is_alive():
+            claimed.extend(other.claim())
+            time.sleep(0.01)
+        thread.join()
+        self.assertEqual(claimed, [])
+        self.assertEqual(session.sent, ['u{}'.format(i) for i in range(10)])
+
+    def test_ack_each_message(self):
+        session = FakeSession()
+        outbox = self.create_outbox(session)
+        for touser in ('a', 'b'):
+            outbox.enqueue('text', {'content': 'hi'}, touser=touser)
+        pending = []
+        deliver = outbox.deliver
+
+        def record(payload):
+            pending.append(outbox.pending())
+            return deliver(payload)
+        outbox.deliver = record
+        outbox.drain()
+        # 第一条发送成功后立即确认
+        self.assertEqual(pending, [2, 1])
+
+    def test_workers(self):
+        session = FakeSession()
+        outbox = self.create_outbox(session, workers=4, batch_size=10, poll_interval=0.01)
+        with outbox:
+            for i in range(200):
+                outbox.enqueue('text', {'content': 'hi'}, touser='u{}'.format(i))
+            deadline = time.time() + 10
+            while outbox.pending() and time.time() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(sorted(session.sent), sorted('u{}'.format(i) for i in range(200)))
+
+    def test_enqueue_latency(self):
+        outbox = self.create_outbox(FakeSession())
+        outbox.enqueue('text', {'content': 'hi'}, touser='a')
+        start = time.perf_counter()
+        for i in range(1000):
+            outbox.enqueue('text', {'content': 'hi'}, touser='a')
+        self.assertLess((time.perf_counter() - start) / 1000, 0.002)
+
+
+if __name__ == '__main__':
+    unittest.main()
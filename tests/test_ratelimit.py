@@ -0,0 +1,76 @@
+import asyncio
+import time
+import unittest
+from wework import rq
+from wework.ierror import RateLimitError
+from wework.ratelimit import TokenBucket, RateLimiter, get_endpoint_family
+from wework.transport import Transport
+from tests.test_retry import ScriptedSession
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_reserve(self):
+        bucket = TokenBucket(10, 2)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+        wait = bucket.reserve()
+        self.assertGreater(wait, 0.05)
+        self.assertLessEqual(wait, 0.1)
+
+    def test_max_wait(self):
+        bucket = TokenBucket(1, 1)
+        bucket.reserve()
+        self.assertIsNone(bucket.reserve(max_wait=0.5))
+        # 没有预定成功时不消耗令牌
+        self.assertIsNotNone(bucket.reserve(max_wait=1))
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_endpoint_family(self):
+        self.assertEqual(get_endpoint_family('/cgi-bin/message/send'), 'message')
+        self.assertEqual(get_endpoint_family('/cgi-bin/gettoken'), 'gettoken')
+
+    def test_non_blocking(self):
+        limiter = RateLimiter({'message': (2, 60)}, blocking=False)
+        limiter.acquire('corp', 1, '/cgi-bin/message/send')
+        limiter.acquire('corp', 1, '/cgi-bin/message/send')
+        with self.assertRaises(RateLimitError):
+            limiter.acquire('corp', 1, '/cgi-bin/message/send')
+        # 不同的应用、企业、接口族互不影响
+        limiter.acquire('corp', 2, '/cgi-bin/message/send')
+        limiter.acquire('other', 1, '/cgi-bin/message/send')
+        limiter.acquire('corp', 1, '/cgi-bin/user/get')
+
+    def test_blocking(self):
+        limiter = RateLimiter({'message': (1, 0.1)})
+        limiter.acquire('corp', 1, '/cgi-bin/message/send')
+        start = time.time()
+        self.assertGreater(limiter.acquire('corp', 1, '/cgi-bin/message/send'), 0)
+        self.assertGreaterEqual(time.time() - start, 0.05)
+
+    def test_maxsize(self):
+        limiter = RateLimiter(maxsize=2)
+        for agent_id in range(5):
+            limiter.acquire('corp', agent_id, '/cgi-bin/message/send')
+        self.assertEqual(len(limiter._buckets), 2)
+
+    def test_async(self):
+        limiter = RateLimiter({'message': (1, 0.1)})
+
+        async def main():
+            await limiter.acquire_async('corp', 1, '/cgi-bin/message/send')
+            return await limiter.acquire_async('corp', 1, '/cgi-bin/message/send')
+
+        self.assertGreater(asyncio.run(main()), 0)
+
+    def test_transport(self):
+        t = Transport(session=ScriptedSession([{'errcode': 0}] * 2),
+                      rate_limiter=RateLimiter({'message': (1, 60)}, blocking=False))
+        rq.post('https://qyapi.weixin.qq.com/cgi-bin/message/send?access_token=x', {}, t, scope=(None, 1))
+        with self.assertRaises(RateLimitError):
+            rq.post('https://qyapi.weixin.qq.com/cgi-bin/message/send?access_token=x', {}, t, scope=(None, 1))
+        rq.post('https://qyapi.weixin.qq.com/cgi-bin/message/send?access_token=x', {}, t, scope=(None, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
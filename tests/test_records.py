@@ -0,0 +1,80 @@
+import pickle
+import unittest
+from array import array
+from wework.directory import DirectoryIndex
+from wework.records import StringPool, UserRecord, DepartmentRecord, TagRecord, compact
+from tests.test_directory import FakeAPI
+
+
+USER = {
+    'errcode': 0, 'errmsg': 'ok',
+    'userid': 'zhangsan', 'name': '张三', 'department': [1, 2], 'order': [1, 2],
+    'position': '后台工程师', 'gender': '1', 'is_leader_in_dept': [1, 0], 'status': 1,
+    'extattr': {'attrs': [{'type': 0, 'name': '文本名称', 'text': {'value': '文本'}}]},
+    'external_profile': {'external_corp_name': '企业简称'},
+}
+
+
+class TestRecords(unittest.TestCase):
+    def test_user(self):
+        user = UserRecord(USER)
+        self.assertEqual(user.name, '张三')
+        self.assertEqual(user['userid'], 'zhangsan')
+        self.assertIsInstance(user.department, array)
+        self.assertEqual(list(user.get('department')), [1, 2])
+        self.assertEqual(user.is_leader_in_dept[0], 1)
+        self.assertIsNone(user.email)
+        self.assertIsNone(user.get('email'))
+        self.assertNotIn('email', user)
+        with self.assertRaises(KeyError):
+            user['email']
+        with self.assertRaises(AttributeError):
+            user.name = '李四'
+        with self.assertRaises(AttributeError):
+            user.unknown
+
+    def test_lazy_extra(self):
+        user = UserRecord(USER)
+        self.assertIsInstance(user._extra, bytes)
+        self.assertEqual(user.extattr['attrs'][0]['text']['value'], '文本')
+        self.assertEqual(user['external_profile']['external_corp_name'], '企业简称')
+
+    def test_to_dict(self):
+        data = dict(USER)
+        del data['errcode'], data['errmsg']
+        user = UserRecord(USER)
+        self.assertEqual(user.to_dict(), data)
+        self.assertEqual(user, data)
+        self.assertEqual(pickle.loads(pickle.dumps(user)), user)
+        self.assertEqual(dict(user)['name'], '张三')
+
+    def test_pool(self):
+        pool = StringPool()
+        a = UserRecord(dict(USER, position=''.join(['后台', '工程师'])), pool)
+        b = UserRecord(dict(USER, position=''.join(['后台', '工程', '师'])), pool)
+        self.assertIs(a.position, b.position)
+        d1 = DepartmentRecord({'id': 1, 'name': ''.join(['研', '发'])}, pool)
+        d2 = DepartmentRecord({'id': 2, 'name': ''.join(['研', '发']), 'parentid': 1}, pool)
+        self.assertIs(d1.name, d2.name)
+
+    def test_compact(self):
+        departments, users, tags = compact([{'id': 1, 'name': '公司', 'parentid': 0}], [USER],
+                                           [{'tagid': 1, 'tagname': 't', 'userlist': ['zhang' + 'san']}])
+        self.assertIsInstance(departments[0], DepartmentRecord)
+        self.assertIsInstance(tags[0], TagRecord)
+        self.assertIs(tags[0].userlist[0], users[0].userid)
+        # 已经是记录的不再转换
+        self.assertIs(compact([], users)[1][0], users[0])
+
+    def test_directory_index(self):
+        index = DirectoryIndex(FakeAPI(), compact=True)
+        index.refresh()
+        self.assertIsInstance(index.get_user('bob'), UserRecord)
+        self.assertTrue(index.is_leader('cto', 4))
+        self.assertEqual(index.get_department_users(4), {'alice', 'bob'})
+        self.assertEqual(index.get_tag_users(1), {'alice', 'carol'})
+        self.assertEqual(index.get_children(1), (3, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import asyncio
+import time
+import unittest
+from wework.aio import AsyncCorpAPI, AsyncTokenRefresher
+from wework.corp import WorkWechatCorpAPI
+from wework.refresher import TokenRefresher
+from wework.registry import TokenRegistry
+
+
+class NoExpiryAPI(object):
+    """刷新成功但缓存中没有过期时间"""
+    access_token_expires_time = None
+
+    def __init__(self):
+        self.calls = 0
+
+    def refresh_access_token(self, expires_time=None):
+        self.calls += 1
+
+
+class AsyncNoExpiryAPI(NoExpiryAPI):
+    async def refresh_access_token(self, expires_time=None):
+        self.calls += 1
+
+
+class TestTokenRefresher(unittest.TestCase):
+    def test_next_refresh_time(self):
+        refresher = TokenRefresher(fraction=0.8, jitter=0)
+        self.assertEqual(refresher.next_refresh_time(7200, 7200, now=0), 5760)
+        refresher = TokenRefresher(fraction=0.8, jitter=0.1)
+        self.assertTrue(5040 <= refresher.next_refresh_time(7200, 7200, now=0) <= 5760)
+
+    def test_refresh_ahead_of_expiry(self):
+        api = WorkWechatCorpAPI('corp', 'secret', 1, registry=TokenRegistry())
+        calls = []
+
+        def _get_access_token():
+            calls.append(time.time())
+            return 'token{}'.format(len(calls)), 2
+        api._get_access_token = _get_access_token
+        with TokenRefresher(fraction=0.25, jitter=0) as refresher:
+            refresher.add(api)
+            # 过期时间按整秒计算，第二次刷新在启动后 0.25 到 1.25 秒之间
+            deadline = time.time() + 3
+            while len(calls) < 2 and time.time() < deadline:
+                time.sleep(0.01)
+        self.assertGreaterEqual(len(calls), 2)
+        # 请求路径上不需要再获取 token
+        count = len(calls)
+        api.access_token
+        self.assertEqual(len(calls), count)
+
+    def test_retry_after_error(self):
+        api = WorkWechatCorpAPI('corp', 'secret', 1, registry=TokenRegistry())
+        calls = []
+
+        def _get_access_token():
+            calls.append(1)
+            raise ValueError('boom')
+        api._get_access_token = _get_access_token
+        with TokenRefresher(retry_interval=0.1) as refresher:
+            refresher.add(api)
+            time.sleep(0.35)
+        self.assertGreaterEqual(len(calls), 3)
+
+    def test_missing_expires_time(self):
+        api = NoExpiryAPI()
+        with TokenRefresher(retry_interval=0.1) as refresher:
+            refresher.add(api)
+            time.sleep(0.35)
+        # 刷新后读不到过期时间时按 retry_interval 重试，后台线程不会退出
+        self.assertGreaterEqual(api.calls, 3)
+
+        async def main():
+            api = AsyncNoExpiryAPI()
+            async with AsyncTokenRefresher(retry_interval=0.1) as refresher:
+                refresher.add(api)
+                await asyncio.sleep(0.35)
+            return api.calls
+        self.assertGreaterEqual(asyncio.run(main()), 3)
+
+    def test_async_refresher(self):
+        api = AsyncCorpAPI('corp', 'secret', 1, registry=TokenRegistry())
+        calls = []
+
+        async def _get_access_token():
+            calls.append(1)
+            return 'token', 1
+
+        api._get_access_token = _get_access_token
+
+        async def main():
+            async with AsyncTokenRefresher(fraction=0.5, jitter=0) as refresher:
+                refresher.add(api)
+                await asyncio.sleep(1.2)
+        asyncio.run(main())
+        self.assertGreaterEqual(len(calls), 2)
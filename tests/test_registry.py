@@ -0,0 +1,36 @@
+import unittest
+from wework.corp import WorkWechatCorpAPI
+from wework.registry import TokenRegistry
+
+
+class TestTokenRegistry(unittest.TestCase):
+    def test_shared_between_instances(self):
+        registry = TokenRegistry()
+        calls = []
+
+        def _get_access_token():
+            calls.append(1)
+            return 'token', 7200
+        for _ in range(10):
+            api = WorkWechatCorpAPI('corp', 'secret', 1, registry=registry)
+            api._get_access_token = _get_access_token
+            self.assertEqual(api.access_token, 'token')
+        self.assertEqual(len(calls), 1)
+        self.assertIsNot(WorkWechatCorpAPI('corp', 'other', 1, registry=registry)._global_access_token,
+                         api._global_access_token)
+
+    def test_lru_eviction(self):
+        registry = TokenRegistry(maxsize=2)
+        a = registry.get(('a', 's'))
+        registry.get(('b', 's'))
+        self.assertIs(registry.get(('a', 's')), a)
+        registry.get(('c', 's'))
+        self.assertEqual(len(registry), 2)
+        self.assertIn(('a', 's'), registry)
+        self.assertNotIn(('b', 's'), registry)
+
+    def test_new(self):
+        api = WorkWechatCorpAPI.new('token_a', 1)
+        other = WorkWechatCorpAPI.new('token_b', 1)
+        self.assertEqual(api.access_token, 'token_a')
+        self.assertEqual(other.access_token, 'token_b')
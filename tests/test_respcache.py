@@ -0,0 +1,225 @@
+import asyncio
+import threading
+import time
+import unittest
+from urllib.parse import urlsplit, parse_qs
+from wework.aio.corp import AsyncCorpAPI
+from wework.aio.transport import AsyncTransport
+from wework.cache import MemoryCache
+from wework.corp import WorkWechatCorpAPI
+from wework.respcache import ResponseCache
+from wework.retry import NO_RETRY
+from wework.transport import Transport
+from tests.test_retry import FakeResponse
+
+
+def corp_response(url):
+    parts = urlsplit(url)
+    query = parse_qs(parts.query)
+    if parts.path.endswith('/department/list'):
+        return {'errcode': 0, 'errmsg': 'ok', 'department': [{'id': int(query.get('id', ['1'])[0])}]}
+    if parts.path.endswith('/tag/list'):
+        return {'errcode': 0, 'errmsg': 'ok', 'taglist': []}
+    if parts.path.endswith('/tag/get'):
+        return {'errcode': 0, 'errmsg': 'ok', 'userlist': [{'userid': 'tag' + query['tagid'][0]}]}
+    return {'errcode': 0, 'errmsg': 'ok', 'userlist': [{'userid': 'zhangsan'}]}
+
+
+class CountingSession(object):
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.paths = []
+        self.lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        with self.lock:
+            self.paths.append(urlsplit(url).path.split('/cgi-bin/')[1])
+        time.sleep(self.delay)
+        return FakeResponse(corp_response(url))
+
+
+class CountingAsyncTransport(AsyncTransport):
+    def __init__(self):
+        super().__init__(retry_policy=NO_RETRY)
+        self.paths = []
+
+    async def request(self, method, url, **kwargs):
+        self.paths.append(urlsplit(url).path.split('/cgi-bin/')[1])
+        await asyncio.sleep(0.01)
+        return corp_response(url)
+
+
+def create_api(response_cache, delay=0):
+    transport = Transport(session=CountingSession(delay), retry_policy=NO_RETRY)
+    api = WorkWechatCorpAPI.new('token', 1, transport=transport)
+    api.corp_id = 'corp'
+    api.response_cache = response_cache
+    return api, transport.session
+
+
+class FakeHelper(object):
+    cache = {}
+
+    @classmethod
+    def cache_get(cls, key):
+        return cls.cache.get(key)
+
+    @classmethod
+    def cache_set(cls, key, value, ttl=None):
+        cls.cache[key] = value
+
+    @classmethod
+    def cache_delete(cls, key):
+        cls.cache.pop(key, None)
+
+
+class TestResponseCache(unittest.TestCase):
+    def test_read_through(self):
+        api, session = create_api(ResponseCache())
+        self.assertEqual(api.get_department_list(), [{'id': 1}])
+        self.assertEqual(api.get_department_list(), [{'id': 1}])
+        self.assertEqual(api.get_department_list(2), [{'id': 2}])
+        self.assertEqual(api.get_department_list(id=2), [{'id': 2}])
+        # 空的列表也会缓存
+        api.get_tag_list()
+        api.get_tag_list()
+        self.assertEqual(session.paths, ['department/list', 'department/list', 'tag/list'])
+        self.assertEqual(api.response_cache.stats()['hits'], 3)
+
+    def test_without_cache(self):
+        api, session = create_api(None)
+        api.get_tag_list()
+        api.get_tag_list()
+        self.assertEqual(len(session.paths), 2)
+
+    def test_ttl(self):
+        api, session = create_api(ResponseCache(ttls={'tag/get': 0.05, 'tag/list': None}))
+        api.get_tag_user_list(1)
+        api.get_tag_user_list(1)
+        time.sleep(0.1)
+        api.get_tag_user_list(1)
+        api.get_tag_list()
+        api.get_tag_list()
+        self.assertEqual(session.paths, ['tag/get', 'tag/get', 'tag/list', 'tag/list'])
+
+    def test_maxsize(self):
+        api, session = create_api(ResponseCache(maxsize=2))
+        for tag_id in (1, 2, 3, 1):
+            api.get_tag_user_list(tag_id)
+        self.assertEqual(len(session.paths), 4)
+
+    def test_coalesce(self):
+        api, session = create_api(ResponseCache(), delay=0.05)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(api.get_department_user_list(1, True)))
+                   for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(results), 10)
+        self.assertEqual(session.paths, ['user/simplelist'])
+
+    def test_invalidate(self):
+        cache = ResponseCache()
+        api, session = create_api(cache)
+        api.get_tag_user_list(1)
+        api.get_tag_user_list(2)
+        api.get_department_list()
+        cache.invalidate('corp', 'tag/get', {'tag_id': 1})
+        api.get_tag_user_list(1)
+        api.get_tag_user_list(2)
+        self.assertEqual(session.paths.count('tag/get'), 3)
+        cache.invalidate('corp', 'tag/get')
+        api.get_tag_user_list(2)
+        self.assertEqual(session.paths.count('tag/get'), 4)
+        cache.invalidate('other')
+        api.get_department_list()
+        cache.invalidate('corp')
+        api.get_department_list()
+        self.assertEqual(session.paths.count('department/list'), 2)
+
+    def test_normalize_params(self):
+        cache = ResponseCache()
+        api, session = create_api(cache)
+        api.get_tag_user_list(1)
+        api.get_tag_user_list('1')
+        api.get_department_user_list(2)
+        api.get_department_user_list('2', fetch_child=0)
+        self.assertEqual(session.paths, ['tag/get', 'user/simplelist'])
+        cache.invalidate('corp', 'tag/get', {'tag_id': '1'})
+        api.get_tag_user_list(1)
+        self.assertEqual(session.paths.count('tag/get'), 2)
+
+    def test_invalidate_event(self):
+        cache = ResponseCache()
+        api, session = create_api(cache)
+        api.get_department_list()
+        api.get_tag_user_list(1)
+        api.get_tag_user_list(2)
+        cache.invalidate_event('corp', {'Event': 'change_contact', 'ChangeType': 'update_tag', 'TagId': '1'})
+        cache.invalidate_event('corp', {'Event': 'enter_agent'})
+        api.get_department_list()
+        api.get_tag_user_list(1)
+        api.get_tag_user_list(2)
+        self.assertEqual(session.paths, ['department/list', 'tag/get', 'tag/get', 'tag/get'])
+        cache.invalidate_event('corp', {'Event': 'change_contact', 'ChangeType': 'update_party', 'Id': '2'})
+        api.get_department_list()
+        self.assertEqual(session.paths.count('department/list'), 2)
+        # 成员变更可能影响标签的成员列表
+        cache.invalidate_event('corp', {'Event': 'change_contact', 'ChangeType': 'update_user', 'UserID': 'a'})
+        api.get_tag_user_list(1)
+        self.assertEqual(session.paths.count('tag/get'), 4)
+
+    def test_invalidate_during_fetch(self):
+        cache = ResponseCache()
+        api, session = create_api(cache, delay=0.05)
+        thread = threading.Thread(target=api.get_tag_list)
+        thread.start()
+        time.sleep(0.01)
+        cache.invalidate('corp', 'tag/list')
+        thread.join()
+        # 失效前发出的请求的结果不会写入缓存
+        api.get_tag_list()
+        self.assertEqual(session.paths, ['tag/list', 'tag/list'])
+
+    def test_shared_backend(self):
+        backend = MemoryCache()
+        api1, session1 = create_api(ResponseCache(backend=backend))
+        api2, session2 = create_api(ResponseCache(backend=backend, local_ttl=0.05))
+        api1.get_department_list()
+        api2.get_department_list()
+        self.assertEqual(session2.paths, [])
+        api1.response_cache.invalidate('corp', 'department/list')
+        time.sleep(0.1)
+        api2.get_department_list()
+        self.assertEqual(session2.paths, ['department/list'])
+
+    def test_helper_backend(self):
+        FakeHelper.cache.clear()
+        api1, session1 = create_api(ResponseCache(backend=FakeHelper))
+        api2, session2 = create_api(ResponseCache(backend=FakeHelper))
+        api1.get_tag_list()
+        api2.get_tag_list()
+        self.assertEqual(len(session1.paths) + len(session2.paths), 1)
+        self.assertTrue(FakeHelper.cache)
+
+
+class TestResponseCacheAsync(unittest.TestCase):
+    def test_coalesce(self):
+        transport = CountingAsyncTransport()
+        api = AsyncCorpAPI.new('token', 1, transport=transport)
+        api.corp_id = 'corp'
+        api.response_cache = ResponseCache()
+
+        async def main():
+            results = await asyncio.gather(*(api.get_tag_user_list(1) for _ in range(10)))
+            results.append(await api.get_tag_user_list(1))
+            return results
+        results = asyncio.run(main())
+        self.assertEqual(results, [[{'userid': 'tag1'}]] * 11)
+        self.assertEqual(transport.paths, ['tag/get'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+from wework import rq
+from wework.corp import WorkWechatCorpAPI
+from wework.ierror import APIValueError
+from wework.registry import TokenRegistry
+from wework.retry import RetryPolicy, NO_RETRY, replace_url_token, get_url_token
+from wework.transport import Transport
+
+
+class FakeResponse(object):
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class ScriptedSession(object):
+    """按顺序返回预设的响应，元素为异常时抛出"""
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.urls = []
+
+    def request(self, method, url, **kwargs):
+        self.urls.append(url)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return FakeResponse(response)
+
+
+def create_transport(responses, **kwargs):
+    kwargs.setdefault('retry_policy', RetryPolicy(backoff=0))
+    return Transport(session=ScriptedSession(responses), **kwargs)
+
+
+class TestRetry(unittest.TestCase):
+    def test_token_invalid_replay(self):
+        t = create_transport([
+            {'errcode': 0, 'access_token': 'old', 'expires_in': 7200},
+            {'errcode': 42001},
+            {'errcode': 0, 'access_token': 'new', 'expires_in': 7200},
+            {'errcode': 0, 'taglist': []},
+        ])
+        api = WorkWechatCorpAPI('corp', 'secret', 1, transport=t, registry=TokenRegistry())
+        self.assertEqual(api.get_tag_list(), [])
+        self.assertIn('access_token=old', t.session.urls[1])
+        self.assertIn('access_token=new', t.session.urls[3])
+        self.assertEqual(t.metrics.get('retry', reason='token'), 1)
+
+    def test_token_invalid_replay_once(self):
+        t = create_transport([{'errcode': 40014}, {'errcode': 40014}])
+        api = WorkWechatCorpAPI.new('token', 1, transport=t)
+        with self.assertRaises(APIValueError):
+            api.get_tag_list()
+        self.assertEqual(len(t.session.urls), 2)
+
+    def test_transient(self):
+        t = create_transport([{'errcode': -1}, {'errcode': -1}, {'errcode': 0}])
+        self.assertEqual(rq.get('https://qyapi.weixin.qq.com/cgi-bin/tag/list', t), {'errcode': 0})
+        self.assertEqual(t.metrics.get('retry', reason='errcode', errcode=-1), 2)
+
+    def test_max_retries(self):
+        t = create_transport([{'errcode': -1}] * 3, retry_policy=RetryPolicy(max_retries=2, backoff=0))
+        with self.assertRaises(APIValueError):
+            rq.get('https://qyapi.weixin.qq.com/cgi-bin/tag/list', t)
+        self.assertEqual(t.metrics.get('error'), 1)
+
+    def test_connection_error(self):
+        t = create_transport([requests.ConnectionError(), {'errcode': 0}])
+        self.assertEqual(rq.get('https://qyapi.weixin.qq.com/cgi-bin/tag/list', t), {'errcode': 0})
+        t = create_transport([requests.ReadTimeout(), {'errcode': 0}])
+        with self.assertRaises(requests.ReadTimeout):
+            rq.post('https://qyapi.weixin.qq.com/cgi-bin/message/send', {}, t)
+
+    def test_post_connection_refused(self):
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/message/send'
+        refused = requests.ConnectionError(MaxRetryError(None, url, NewConnectionError(None, 'Connection refused')))
+        t = create_transport([refused, {'errcode': 0}])
+        self.assertEqual(rq.post(url, {}, t), {'errcode': 0})
+        self.assertEqual(t.metrics.get('retry', reason='connection'), 1)
+        # 连接中断时请求可能已经发出，POST 不重试
+        aborted = requests.ConnectionError(ProtocolError('Connection aborted.'))
+        t = create_transport([aborted, {'errcode': 0}])
+        with self.assertRaises(requests.ConnectionError):
+            rq.post(url, {}, t)
+
+    def test_endpoint_policy(self):
+        t = create_transport([{'errcode': -1}, {'errcode': 0}],
+                             retry_policies={'/cgi-bin/message/': NO_RETRY})
+        with self.assertRaises(APIValueError):
+            rq.post('https://qyapi.weixin.qq.com/cgi-bin/message/send?access_token=a', {}, t)
+        self.assertEqual(rq.get('https://qyapi.weixin.qq.com/cgi-bin/tag/list', t), {'errcode': 0})
+
+    def test_backoff(self):
+        policy = RetryPolicy(backoff=1, max_backoff=3, jitter=0)
+        self.assertEqual([policy.backoff_time(i) for i in range(4)], [1, 2, 3, 3])
+
+    def test_replace_url_token(self):
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/service/x?suite_access_token=a&id=1'
+        self.assertEqual(get_url_token(url), 'a')
+        self.assertEqual(replace_url_token(url, 'b'), 'https://qyapi.weixin.qq.com/cgi-bin/service/x?suite_access_token=b&id=1')
@@ -0,0 +1,198 @@
+import threading
+import time
+import unittest
+from wework.directory import DirectoryIndex
+from wework.ierror import APIValueError
+from wework.sync import DirectorySync, parse_event
+
+
+class SyncAPI(object):
+    def __init__(self):
+        self.departments = {1: {'id': 1, 'name': '公司', 'parentid': 0}, 2: {'id': 2, 'name': '研发', 'parentid': 1}}
+        self.users = {'alice': {'userid': 'alice', 'name': 'Alice', 'department': [2], 'is_leader_in_dept': [1]}}
+        self.tags = {1: ['alice']}
+        self.calls = []
+
+    def get_department_list(self, id=None):
+        self.calls.append(('department', id))
+        if id is not None and id not in self.departments:
+            raise APIValueError({'errcode': 60123, 'errmsg': 'invalid party id'})
+        return [d for d in self.departments.values() if id is None or d['id'] == id or d['parentid'] == id]
+
+    def get_department_user_detail_list(self, department_id, fetch_child=False):
+        return list(self.users.values())
+
+    def get_user_detail(self, user_id, max_age=None):
+        assert max_age == 0
+        self.calls.append(('user', user_id))
+        if user_id not in self.users:
+            raise APIValueError({'errcode': 60111, 'errmsg': 'userid not found'})
+        return dict(self.users[user_id], errcode=0, errmsg='ok')
+
+    def get_tag_list(self):
+        return [{'tagid': id, 'tagname': 'tag{}'.format(id)} for id in self.tags]
+
+    def get_tag_user_list(self, tag_id):
+        self.calls.append(('tag', tag_id))
+        if tag_id not in self.tags:
+            raise APIValueError({'errcode': 40068, 'errmsg': 'invalid tagid'})
+        return [{'userid': userid} for userid in self.tags[tag_id]]
+
+
+def event(change_type, create_time, **kwargs):
+    return dict(Event='change_contact', ChangeType=change_type, CreateTime=str(create_time), **kwargs)
+
+
+class TestDirectorySync(unittest.TestCase):
+    def setUp(self):
+        self.api = SyncAPI()
+        self.index = DirectoryIndex(self.api)
+        self.sync = DirectorySync(self.index, skew=0)
+        self.sync.reconcile()
+        self.now = int(time.time()) + 1
+
+    def test_parse_event(self):
+        xml = (
+            '<xml><ToUserName><![CDATA[corp]]></ToUserName><CreateTime>1403610513</CreateTime>'
+            '<MsgType><![CDATA[event]]></MsgType><Event><![CDATA[change_contact]]></Event>'
+            '<ChangeType>update_party</ChangeType><Id>2</Id></xml>'
+        )
+        data = parse_event(xml.encode('utf-8'))
+        self.assertEqual(data['CreateTime'], '1403610513')
+        self.assertEqual(data['Id'], '2')
+        self.assertEqual(data['Event'], 'change_contact')
+
+    def test_create_user(self):
+        self.api.users['bob'] = {'userid': 'bob', 'department': [2], 'is_leader_in_dept': [0]}
+        self.api.calls = []
+        self.assertEqual(self.sync.handle(event('create_user', self.now, UserID='bob')), [True])
+        self.assertEqual(self.api.calls, [('user', 'bob')])
+        self.assertEqual(self.index.get_department_users(1, recursive=True), {'alice', 'bob'})
+        self.assertNotIn('errcode', self.index.get_user('bob'))
+
+    def test_out_of_order(self):
+        self.api.users.pop('alice')
+        self.sync.handle(event('delete_user', self.now + 5, UserID='alice'))
+        # 更早的 update_user 迟到，不会恢复已删除的成员
+        self.assertEqual(self.sync.handle(event('update_user', self.now, UserID='alice')), [False])
+        self.assertIsNone(self.index.get_user('alice'))
+
+    def test_idempotent(self):
+        self.api.users['alice']['name'] = 'Alice2'
+        e = event('update_user', self.now, UserID='alice')
+        self.assertEqual(self.sync.handle(e, e), [True, True])
+        self.assertEqual(self.index.get_user('alice')['name'], 'Alice2')
+        self.assertEqual(len(self.index.users), 1)
+
+    def test_new_userid(self):
+        self.api.users['alice2'] = dict(self.api.users.pop('alice'), userid='alice2')
+        self.sync.handle(event('update_user', self.now, UserID='alice', NewUserID='alice2'))
+        self.assertEqual(set(self.index.users), {'alice2'})
+
+    def test_delete_user_from_tags(self):
+        self.api.users.pop('alice')
+        self.sync.handle(event('delete_user', self.now, UserID='alice'))
+        self.assertEqual(self.sync.tags[1]['userlist'], [])
+        self.assertEqual(self.index.get_user_tags('alice'), set())
+
+    def test_new_userid_in_tags(self):
+        self.api.users['alice2'] = dict(self.api.users.pop('alice'), userid='alice2')
+        self.sync.handle(event('update_user', self.now, UserID='alice', NewUserID='alice2'))
+        self.assertEqual(self.sync.tags[1]['userlist'], ['alice2'])
+
+    def test_fetch_without_lock(self):
+        self.api.users['bob'] = {'userid': 'bob', 'department': [2]}
+        get_user_detail = self.api.get_user_detail
+        applied = []
+
+        def slow_get_user_detail(user_id, max_age=None):
+            # 拉取期间其它线程可以应用事件
+            thread = threading.Thread(target=lambda: applied.append(
+                self.sync.apply(event('delete_party', self.now, Id='2'))))
+            thread.start()
+            thread.join(1)
+            return get_user_detail(user_id, max_age)
+        self.api.get_user_detail = slow_get_user_detail
+        self.assertEqual(self.sync.handle(event('create_user', self.now, UserID='bob')), [True])
+        self.assertEqual(applied, [True])
+        self.assertIn('bob', self.sync.users)
+
+    def test_stale_fetch_discarded(self):
+        self.api.users['alice']['name'] = 'Alice2'
+        get_user_detail = self.api.get_user_detail
+
+        def slow_get_user_detail(user_id, max_age=None):
+            user = get_user_detail(user_id, max_age)
+            # 拉取期间应用了更新的删除事件，本次拉取的结果被丢弃
+            self.sync.apply(event('delete_user', self.now + 5, UserID='alice'))
+            return user
+        self.api.get_user_detail = slow_get_user_detail
+        self.assertEqual(self.sync.handle(event('update_user', self.now, UserID='alice')), [False])
+        self.assertNotIn('alice', self.sync.users)
+
+    def test_user_gone(self):
+        self.sync.handle(event('update_user', self.now, UserID='ghost'))
+        self.assertIsNone(self.index.get_user('ghost'))
+
+    def test_party(self):
+        self.api.departments[3] = {'id': 3, 'name': '销售', 'parentid': 1}
+        self.sync.handle(event('create_party', self.now, Id='3'))
+        self.assertEqual(self.index.get_children(1), (2, 3))
+        self.api.departments[3]['parentid'] = 2
+        self.sync.handle(event('update_party', self.now + 1, Id='3'))
+        self.assertEqual(self.index.get_ancestors(3), (2, 1))
+        del self.api.departments[3]
+        self.sync.handle(event('delete_party', self.now + 2, Id='3'))
+        self.assertIsNone(self.index.get_department(3))
+
+    def test_tag(self):
+        self.api.tags[1] = []
+        self.api.tags[2] = ['alice']
+        self.sync.handle(event('update_tag', self.now, TagId='1'), event('update_tag', self.now, TagId='2'))
+        self.assertEqual(self.index.get_user_tags('alice'), {2})
+        self.assertEqual(self.index.tags[2]['tagname'], 'tag2')
+
+    def test_invalidate_response_cache(self):
+        events = []
+        self.api.corp_id = 'corp'
+        self.api.response_cache = type('Cache', (object, ), {'invalidate_event': lambda s, *a: events.append(a)})()
+        e = event('update_tag', self.now, TagId='1')
+        self.sync.handle(e)
+        self.assertEqual(events, [('corp', e)])
+
+    def test_ignore_other_events(self):
+        snapshot = self.index.snapshot
+        self.assertEqual(self.sync.handle({'Event': 'enter_agent'}), [False])
+        self.assertIs(self.index.snapshot, snapshot)
+
+    def test_reconcile_keeps_newer_events(self):
+        # 全量拉取开始后应用的事件比全量结果更新
+        self.api.users['bob'] = {'userid': 'bob', 'department': [2]}
+        fetch = self.index.fetch
+
+        def slow_fetch():
+            snapshot = fetch()
+            self.sync.handle(event('delete_user', int(time.time()), UserID='bob'))
+            return snapshot
+        self.index.fetch = slow_fetch
+        self.sync.reconcile()
+        self.assertIsNone(self.index.get_user('bob'))
+        self.assertIsNotNone(self.index.get_user('alice'))
+
+    def test_reconcile_drops_old_events(self):
+        self.api.users['bob'] = {'userid': 'bob', 'department': [2]}
+        self.assertEqual(self.sync.handle(event('create_user', self.now - 100, UserID='bob')), [False])
+        self.assertIsNone(self.index.get_user('bob'))
+
+    def test_background(self):
+        sync = DirectorySync(DirectoryIndex(self.api), reconcile_interval=60)
+        with sync:
+            for _ in range(100):
+                if sync.index.users:
+                    break
+                time.sleep(0.01)
+        self.assertIn('alice', sync.index.users)
+
+
+if __name__ == '__main__':
+    unittest.main()
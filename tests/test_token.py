@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+import unittest
+from wework.aio import AsyncCorpAPI
+from wework.base import BaseWechatAPI
+from wework.cache import L1Cache, default_l1_cache
+from wework.corp import WorkWechatCorpAPI
+from wework.helpers import BaseHelper
+from wework.ierror import GetAccessTokenError
+from wework.registry import TokenRegistry
+from wework.settings import Settings
+
+
+class MemoryHelper(BaseHelper):
+    data = {}
+
+    @classmethod
+    def cache_get(cls, key):
+        return cls.data.get(key)
+
+    @classmethod
+    def cache_set(cls, key, value, **kwargs):
+        cls.data[key] = value
+
+
+class CountingAPI(BaseWechatAPI):
+    def __init__(self, error=None):
+        self.settings = Settings({'HELPER': MemoryHelper})
+        self._global_access_token = {'name': ('test_access_token', 'test_expires_time')}
+        self.error = error
+        self.calls = 0
+
+    def _get_access_token(self):
+        self.calls += 1
+        time.sleep(0.05)
+        if self.error:
+            raise self.error
+        return 'token', 7200
+
+
+def hammer(func, n=500):
+    barrier = threading.Barrier(n)
+    results, errors = [], []
+
+    def run():
+        barrier.wait()
+        try:
+            results.append(func())
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=run) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+class TestSingleFlightToken(unittest.TestCase):
+    def setUp(self):
+        MemoryHelper.data = {}
+        default_l1_cache.invalidate()
+
+    def test_corp_api(self):
+        api = WorkWechatCorpAPI('corp', 'secret', 1, registry=TokenRegistry())
+        calls = []
+
+        def _get_access_token():
+            calls.append(1)
+            time.sleep(0.05)
+            return 'token', 7200
+        api._get_access_token = _get_access_token
+        results, errors = hammer(lambda: api.access_token)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['token'] * 500)
+
+    def test_cached_api(self):
+        api = CountingAPI()
+        results, errors = hammer(lambda: api.access_token)
+        self.assertEqual(api.calls, 1)
+        self.assertEqual(set(results), {'token'})
+
+    def test_error_reaches_waiters(self):
+        api = CountingAPI(GetAccessTokenError('boom'))
+        results, errors = hammer(lambda: api.access_token, 50)
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 50)
+        self.assertTrue(all(isinstance(e, GetAccessTokenError) for e in errors))
+
+    def test_async_corp_api(self):
+        api = AsyncCorpAPI('corp', 'secret', 1, registry=TokenRegistry())
+        calls = []
+
+        async def _get_access_token():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'token', 7200
+        api._get_access_token = _get_access_token
+
+        async def main():
+            return await asyncio.gather(*[api.access_token for _ in range(500)])
+        self.assertEqual(asyncio.run(main()), ['token'] * 500)
+        self.assertEqual(len(calls), 1)
+
+    def test_async_leader_cancelled(self):
+        api = AsyncCorpAPI('corp', 'secret', 1, registry=TokenRegistry())
+        calls = []
+
+        async def _get_access_token():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'token', 7200
+        api._get_access_token = _get_access_token
+
+        async def main():
+            leader = asyncio.ensure_future(api.access_token)
+            await asyncio.sleep(0.01)
+            waiters = [asyncio.ensure_future(api.access_token) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            results = await asyncio.gather(leader, *waiters, return_exceptions=True)
+            return results[0], results[1:]
+        leader, waiters = asyncio.run(main())
+        # 第一个调用者被取消不影响其它等待同一次刷新的调用者
+        self.assertIsInstance(leader, asyncio.CancelledError)
+        self.assertEqual(waiters, ['token'] * 3)
+        self.assertEqual(len(calls), 1)
+
+
+class TestL1Cache(unittest.TestCase):
+    def setUp(self):
+        MemoryHelper.data = {}
+        self.l1 = L1Cache(margin=60)
+
+    def test_hits_without_helper(self):
+        api = CountingAPI()
+        api.settings.data['L1_CACHE'] = self.l1
+        api.access_token
+        gets = []
+        cache_get_many = MemoryHelper.cache_get_many
+        MemoryHelper.cache_get_many = classmethod(lambda cls, keys: gets.append(keys) or cache_get_many(keys))
+        try:
+            for _ in range(10):
+                self.assertEqual(api.access_token, 'token')
+        finally:
+            MemoryHelper.cache_get_many = cache_get_many
+        self.assertEqual(api.calls, 1)
+        self.assertEqual(gets, [])
+        self.assertEqual(self.l1.stats()['hits'], 10)
+
+    def test_margin(self):
+        self.l1.set('a', 1, time.time() + 30)
+        self.assertIsNone(self.l1.get('a'))
+        self.assertEqual(self.l1.stats()['misses'], 1)
+
+    def test_invalidate(self):
+        api = CountingAPI()
+        api.settings.data['L1_CACHE'] = self.l1
+        api.access_token
+        api.invalidate_access_token('other')
+        api.access_token
+        self.assertEqual(api.calls, 1)
+        api.invalidate_access_token('token')
+        api.access_token
+        self.assertEqual(api.calls, 2)
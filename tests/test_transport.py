@@ -0,0 +1,56 @@
+import unittest
+from wework import rq, transport
+from wework.corp import WorkWechatCorpAPI
+from wework.ierror import APIValueError
+from wework.registry import TokenRegistry
+
+
+class FakeResponse(object):
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class FakeSession(object):
+    def __init__(self, data):
+        self.data = data
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        return FakeResponse(self.data)
+
+    def close(self):
+        pass
+
+
+class TestTransport(unittest.TestCase):
+    def test_timeout(self):
+        session = FakeSession({'errcode': 0})
+        t = transport.Transport(connect_timeout=1, read_timeout=2, session=session)
+        rq.get('https://example.com', t)
+        self.assertEqual(session.calls[0][2]['timeout'], (1, 2))
+
+    def test_pool_size(self):
+        t = transport.Transport(pool_maxsize=32)
+        adapter = t.session.get_adapter('https://qyapi.weixin.qq.com')
+        self.assertEqual(adapter._pool_maxsize, 32)
+
+    def test_errcode(self):
+        t = transport.Transport(session=FakeSession({'errcode': 40014}))
+        with self.assertRaises(APIValueError):
+            rq.post('https://example.com', {}, t)
+
+    def test_create_transport(self):
+        self.assertIs(transport.create_transport(), transport.get_default_transport())
+        self.assertEqual(transport.create_transport({'read_timeout': 3}).timeout[1], 3)
+
+    def test_corp_api_shares_transport(self):
+        session = FakeSession({'errcode': 0, 'access_token': 'token', 'expires_in': 7200, 'taglist': []})
+        t = transport.Transport(session=session)
+        api = WorkWechatCorpAPI('corp', 'secret', 1, transport=t, registry=TokenRegistry())
+        api.get_tag_list()
+        self.assertIs(api.msg.transport, t)
+        self.assertEqual(len(session.calls), 2)
@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+import unittest
+from urllib.parse import urlsplit, parse_qs
+from wework.aio.corp import AsyncCorpAPI
+from wework.aio.transport import AsyncTransport
+from wework.corp import WorkWechatCorpAPI
+from wework.ierror import APIValueError
+from wework.retry import NO_RETRY
+from wework.transport import Transport
+from wework.users import UserCache
+from tests.test_retry import FakeResponse
+
+
+def user_response(url):
+    userid = parse_qs(urlsplit(url).query)['userid'][0]
+    if userid.startswith('missing'):
+        return {'errcode': 60111, 'errmsg': 'userid not found'}
+    return {'errcode': 0, 'errmsg': 'ok', 'userid': userid, 'name': userid.upper()}
+
+
+class UserSession(object):
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.userids = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        with self.lock:
+            self.userids.append(parse_qs(urlsplit(url).query)['userid'][0])
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        return FakeResponse(user_response(url))
+
+
+class UserAsyncTransport(AsyncTransport):
+    def __init__(self):
+        super().__init__(retry_policy=NO_RETRY)
+        self.userids = []
+
+    async def request(self, method, url, **kwargs):
+        self.userids.append(parse_qs(urlsplit(url).query)['userid'][0])
+        await asyncio.sleep(0.001)
+        return user_response(url)
+
+
+def create_api(delay=0, user_cache=None):
+    transport = Transport(session=UserSession(delay), retry_policy=NO_RETRY)
+    api = WorkWechatCorpAPI.new('token', 1, transport=transport)
+    api.corp_id = 'corp'
+    api.user_cache = user_cache
+    return api, transport.session
+
+
+class TestGetUsers(unittest.TestCase):
+    def test_order_and_errors(self):
+        api, session = create_api()
+        results = api.get_users(['b', 'a', 'missing1', 'b'])
+        self.assertEqual([r.userid for r in results], ['b', 'a', 'missing1', 'b'])
+        self.assertEqual(results[0].user['name'], 'B')
+        self.assertIs(results[0], results[3])
+        self.assertFalse(results[2].ok)
+        self.assertIsInstance(results[2].error, APIValueError)
+        self.assertEqual(sorted(session.userids), ['a', 'b', 'missing1'])
+
+    def test_bounded_pool(self):
+        api, session = create_api(delay=0.01)
+        results = api.get_users(['u{}'.format(i) for i in range(40)], max_workers=4)
+        self.assertTrue(all(r.ok for r in results))
+        self.assertLessEqual(session.max_active, 4)
+        self.assertGreater(session.max_active, 1)
+
+    def test_cache(self):
+        api, session = create_api(user_cache=UserCache())
+        api.get_users(['a', 'b', 'missing1'])
+        results = api.get_users(['a', 'c', 'missing1'])
+        self.assertEqual([r.cached for r in results], [True, False, False])
+        # 失败的结果不缓存
+        self.assertEqual(session.userids.count('missing1'), 2)
+        self.assertEqual(session.userids.count('a'), 1)
+        api.get_users(['a'], max_age=0)
+        self.assertEqual(session.userids.count('a'), 2)
+
+    def test_get_user_detail_max_age(self):
+        cache = UserCache()
+        api, session = create_api(user_cache=cache)
+        self.assertEqual(api.get_user_detail('a')['name'], 'A')
+        self.assertEqual(api.get_user_detail('a')['name'], 'A')
+        self.assertEqual(session.userids, ['a'])
+        cache.cache.set(cache._key('corp', 'a'), {'user': {'name': 'old'}, 'time': time.time() - 100}, 600)
+        self.assertEqual(api.get_user_detail('a')['name'], 'old')
+        self.assertEqual(api.get_user_detail('a', max_age=10)['name'], 'A')
+        self.assertEqual(api.get_user_detail('a', max_age=0)['name'], 'A')
+        self.assertEqual(session.userids, ['a', 'a', 'a'])
+
+    def test_without_cache(self):
+        api, session = create_api()
+        api.get_user_detail('a')
+        api.get_user_detail('a')
+        self.assertEqual(session.userids, ['a', 'a'])
+
+    def test_cache_ttl(self):
+        cache = UserCache(ttl=0.05)
+        cache.set('corp', 'a', {'userid': 'a'})
+        self.assertEqual(cache.get('corp', 'a'), {'userid': 'a'})
+        self.assertIsNone(cache.get('other', 'a'))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('corp', 'a'))
+
+
+class TestGetUsersAsync(unittest.TestCase):
+    def test_get_users(self):
+        transport = UserAsyncTransport()
+        api = AsyncCorpAPI.new('token', 1, transport=transport)
+        api.user_cache = UserCache()
+
+        async def main():
+            first = await api.get_users(['a', 'missing1', 'a', 'b'], max_workers=2)
+            second = await api.get_users(['b', 'c'])
+            return first, second
+        first, second = asyncio.run(main())
+        self.assertEqual([r.ok for r in first], [True, False, True, True])
+        self.assertEqual([r.cached for r in second], [True, False])
+        self.assertEqual(sorted(transport.userids), ['a', 'b', 'c', 'missing1'])
+        self.assertEqual(asyncio.run(api.get_user_detail('c'))['name'], 'C')
+        self.assertEqual(len(transport.userids), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,22 @@
 from .helpers.official import DjangoHelper
 from .settings import init
 from .wxcrypt import WXBizMsgCrypt, parse_xml
-from .corp import WorkWechatCorpAPI as CorpAPI
\ No newline at end of file
+from .corp import WorkWechatCorpAPI as CorpAPI
+from .transport import Transport
+from .refresher import TokenRefresher
+from .registry import TokenRegistry
+from .lease import BaseLease, FileLease, TokenLease
+from .cache import BaseCache, MemoryCache, DjangoCache, SQLiteCache, FileCache
+from .cache import L1Cache
+from .retry import RetryPolicy
+from .metrics import Metrics
+from .ratelimit import RateLimiter
+from .outbox import Outbox
+from .coalesce import SendCoalescer
+from .template import MessageTemplate
+from .media import MediaCache
+from .users import UserCache
+from .respcache import ResponseCache
+from .directory import DirectoryIndex
+from .crawler import DirectoryCrawler
+from .sync import DirectorySync
@@ -0,0 +1,15 @@
+from ..settings import Settings, check
+from .transport import AsyncTransport, create_transport
+from .corp import AsyncCorpAPI
+from .msg import AsyncMSG
+from .refresher import AsyncTokenRefresher
+from ..coalesce import AsyncSendCoalescer
+from .wechat import AsyncWorkWechatApi, AsyncWorkWechatSuiteApi, AsyncWorkProviderWechatApi
+
+
+def init(**kwargs):
+    """同 wework.init，返回的对象中 suite_api、provider_api 为异步版本。可通过 ASYNC_TRANSPORT 配置异步连接池"""
+    check(kwargs)
+    kwargs['ASYNC_TRANSPORT'] = create_transport(kwargs.get('ASYNC_TRANSPORT'))
+    settings = Settings(kwargs)
+    return AsyncWorkWechatApi(settings)
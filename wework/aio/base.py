@@ -0,0 +1,120 @@
+import time
+from ..cache import default_l1_cache
+from ..ierror import GetAccessTokenError
+from ..singleflight import AsyncSingleFlight
+
+
+_token_flight = AsyncSingleFlight()
+
+
+class AsyncBaseWechatAPI(object):
+    """
+    异步版本的 BaseWechatAPI。
+    access_token 属性返回一个 awaitable 对象，使用方式为 ``token = await api.access_token``
+    """
+    @property
+    def access_token(self):
+        return self._get_cached_access_token()
+
+    @access_token.setter
+    def access_token(self, value):
+        raise ValueError('禁止对 access_token 进行赋值操作')
+
+    @property
+    def _l1_cache(self):
+        """进程内一级缓存，settings 中 L1_CACHE 为 False 时不使用"""
+        l1 = self.settings.data.get('L1_CACHE')
+        return default_l1_cache if l1 is None else l1
+
+    def _read_cache_access_token(self):
+        """返回缓存中的 (access_token, expires_time)，缓存不存在时均为 None"""
+        access_token_name, expires_name = self._global_access_token['name']
+        # 先读过期时间，同 BaseWechatAPI
+        data = self.settings.HELPER.cache_get_many([expires_name, access_token_name])
+        if data.get(access_token_name) is None or data.get(expires_name) is None:
+            return None, None
+        return data[access_token_name], data[expires_name]
+
+    def _get_cache_access_token(self):
+        """返回可以直接使用的 access_token，已过期或者配置了 TOKEN_LEASE 且需要刷新时返回 None"""
+        access_token_name = self._global_access_token['name'][0]
+        l1 = self._l1_cache
+        if l1:
+            access_token = l1.get((self.settings.HELPER, access_token_name))
+            if access_token is not None:
+                return access_token
+        access_token, expires_time = self._read_cache_access_token()
+        lease = self.settings.data.get('TOKEN_LEASE')
+        if lease is not None:
+            fresh = lease.is_fresh(access_token, expires_time)
+        else:
+            fresh = access_token is not None and time.time() < expires_time
+        if not fresh:
+            return None
+        self._set_l1_access_token(access_token, expires_time)
+        return access_token
+
+    def _set_l1_access_token(self, access_token, expires_time):
+        l1 = self._l1_cache
+        if l1:
+            lease = self.settings.data.get('TOKEN_LEASE')
+            # 同 BaseWechatAPI，开始提前刷新的时间点之后不再由一级缓存返回
+            stale_window = lease.stale_window if lease is not None else 0
+            l1.set((self.settings.HELPER, self._global_access_token['name'][0]), access_token,
+                   expires_time - stale_window)
+
+    def invalidate_access_token(self, access_token=None):
+        """同 BaseWechatAPI.invalidate_access_token"""
+        access_token_name, expires_name = self._global_access_token['name']
+        l1 = self._l1_cache
+        if l1:
+            l1.invalidate((self.settings.HELPER, access_token_name))
+        if access_token is not None and self.settings.HELPER.cache_get(access_token_name) != access_token:
+            return
+        self.settings.HELPER.cache_set_many({expires_name: 0})
+
+    async def _get_cached_access_token(self):
+        access_token = self._get_cache_access_token()
+        if access_token is None:
+            access_token = await _token_flight.do(self._global_access_token['name'], self._refresh_access_token)
+        return access_token
+
+    @property
+    def access_token_expires_time(self):
+        """缓存中 access_token 的过期时间戳，缓存不存在时为 None"""
+        access_token_name, expires_name = self._global_access_token['name']
+        data = self.settings.HELPER.cache_get_many([access_token_name, expires_name])
+        if data.get(access_token_name) is None:
+            return None
+        return data.get(expires_name)
+
+    async def refresh_access_token(self, expires_time=None):
+        """同 BaseWechatAPI.refresh_access_token，配置了 TOKEN_LEASE 时同样需要抢到租约"""
+        return await _token_flight.do(self._global_access_token['name'], self._refresh_access_token, True, expires_time)
+
+    async def _refresh_access_token(self, force=False, expires_time=None):
+        lease = self.settings.data.get('TOKEN_LEASE')
+        if lease is not None:
+            # 多个进程之间通过租约协调，只有一个进程去获取新的 token
+            return await lease.refresh_async(self._global_access_token['name'][0], self._read_cache_access_token,
+                                             self._fetch_access_token, force=force, expires_time=expires_time)
+        # 等待期间其它协程可能已经刷新完毕，再检查一次缓存
+        access_token = None if force else self._get_cache_access_token()
+        if access_token is None:
+            access_token = await self._fetch_access_token()
+        return access_token
+
+    async def _fetch_access_token(self):
+        """获取新的 access_token 并写入缓存"""
+        access_token_name, expires_name = self._global_access_token['name']
+        access_token, expires_in = await self._get_access_token()
+        expires_time = expires_in + int(time.time())
+        self.settings.HELPER.cache_set_many({
+            access_token_name: access_token,
+            expires_name: expires_time,
+        }, ttl=expires_in)
+        self._set_l1_access_token(access_token, expires_time)
+        return access_token
+
+    async def _get_access_token(self):
+        raise GetAccessTokenError('无法获取 access_token')
@@ -0,0 +1,158 @@
+import time
+from ..ierror import GetAccessTokenError
+from ..registry import TokenRegistry, default_registry
+from ..respcache import cached_response
+from .base import _token_flight
+from .msg import AsyncMSG
+from .transport import create_transport
+from ..users import get_users_async
+from . import rq
+
+
+__all__ = ['AsyncCorpAPI']
+
+
+class AsyncCorpAPI(object):
+    """
+    企业自建应用的异步api，接口与返回值同 WorkWechatCorpAPI，所有方法均需 await。
+    access_token 属性返回一个 awaitable 对象，msg 属性直接返回 AsyncMSG。
+    """
+    def __init__(self, corp_id, secret, agent_id, transport=None, registry=None, media_cache=None, user_cache=None,
+                 response_cache=None):
+        """
+        :param corp_id: 企业id
+        :param secret: 企业自建应用的secret
+        :param transport: 异步传输层，可以是 AsyncTransport 实例或其构造参数 dict，默认使用进程内共享的连接池
+        :param registry: TokenRegistry，同一个 (corp_id, secret) 的实例共享 access_token，默认使用进程内共享的注册表
+        :param media_cache: MediaCache，msg 上传临时素材时使用
+        :param user_cache: UserCache，get_user_detail 与 get_users 使用
+        :param response_cache: ResponseCache，缓存部门列表、标签列表等变化较少的接口的返回值
+        """
+        self.corp_id = corp_id
+        self.secret = secret
+        self.agent_id = agent_id
+        self.transport = create_transport(transport)
+        registry = default_registry if registry is None else registry
+        self._global_access_token = registry.get((corp_id, secret))
+        self._msg = None
+        self.media_cache = media_cache
+        self.user_cache = user_cache
+        self.response_cache = response_cache
+
+    @classmethod
+    def new(cls, access_token, agent_id, transport=None):
+        # 外部传入的 access_token 不放入共享的注册表
+        obj = cls('__', '__', agent_id, transport, TokenRegistry(1))
+
+        async def _get_access_token():
+            t = int(time.time()) + 7200
+            return access_token, t
+        obj._get_access_token = _get_access_token
+        return obj
+
+    @property
+    def msg(self):
+        """同一个实例的 AsyncMSG 会被复用，access_token 在发送时才获取：``await api.msg.send(...)``，参见 WorkWechatCorpAPI.msg"""
+        if self._msg is None:
+            self._msg = AsyncMSG(self, self.agent_id, self.transport, self.media_cache)
+        return self._msg
+
+    async def _get_access_token(self):
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/gettoken?corpid={}&corpsecret={}'.format(self.corp_id, self.secret)
+        data = await self.transport.get(url)
+        if 'access_token' not in data:
+            raise GetAccessTokenError(data)
+        return data['access_token'], data['expires_in']
+
+    @property
+    def access_token(self):
+        return self._get_cached_access_token()
+
+    async def _get_cached_access_token(self):
+        g = self._global_access_token
+        if 'access_token' not in g or time.time() >= g['expires_time']:
+            return await _token_flight.do(id(g), self._refresh_access_token, g)
+        return g['access_token']
+
+    @property
+    def access_token_expires_time(self):
+        """access_token 的过期时间戳，尚未获取过时为 None"""
+        return self._global_access_token.get('expires_time')
+
+    async def refresh_access_token(self, expires_time=None):
+        """同 WorkWechatCorpAPI.refresh_access_token，token 只保存在进程内，不使用 expires_time"""
+        g = self._global_access_token
+        return await _token_flight.do(id(g), self._refresh_access_token, g, True)
+
+    async def _refresh_access_token(self, g, force=False):
+        if force or 'access_token' not in g or time.time() >= g['expires_time']:
+            access_token, expires_in = await self._get_access_token()
+            g['expires_time'] = expires_in + int(time.time())
+            g['access_token'] = access_token
+        return g['access_token']
+
+    def invalidate_access_token(self, access_token=None):
+        """同 WorkWechatCorpAPI.invalidate_access_token"""
+        g = self._global_access_token
+        if access_token is None or g.get('access_token') == access_token:
+            g['expires_time'] = 0
+
+    @cached_response('department/list')
+    async def get_department_list(self, id=None):
+        """同 WorkWechatCorpAPI.get_department_list"""
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/department/list?access_token={}'.format(await self.access_token)
+        if id is not None:
+            url += '&id={}'.format(id)
+        return (await rq.get(url, self.transport, self))['department']
+
+    @cached_response('user/simplelist')
+    async def get_department_user_list(self, department_id, fetch_child=False):
+        """同 WorkWechatCorpAPI.get_department_user_list"""
+        fetch_child = 1 if fetch_child else 0
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/user/simplelist?' \
+              'access_token={}&department_id={}&fetch_child={}'.format(await self.access_token, department_id,
+                                                                        fetch_child)
+        return (await rq.get(url, self.transport, self))['userlist']
+
+    async def get_department_user_detail_list(self, department_id, fetch_child=False):
+        """同 WorkWechatCorpAPI.get_department_user_detail_list"""
+        fetch_child = 1 if fetch_child else 0
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/user/list?' \
+              'access_token={}&department_id={}&fetch_child={}'.format(await self.access_token, department_id,
+                                                                        fetch_child)
+        return (await rq.get(url, self.transport, self))['userlist']
+
+    async def get_user_detail(self, user_id, max_age=None):
+        """同 WorkWechatCorpAPI.get_user_detail"""
+        if self.user_cache is not None and max_age != 0:
+            user = self.user_cache.get(self.corp_id, user_id, max_age)
+            if user is not None:
+                return user
+        user = await self._fetch_user_detail(user_id)
+        if self.user_cache is not None:
+            self.user_cache.set(self.corp_id, user_id, user)
+        return user
+
+    async def get_users(self, user_ids, max_workers=8, max_age=None):
+        """同 WorkWechatCorpAPI.get_users"""
+        return await get_users_async(self, user_ids, max_workers, max_age)
+
+    async def _fetch_user_detail(self, user_id):
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/user/get?access_token={}&userid={}'.format(
+            await self.access_token,
+            user_id
+        )
+        return await rq.get(url, self.transport, self)
+
+    @cached_response('tag/list')
+    async def get_tag_list(self):
+        """同 WorkWechatCorpAPI.get_tag_list"""
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/tag/list?access_token={}'.format(await self.access_token)
+        return (await rq.get(url, self.transport, self))['taglist']
+
+    @cached_response('tag/get')
+    async def get_tag_user_list(self, tag_id):
+        """同 WorkWechatCorpAPI.get_tag_user_list"""
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/tag/get?access_token={}&tagid={}'.format(
+            await self.access_token, tag_id)
+        return (await rq.get(url, self.transport, self))['userlist']
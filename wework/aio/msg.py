@@ -0,0 +1,82 @@
+import asyncio
+from ..ierror import SendMsgError, UploadError
+from ..msg import MSG
+from .. import bulk
+from ..coalesce import coalesce_key
+from .transport import create_transport
+from . import rq
+
+
+__all__ = ['AsyncMSG']
+
+
+class AsyncMSG(MSG):
+    """MSG 的异步版本，消息校验与收件人设置同 MSG，send 与 upload_temp_media 需 await"""
+    def __init__(self, access_token, agent_id, transport=None, media_cache=None):
+        super().__init__(access_token, agent_id, create_transport(transport), media_cache)
+
+    @classmethod
+    async def new(cls, corp_id, secret, agent_id, transport=None):
+        """同 MSG.new，access_token 在第一次发送时才获取"""
+        from .corp import AsyncCorpAPI
+        transport = create_transport(transport)
+        return cls(AsyncCorpAPI(corp_id, secret, agent_id, transport), agent_id, transport)
+
+    async def get_access_token(self):
+        """access_token 属性在传入 api 对象时返回 awaitable 对象，这里统一返回字符串"""
+        if self.api is not None:
+            return await self.api.access_token
+        return self._access_token
+
+    async def send(self, type, msg, touser=None, toparty=None, totag=None, safe=None):
+        """同 MSG.send"""
+        touser, toparty, totag = self.get_recipients(touser, toparty, totag)
+        safe = self.safe if safe is None else safe
+        self.check_msg(type, msg)
+        access_token = await self.get_access_token()
+        url = f'https://qyapi.weixin.qq.com/cgi-bin/message/send?access_token={access_token}'
+        data = self._get_send_data(type, msg, touser, toparty, totag, safe)
+        if self._can_coalesce(touser, toparty, totag):
+            return await self.transport.coalescer.send(
+                coalesce_key(access_token, self.agent_id, type, msg, safe),
+                touser.split('|'),
+                lambda touser: rq.post(url, dict(data, touser=touser), self.transport, self.api, self.scope),
+            )
+        return await rq.post(url, data, self.transport, self.api, self.scope)
+
+    async def send_template(self, template, touser=None, toparty=None, totag=None, **values):
+        """同 MSG.send_template"""
+        body = template.render(*self.get_recipients(touser, toparty, totag), **values)
+        url = f'https://qyapi.weixin.qq.com/cgi-bin/message/send?access_token={await self.get_access_token()}'
+        return await rq.post(url, body, self.transport, self.api, self.scope)
+
+    async def send_bulk(self, type, msg, users=None, parties=None, tags=None, max_workers=4):
+        """同 MSG.send_bulk，max_workers 为同时发送的批次数"""
+        if users is None and parties is None and tags is None:
+            raise SendMsgError('users、parties、tags不能同时为空')
+        self.check_msg(type, msg)
+        data = self._get_send_data(type, msg, None, None, None, self.safe)
+
+        async def send(touser, toparty, totag):
+            url = f'https://qyapi.weixin.qq.com/cgi-bin/message/send?access_token={await self.get_access_token()}'
+            batch = dict(data, touser=touser, toparty=toparty, totag=totag)
+            return await rq.post(url, batch, self.transport, self.api, self.scope)
+
+        return await bulk.run_batches_async(send, bulk.iter_batches(users, parties, tags), max_workers)
+
+    async def upload_temp_media(self, type, file, filename, size=None, content_type=None, progress=None):
+        """同 MSG.upload_temp_media，读取文件、计算摘要在线程池中执行，不阻塞事件循环"""
+        # 配置了 media_cache 时需要读取整个文件计算摘要
+        cached, encoder, save = await asyncio.get_running_loop().run_in_executor(
+            None, self._prepare_media, type, file, filename, size, content_type, progress)
+        if cached is not None:
+            return cached
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/media/upload?access_token={}&type={}'.format(
+            await self.get_access_token(),
+            type,
+        )
+        data = await self.transport.post(url, data=encoder, headers=encoder.headers)
+        if data['errcode'] != 0:
+            raise UploadError(data)
+        save(data)
+        return data
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import time
+from ..refresher import TokenRefresher
+
+
+__all__ = ['AsyncTokenRefresher']
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTokenRefresher(TokenRefresher):
+    """
+    TokenRefresher 的协程版本，在当前事件循环中为每个注册的异步api运行一个刷新任务。
+    注册的对象需提供 ``async refresh_access_token(expires_time=None)`` 与 access_token_expires_time。
+    start() 需在事件循环中调用，适合放在 ASGI lifespan 的 startup 事件中，stop() 放在 shutdown 事件中。
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._tasks = {}
+
+    def add(self, api):
+        if id(api) in self._apis:
+            return
+        self._apis[id(api)] = [api, self.default_expires_in, None]
+        if self._thread is not None:
+            self._start_task(id(api))
+
+    def remove(self, api):
+        self._apis.pop(id(api), None)
+        task = self._tasks.pop(id(api), None)
+        if task is not None:
+            task.cancel()
+
+    def start(self):
+        # 复用 _thread 标记是否已启动
+        if self._thread is not None:
+            return
+        self._thread = asyncio.get_running_loop()
+        for key in self._apis:
+            self._start_task(key)
+
+    async def stop(self, timeout=None):
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        self._thread = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), timeout)
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.stop()
+
+    def _start_task(self, key):
+        self._tasks[key] = asyncio.ensure_future(self._run_api(key))
+
+    async def _run_api(self, key):
+        entry = self._apis[key]
+        api = entry[0]
+        when = self._first_refresh_time(entry)
+        while key in self._apis:
+            await asyncio.sleep(max(when - time.time(), 0))
+            started = time.time()
+            try:
+                await api.refresh_access_token(expires_time=entry[2])
+                expires_time = api.access_token_expires_time
+                expires_in = max(int(expires_time - started), 1)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('后台刷新 access_token 失败，%s 秒后重试', self.retry_interval)
+                when = time.time() + self.retry_interval
+            else:
+                entry[1], entry[2] = expires_in, expires_time
+                when = self.next_refresh_time(expires_time, expires_in)
@@ -0,0 +1,76 @@
+import asyncio
+from ..ierror import APIValueError
+from ..retry import get_endpoint, get_url_token, replace_url_token
+from ..rq import get_scope, JSON_HEADERS
+from .transport import get_default_transport
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+__all__ = ['get', 'post']
+
+
+async def get(url, transport=None, api=None, scope=None):
+    """同 wework.rq.get，api 的 access_token 返回 awaitable 对象"""
+    return await request('GET', url, transport, api, scope)
+
+
+async def post(url, data, transport=None, api=None, scope=None):
+    """data 为 bytes 时视为已经序列化的 json，直接作为请求体发送"""
+    if isinstance(data, bytes):
+        return await request('POST', url, transport, api, scope, data=data, headers=JSON_HEADERS)
+    return await request('POST', url, transport, api, scope, json=data)
+
+
+def _connection_errors(method):
+    if aiohttp is None:
+        return ()
+    # POST 只在建立连接失败时重试，避免重复发送
+    if method == 'POST':
+        return aiohttp.ClientConnectorError,
+    return aiohttp.ClientConnectionError, asyncio.TimeoutError
+
+
+async def request(method, url, transport=None, api=None, scope=None, **kwargs):
+    transport = transport or get_default_transport()
+    policy = transport.get_retry_policy(url)
+    metrics = transport.metrics
+    limiter = transport.rate_limiter
+    endpoint = get_endpoint(url)
+    scope = get_scope(api, scope)
+    attempt = 0
+    token_replayed = False
+    while True:
+        if limiter is not None and await limiter.acquire_async(*scope, endpoint) > 0:
+            metrics.incr('ratelimit_wait', endpoint=endpoint)
+        metrics.incr('request', endpoint=endpoint)
+        try:
+            data = await transport.request(method, url, **kwargs)
+        except _connection_errors(method):
+            if not policy.retry_connection_errors or attempt >= policy.max_retries:
+                metrics.incr('error', endpoint=endpoint, reason='connection')
+                raise
+            metrics.incr('retry', endpoint=endpoint, reason='connection')
+            await asyncio.sleep(policy.backoff_time(attempt))
+            attempt += 1
+            continue
+
+        errcode = data.get('errcode')
+        if errcode == 0:
+            return data
+        if errcode in policy.token_errcodes and api is not None and not token_replayed:
+            token_replayed = True
+            metrics.incr('retry', endpoint=endpoint, reason='token', errcode=errcode)
+            api.invalidate_access_token(get_url_token(url))
+            url = replace_url_token(url, await api.access_token)
+            continue
+        if errcode in policy.transient_errcodes and attempt < policy.max_retries:
+            metrics.incr('retry', endpoint=endpoint, reason='errcode', errcode=errcode)
+            await asyncio.sleep(policy.backoff_time(attempt))
+            attempt += 1
+            continue
+        metrics.incr('error', endpoint=endpoint, reason='errcode', errcode=errcode)
+        raise APIValueError(data)
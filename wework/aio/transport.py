@@ -0,0 +1,101 @@
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+from ..jsonstream import loads
+from ..metrics import Metrics
+from ..retry import RetryPolicy, match_policy
+
+
+__all__ = ['AsyncTransport', 'get_default_transport', 'set_default_transport', 'create_transport']
+
+
+class AsyncTransport(object):
+    """
+    基于 aiohttp 连接池的异步传输层。
+    与同步的 Transport 不同，get/post 直接返回解析后的 json，避免调用方持有未读取完毕的响应。
+    """
+    def __init__(self, limit=1000, limit_per_host=0, keepalive_timeout=30, connect_timeout=5, read_timeout=30,
+                 session=None, retry_policy=None, retry_policies=None, metrics=None,
+                 rate_limiter=None, coalescer=None):
+        """
+        :param limit: 连接池中的最大连接数，0 表示不限制
+        :param limit_per_host: 每个 host 的最大连接数，0 表示不限制
+        :param keepalive_timeout: 空闲连接的保持时间，单位秒
+        :param connect_timeout: 建立连接的超时时间，单位秒
+        :param read_timeout: 读取响应的超时时间，单位秒
+        :param session: 自定义的 aiohttp.ClientSession，传入时忽略连接池参数
+        :param retry_policy: 默认的 RetryPolicy，传入 retry.NO_RETRY 关闭重试
+        :param retry_policies: 按接口路径前缀配置的 RetryPolicy
+        :param metrics: Metrics，统计请求与重试次数
+        :param rate_limiter: RateLimiter，请求发出前按企业、应用、接口族限流
+        :param coalescer: AsyncSendCoalescer，合并短时间内发送给不同成员的相同消息
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._session = session
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.retry_policies = retry_policies or {}
+        self.metrics = metrics or Metrics()
+        self.rate_limiter = rate_limiter
+        self.coalescer = coalescer
+
+    @property
+    def session(self):
+        # aiohttp 要求在事件循环中创建 ClientSession，因此延迟到第一次请求时创建
+        if self._session is None or self._session.closed:
+            if aiohttp is None:
+                raise ImportError('使用异步客户端需要先安装 aiohttp：pip install aiohttp')
+            connector = aiohttp.TCPConnector(limit=self.limit,
+                                             limit_per_host=self.limit_per_host,
+                                             keepalive_timeout=self.keepalive_timeout)
+            timeout = aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    def get_retry_policy(self, url):
+        return match_policy(self.retry_policies, self.retry_policy, url)
+
+    async def request(self, method, url, **kwargs):
+        async with self.session.request(method, url, **kwargs) as response:
+            return await response.json(content_type=None, loads=loads)
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+_default_transport = None
+
+
+def get_default_transport():
+    """获取进程内共享的默认异步传输层，首次调用时创建"""
+    global _default_transport
+    if _default_transport is None:
+        _default_transport = AsyncTransport()
+    return _default_transport
+
+
+def set_default_transport(transport):
+    global _default_transport
+    _default_transport = create_transport(transport) if transport is not None else None
+
+
+def create_transport(value=None):
+    """
+    :param value: None 表示使用默认传输层；dict 表示 AsyncTransport 的构造参数；也可以直接传入 AsyncTransport 实例
+    """
+    if value is None:
+        return get_default_transport()
+    if isinstance(value, dict):
+        return AsyncTransport(**value)
+    return value
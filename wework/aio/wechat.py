@@ -0,0 +1,227 @@
+import time
+from ..ierror import GetAccessTokenError
+from ..wechat import WechatUser, WorkWechatApi, WorkWechatSuiteApi, WorkProviderWechatApi
+from .base import AsyncBaseWechatAPI
+from .corp import AsyncCorpAPI
+from .refresher import AsyncTokenRefresher
+from .transport import create_transport
+from . import rq
+
+
+__all__ = ['AsyncWorkWechatApi', 'AsyncWorkWechatSuiteApi', 'AsyncWorkProviderWechatApi']
+
+
+class AsyncWorkWechatApi(WorkWechatApi):
+    @property
+    def suite_api(self):
+        if not self._suite_api:
+            self.check_settings(['SUITE_ID', 'SUITE_SECRET'])
+            self._suite_api = AsyncWorkWechatSuiteApi(self.settings, self)
+        return self._suite_api
+
+    @property
+    def provider_api(self):
+        if not self._provider_api:
+            self.check_settings(['CROP_ID', 'PROVIDER_SECRET'])
+            self._provider_api = AsyncWorkProviderWechatApi(self.settings, self)
+            self.qrcode_login_required = self._provider_api.login_required
+        return self._provider_api
+
+    def _create_token_refresher(self, **kwargs):
+        return AsyncTokenRefresher(**kwargs)
+
+
+class AsyncWorkWechatSuiteApi(AsyncBaseWechatAPI, WorkWechatSuiteApi):
+    """第三方应用的异步api，接口同 WorkWechatSuiteApi，涉及网络请求的方法均需 await"""
+    def __init__(self, settings, wechat_api):
+        super().__init__(settings, wechat_api)
+        self.transport = create_transport(settings.data.get('ASYNC_TRANSPORT'))
+
+    async def _get_access_token(self):
+        """获取第三方应用凭证"""
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/service/get_suite_token'
+        data = await self.transport.post(url, json={
+            'suite_id': self.settings.SUITE_ID,
+            'suite_secret': self.settings.SUITE_SECRET,
+            'suite_ticket': self.suite_ticket,
+        })
+        return data['suite_access_token'], data['expires_in']
+
+    @property
+    def pre_auth_code(self):
+        """返回一个 awaitable 对象：``code = await api.pre_auth_code``"""
+        return self._get_cached_pre_auth_code()
+
+    @pre_auth_code.setter
+    def pre_auth_code(self, value):
+        raise ValueError('禁止对 pre_auth_code 进行赋值操作')
+
+    async def _get_cached_pre_auth_code(self):
+        g = self._auth_code
+        if 'pre_auth_code' not in g or time.time() >= g['expires_time']:
+            await self._get_pre_auth_code()
+        return self._auth_code['pre_auth_code']
+
+    async def _get_pre_auth_code(self):
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/service/get_pre_auth_code?suite_access_token={}'.format(
+            await self.access_token)
+        data = await rq.get(url, self.transport, self)
+        self._auth_code['pre_auth_code'] = data['pre_auth_code']
+        self._auth_code['expires_time'] = data['expires_in'] + int(time.time())
+
+    async def set_session_info(self, pre_auth_code, test=False):
+        """同 WorkWechatSuiteApi.set_session_info"""
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/service/set_session_info?suite_access_token={}'.format(
+            await self.access_token
+        )
+        await rq.post(url, {
+            'pre_auth_code': pre_auth_code,
+            'session_info': {
+                'auth_type': 1 if test else 0
+            }
+        }, self.transport, self)
+        return pre_auth_code
+
+    async def _get_user_ticket(self, code):
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/service/getuserinfo3rd?access_token={}&code={}'.format(
+            await self.access_token, code
+        )
+        return (await rq.get(url, self.transport, self))['user_ticket']
+
+    async def get_user_info(self, code):
+        """同 WorkWechatSuiteApi.get_user_info"""
+        user_ticket = await self._get_user_ticket(code)
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/service/getuserdetail3rd?access_token={}'.format(
+            await self.access_token)
+        data = await rq.post(url, {'user_ticket': user_ticket}, self.transport, self)
+        del data['errcode']
+        del data['errmsg']
+        return WechatUser(data)
+
+    def qrcode_login_required(self, state='state', user_type='member'):
+        """企业微信扫码授权登录，用于异步视图"""
+        def wrapper(func):
+            async def get_wx_user(request, *args, **kwargs):
+                helper = self.settings.HELPER(request)
+                code = helper.get_params().get('auth_code', '')
+                if code:
+                    work_wx_user = await self.wechat_api.provider_api.get_user_info(code)
+                    request.work_wx_user = work_wx_user
+                    return await func(request, *args, **kwargs)
+                path = helper.get_current_path()
+                return helper.redirect(self.get_qrcode_login_url(path, state, user_type))
+            return get_wx_user
+        return wrapper
+
+    def web_login_required(self, scope='snsapi_userinfo'):
+        """网页授权登录，用于异步视图"""
+        def wrapper(func):
+            async def get_wx_user(request, *args, **kwargs):
+                helper = self.settings.HELPER(request)
+                code = helper.get_params().get('code', '')
+                if code:
+                    work_wx_user = await self.get_user_info(code)
+                    request.work_wx_user = work_wx_user
+                    return await func(request, *args, **kwargs)
+                path = helper.get_current_path()
+                return helper.redirect(self.get_web_login_url(path, scope))
+            return get_wx_user
+        return wrapper
+
+    async def get_corp_access_token_and_info(self, auth_code):
+        """同 WorkWechatSuiteApi.get_corp_access_token_and_info"""
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/service/get_permanent_code?suite_access_token={}'.format(
+            await self.access_token
+        )
+        return await self.transport.post(url, json={
+            'auth_code': auth_code
+        })
+
+    async def get_corp_access_token(self, corp_id, permanent_code):
+        """同 WorkWechatSuiteApi.get_corp_access_token"""
+        return (await self._get_corp_access_token(corp_id, permanent_code))[0]
+
+    async def _get_corp_access_token(self, corp_id, permanent_code):
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/service/get_corp_token?suite_access_token={}'.format(
+            await self.access_token
+        )
+        data = await self.transport.post(url, json={
+            'auth_corpid': corp_id,
+            'permanent_code': permanent_code,
+        })
+        if 'access_token' not in data:
+            raise GetAccessTokenError(data)
+        return data['access_token'], data['expires_in']
+
+    def get_corp_api(self, corp_id, permanent_code, agent_id):
+        """同 WorkWechatSuiteApi.get_corp_api，返回 AsyncCorpAPI"""
+        api = AsyncCorpAPI(corp_id, permanent_code, agent_id, self.transport,
+                           media_cache=self.settings.data.get('MEDIA_CACHE'),
+                           user_cache=self.settings.data.get('USER_CACHE'),
+                           response_cache=self.settings.data.get('RESPONSE_CACHE'))
+
+        async def _get_access_token():
+            return await self._get_corp_access_token(corp_id, permanent_code)
+        api._get_access_token = _get_access_token
+        return api
+
+    async def get_corp_info(self, corp_id, permanent_code):
+        """同 WorkWechatSuiteApi.get_corp_info"""
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/service/get_auth_info?suite_access_token={}'.format(
+            await self.access_token
+        )
+        return await self.transport.post(url, json={
+            'auth_corpid': corp_id,
+            'permanent_code': permanent_code,
+        })
+
+    def install_app_required(self, test=False):
+        """用于异步视图"""
+        def wrapper(func):
+            async def get_corp_info(request, *args, **kwargs):
+                helper = self.settings.HELPER(request)
+                auth_code = helper.get_params().get('auth_code', '')
+                if auth_code:
+                    request.corp_info = await self.get_corp_access_token_and_info(auth_code)
+                    return await func(request, *args, **kwargs)
+                pre_auth_code = await self.set_session_info(await self.pre_auth_code, test)
+                path = helper.get_current_path()
+                return helper.redirect(self.get_install_url(path, pre_auth_code))
+            return get_corp_info
+        return wrapper
+
+
+class AsyncWorkProviderWechatApi(AsyncBaseWechatAPI, WorkProviderWechatApi):
+    """服务商的异步api，接口同 WorkProviderWechatApi"""
+    def __init__(self, settings, wechat_api):
+        super().__init__(settings, wechat_api)
+        self.transport = create_transport(settings.data.get('ASYNC_TRANSPORT'))
+
+    async def _get_access_token(self):
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/service/get_provider_token'
+        data = await self.transport.post(url, json={
+            'corpid': self.settings.CROP_ID,
+            'provider_secret': self.settings.PROVIDER_SECRET
+        })
+        return data['provider_access_token'], data['expires_in']
+
+    async def get_user_info(self, code):
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/service/get_login_info?access_token={}'.format(
+            await self.access_token)
+        data = await self.transport.post(url, json={
+            'auth_code': code,
+        })
+        return WechatUser(data)
+
+    def login_required(self, func):
+        """第三方应用二维码回调登录，用于异步视图"""
+        async def get_wx_user(request, *args, **kwargs):
+            helper = self.settings.HELPER(request)
+            code = helper.get_params().get('auth_code', '')
+            if code:
+                work_wx_user = await self.get_user_info(code)
+                request.work_wx_user = work_wx_user
+                return await func(request, *args, **kwargs)
+            path = helper.get_current_path()
+            return helper.redirect(self.get_login_url(path))
+        return get_wx_user
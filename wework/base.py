@@ -1,41 +1,140 @@
+from .cache import default_l1_cache
 from .ierror import GetAccessTokenError, CacheNotExistError
+from .singleflight import SingleFlight
 import time
 
 
+# 同一份凭证同时只允许一个线程去刷新 access_token
+_token_flight = SingleFlight()
+
+
 class BaseWechatAPI(object):
     def __get_cache_access_token_and_expires(self):
         g = self._global_access_token
         access_token_name, expires_name = g['name']
-        helper = self.settings.HELPER
-        access_token = helper.cache_get(access_token_name)
-        expires_time = helper.cache_get(expires_name)
-        if access_token is None:
+        # 写入时先写 token 再写过期时间，逐个读取的 Helper 先读过期时间，不会读到旧的 token 与新的过期时间
+        data = self.settings.HELPER.cache_get_many([expires_name, access_token_name])
+        if data.get(access_token_name) is None or data.get(expires_name) is None:
             raise CacheNotExistError('Access Token 不存在于缓存中。')
-        return access_token, expires_time
+        return data[access_token_name], data[expires_name]
 
     def __set_cache_access_token_and_expires(self, g):
         helper = self.settings.HELPER
         access_token, expires_in = self._get_access_token()
         access_token_name, expires_name = g['name']
-        helper.cache_set(access_token_name, access_token)
-        helper.cache_set(expires_name, expires_in + int(time.time()))
+        expires_time = expires_in + int(time.time())
+        helper.cache_set_many({
+            access_token_name: access_token,
+            expires_name: expires_time,
+        }, ttl=expires_in)
+        self.__set_l1_access_token(access_token, expires_time)
+        return access_token
+
+    @property
+    def _l1_cache(self):
+        """进程内一级缓存，settings 中 L1_CACHE 为 False 时不使用"""
+        l1 = self.settings.data.get('L1_CACHE')
+        return default_l1_cache if l1 is None else l1
+
+    def __l1_key(self, name):
+        return self.settings.HELPER, name
+
+    def __set_l1_access_token(self, access_token, expires_time):
+        l1 = self._l1_cache
+        if l1:
+            lease = self.settings.data.get('TOKEN_LEASE')
+            # 开始提前刷新的时间点之后不再由一级缓存返回，保证刷新能够被触发
+            stale_window = lease.stale_window if lease is not None else 0
+            l1.set(self.__l1_key(self._global_access_token['name'][0]), access_token, expires_time - stale_window)
+
+    def __read_cache_access_token(self):
+        try:
+            return self.__get_cache_access_token_and_expires()
+        except CacheNotExistError:
+            return None, None
+
+    def __refresh_access_token(self, g):
+        lease = self.settings.data.get('TOKEN_LEASE')
+        if lease is not None:
+            # 多个进程之间通过租约协调，只有一个进程去获取新的 token
+            return lease.refresh(g['name'][0], self.__read_cache_access_token,
+                                 lambda: self.__set_cache_access_token_and_expires(g))
+        # 等待期间其它线程可能已经刷新完毕，再检查一次缓存
+        try:
+            access_token, expires_time = self.__get_cache_access_token_and_expires()
+        except CacheNotExistError:
+            return self.__set_cache_access_token_and_expires(g)
+        if time.time() >= expires_time:
+            return self.__set_cache_access_token_and_expires(g)
         return access_token
 
+    def __is_fresh(self, access_token, expires_time):
+        lease = self.settings.data.get('TOKEN_LEASE')
+        if lease is not None:
+            return lease.is_fresh(access_token, expires_time)
+        return time.time() < expires_time
+
     @property
     def access_token(self):
         g = self._global_access_token
+        l1 = self._l1_cache
+        if l1:
+            access_token = l1.get(self.__l1_key(g['name'][0]))
+            if access_token is not None:
+                return access_token
         try:
             access_token, expires_time = self.__get_cache_access_token_and_expires()
         except CacheNotExistError:
-            access_token = self.__set_cache_access_token_and_expires(g)
+            access_token = _token_flight.do(g['name'], self.__refresh_access_token, g)
         else:
-            if time.time() >= expires_time:
-                access_token = self.__set_cache_access_token_and_expires(g)
+            if not self.__is_fresh(access_token, expires_time):
+                access_token = _token_flight.do(g['name'], self.__refresh_access_token, g)
+            else:
+                self.__set_l1_access_token(access_token, expires_time)
         return access_token
 
     @access_token.setter
     def access_token(self, value):
         raise ValueError('禁止对 access_token 进行赋值操作')
 
+    @property
+    def access_token_expires_time(self):
+        """缓存中 access_token 的过期时间戳，缓存不存在时为 None"""
+        try:
+            return self.__get_cache_access_token_and_expires()[1]
+        except CacheNotExistError:
+            return None
+
+    def refresh_access_token(self, expires_time=None):
+        """
+        不论缓存是否过期，立即获取新的 access_token 并写入缓存，供后台刷新使用。
+        配置了 TOKEN_LEASE 时同样需要抢到租约，多个进程在同一个周期内只获取一次
+        :param expires_time: 调用者上次看到的过期时间，缓存中的过期时间比它晚说明其它进程已经刷新过，直接返回缓存中的 token
+        """
+        g = self._global_access_token
+        return _token_flight.do(g['name'], self.__force_refresh_access_token, g, expires_time)
+
+    def __force_refresh_access_token(self, g, expires_time):
+        lease = self.settings.data.get('TOKEN_LEASE')
+        if lease is None:
+            return self.__set_cache_access_token_and_expires(g)
+        return lease.refresh(g['name'][0], self.__read_cache_access_token,
+                             lambda: self.__set_cache_access_token_and_expires(g),
+                             force=True, expires_time=expires_time)
+
+    def invalidate_access_token(self, access_token=None):
+        """
+        使当前的 access_token 失效，下一次访问时重新获取。
+        用于接口返回 40014、42001 等 access_token 无效的错误码时。
+        :param access_token: 请求时使用的 token，缓存中已经是其它 token 时说明已被刷新过，不再使其失效
+        """
+        access_token_name, expires_name = self._global_access_token['name']
+        l1 = self._l1_cache
+        if l1:
+            l1.invalidate(self.__l1_key(access_token_name))
+        if access_token is not None and self.__read_cache_access_token()[0] != access_token:
+            return
+        self.settings.HELPER.cache_set_many({expires_name: 0})
+
     def _get_access_token(self):
         raise GetAccessTokenError('无法获取 access_token')
@@ -0,0 +1,161 @@
+import asyncio
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+__all__ = ['MAX_USERS', 'MAX_PARTIES', 'MAX_TAGS', 'iter_batches', 'BatchResult', 'BulkResult', 'run_batches',
+           'run_batches_async']
+
+
+# 单次发送消息时各类接收者的数量上限
+MAX_USERS = 1000
+MAX_PARTIES = 100
+MAX_TAGS = 100
+
+
+def _chunks(values, size):
+    if values is None:
+        return
+    if isinstance(values, str):
+        values = values.split('|')
+    it = iter(values)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield '|'.join(str(value) for value in chunk)
+
+
+def iter_batches(users=None, parties=None, tags=None):
+    """
+    将接收者拆分成符合接口限制的批次，返回 (touser, toparty, totag) 的迭代器。
+    接收者可以是任意可迭代对象，按需读取，不会一次性载入内存；
+    成员、部门、标签的分批会合并到同一次调用中，以减少调用次数。
+    """
+    return itertools.zip_longest(
+        _chunks(users, MAX_USERS),
+        _chunks(parties, MAX_PARTIES),
+        _chunks(tags, MAX_TAGS),
+    )
+
+
+class BatchResult(object):
+    """单个批次的发送结果，失败时 error 为抛出的异常"""
+    def __init__(self, index, touser, toparty, totag):
+        self.index = index
+        self.touser = touser
+        self.toparty = toparty
+        self.totag = totag
+        self.response = None
+        self.error = None
+        self.elapsed = 0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return '<BatchResult {} {}>'.format(self.index, 'ok' if self.ok else repr(self.error))
+
+
+class BulkResult(object):
+    """
+    批量发送的结果，batches 按批次顺序排列。
+    invaliduser、invalidparty、invalidtag 汇总了所有批次返回的无效接收者。
+    """
+    def __init__(self, batches, elapsed):
+        self.batches = sorted(batches, key=lambda batch: batch.index)
+        self.elapsed = elapsed
+
+    def _collect(self, name):
+        values = []
+        for batch in self.batches:
+            value = (batch.response or {}).get(name)
+            if value:
+                values.extend(value.split('|'))
+        return values
+
+    @property
+    def invaliduser(self):
+        return self._collect('invaliduser')
+
+    @property
+    def invalidparty(self):
+        return self._collect('invalidparty')
+
+    @property
+    def invalidtag(self):
+        return self._collect('invalidtag')
+
+    @property
+    def failed(self):
+        return [batch for batch in self.batches if not batch.ok]
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    @property
+    def throughput(self):
+        """每秒完成的批次数"""
+        return len(self.batches) / self.elapsed if self.elapsed else 0.0
+
+
+def _run(send, index, recipients):
+    result = BatchResult(index, *recipients)
+    start = time.monotonic()
+    try:
+        result.response = send(*recipients)
+    except Exception as e:
+        result.error = e
+    result.elapsed = time.monotonic() - start
+    return result
+
+
+def run_batches(send, batches, max_workers=4):
+    """
+    在线程池中并发执行 send(touser, toparty, totag)，同时进行中的批次不超过 max_workers 个。
+    单个批次失败不影响其它批次，异常记录在对应的 BatchResult 中。
+    """
+    batches = enumerate(batches)
+    lock = threading.Lock()
+    results = []
+
+    def worker():
+        while True:
+            with lock:
+                item = next(batches, None)
+            if item is None:
+                return
+            result = _run(send, *item)
+            with lock:
+                results.append(result)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers) as executor:
+        for future in [executor.submit(worker) for _ in range(max_workers)]:
+            future.result()
+    return BulkResult(results, time.monotonic() - start)
+
+
+async def run_batches_async(send, batches, max_workers=4):
+    """run_batches 的协程版本，send 为协程函数"""
+    batches = enumerate(batches)
+    results = []
+
+    async def worker():
+        for index, recipients in batches:
+            result = BatchResult(index, *recipients)
+            start = time.monotonic()
+            try:
+                result.response = await send(*recipients)
+            except Exception as e:
+                result.error = e
+            result.elapsed = time.monotonic() - start
+            results.append(result)
+
+    start = time.monotonic()
+    await asyncio.gather(*[worker() for _ in range(max_workers)])
+    return BulkResult(results, time.monotonic() - start)
@@ -0,0 +1,326 @@
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+__all__ = ['BaseCache', 'MemoryCache', 'DjangoCache', 'SQLiteCache', 'FileCache', 'L1Cache', 'create_cache']
+
+
+class BaseCache(object):
+    """
+    缓存后端接口，value 需可以被 json 序列化。
+    ttl 为过期时间，单位秒，None 表示永不过期。
+    """
+    def get(self, key, default=None):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def get_many(self, keys):
+        """返回 {key: value}，不存在或已过期的 key 不在返回值中"""
+        data = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                data[key] = value
+        return data
+
+    def set_many(self, mapping, ttl=None):
+        for key, value in mapping.items():
+            self.set(key, value, ttl)
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class MemoryCache(BaseCache):
+    """进程内缓存，maxsize 不为 None 时按最近最少使用淘汰"""
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires_time = self._data[key]
+            except KeyError:
+                return default
+            if expires_time is not None and time.time() >= expires_time:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_time = None if ttl is None else time.time() + ttl
+        with self._lock:
+            self._data[key] = value, expires_time
+            self._data.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DjangoCache(BaseCache):
+    """使用 Django 的缓存框架，alias 为 settings.CACHES 中的名称"""
+    def __init__(self, alias='default', prefix='wework_'):
+        self.alias = alias
+        self.prefix = prefix
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def get(self, key, default=None):
+        return self.cache.get(self.prefix + key, default)
+
+    def set(self, key, value, ttl=None):
+        self.cache.set(self.prefix + key, value, ttl)
+
+    def delete(self, key):
+        self.cache.delete(self.prefix + key)
+
+    def get_many(self, keys):
+        data = self.cache.get_many([self.prefix + key for key in keys])
+        return {key[len(self.prefix):]: value for key, value in data.items()}
+
+    def set_many(self, mapping, ttl=None):
+        self.cache.set_many({self.prefix + key: value for key, value in mapping.items()}, ttl)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class SQLiteCache(BaseCache):
+    """基于 SQLite（WAL 模式）的缓存，同一台机器上的多个进程可以共享"""
+    def __init__(self, path='wework_cache.sqlite3', timeout=10):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._execute('CREATE TABLE IF NOT EXISTS wework_cache '
+                      '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_time REAL)')
+
+    @property
+    def connection(self):
+        # sqlite3 的连接不能跨线程使用，每个线程持有一个连接
+        conn = getattr(self._local, 'connection', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _execute(self, sql, params=()):
+        return self.connection.execute(sql, params)
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        rows = self._execute(
+            'SELECT key, value FROM wework_cache WHERE key IN ({}) AND (expires_time IS NULL OR expires_time > ?)'.format(
+                ','.join('?' * len(keys))),
+            keys + [time.time()],
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def set(self, key, value, ttl=None):
+        self.set_many({key: value}, ttl)
+
+    def set_many(self, mapping, ttl=None):
+        expires_time = None if ttl is None else time.time() + ttl
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO wework_cache (key, value, expires_time) VALUES (?, ?, ?)',
+            [(key, json.dumps(value), expires_time) for key, value in mapping.items()],
+        )
+
+    def delete(self, key):
+        self._execute('DELETE FROM wework_cache WHERE key = ?', (key, ))
+
+    def clear(self):
+        self._execute('DELETE FROM wework_cache')
+
+
+class FileCache(BaseCache):
+    """
+    以 json 保存在单个文件中的缓存，兼容旧版本 DjangoHelper 的 wework_cache.txt。
+    写入时持有 fcntl 锁，先写入临时文件再原子替换，读取时不需要加锁；
+    文件没有变化时直接使用上一次解析的结果。
+    """
+    EXPIRES_KEY = '__expires__'
+
+    def __init__(self, filename='wework_cache.txt'):
+        self.filename = filename
+        self._stat = None
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            st = os.stat(self.filename)
+        except FileNotFoundError:
+            return {}
+        stat = st.st_ino, st.st_mtime_ns, st.st_size
+        with self._lock:
+            if stat != self._stat:
+                with open(self.filename, 'r') as f:
+                    content = f.read()
+                self._data = {} if len(content) == 0 else json.loads(content)
+                self._stat = stat
+            return self._data
+
+    def _update(self, func):
+        with open(self.filename + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            data = dict(self._load())
+            data[self.EXPIRES_KEY] = dict(data.get(self.EXPIRES_KEY, {}))
+            func(data)
+            tmp = '{}.{}.tmp'.format(self.filename, os.getpid())
+            with open(tmp, 'w') as f:
+                f.write(json.dumps(data))
+            os.replace(tmp, self.filename)
+            st = os.stat(self.filename)
+            with self._lock:
+                self._data = data
+                self._stat = st.st_ino, st.st_mtime_ns, st.st_size
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys):
+        data = self._load()
+        expires = data.get(self.EXPIRES_KEY, {})
+        now = time.time()
+        return {key: data[key] for key in keys
+                if key in data and key != self.EXPIRES_KEY and (key not in expires or expires[key] > now)}
+
+    def set(self, key, value, ttl=None):
+        self.set_many({key: value}, ttl)
+
+    def set_many(self, mapping, ttl=None):
+        def update(data):
+            now = time.time()
+            expires = data[self.EXPIRES_KEY]
+            for key, value in mapping.items():
+                data[key] = value
+                if ttl is None:
+                    expires.pop(key, None)
+                else:
+                    expires[key] = now + ttl
+            # 顺便清理已经过期的 key
+            for key in [key for key, t in expires.items() if t <= now]:
+                data.pop(key, None)
+                del expires[key]
+        self._update(update)
+
+    def delete(self, key):
+        def update(data):
+            data.pop(key, None)
+            data[self.EXPIRES_KEY].pop(key, None)
+        self._update(update)
+
+    def clear(self):
+        def update(data):
+            data.clear()
+            data[self.EXPIRES_KEY] = {}
+        self._update(update)
+
+
+class L1Cache(object):
+    """
+    放在 HELPER 缓存之前的进程内一级缓存，未命中时才访问共享的缓存后端。
+    每个值带有 valid_until 时间戳，超过后视为未命中；hits、misses 记录命中与未命中的次数。
+    """
+    def __init__(self, margin=60):
+        """
+        :param margin: 安全余量，值在过期前 margin 秒就不再从一级缓存返回，单位秒
+        """
+        self.margin = margin
+        self.hits = 0
+        self.misses = 0
+        self._data = {}
+
+    def get(self, key):
+        try:
+            value, valid_until = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        if time.time() >= valid_until:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def set(self, key, value, expires_time, margin=None):
+        """保存 value 直到 expires_time 前 margin 秒，margin 为 None 时使用默认的安全余量"""
+        self._data[key] = value, expires_time - (self.margin if margin is None else margin)
+
+    def invalidate(self, key=None):
+        """key 为 None 时清空所有缓存"""
+        if key is None:
+            self._data.clear()
+        else:
+            self._data.pop(key, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': len(self._data),
+        }
+
+
+# access_token、suite_ticket 默认使用的进程内一级缓存
+default_l1_cache = L1Cache()
+
+
+_backends = {
+    'memory': MemoryCache,
+    'django': DjangoCache,
+    'sqlite': SQLiteCache,
+    'file': FileCache,
+}
+
+
+def create_cache(value, options=None):
+    """
+    :param value: BaseCache 的实例；或者 memory、django、sqlite、file 之一；或者 BaseCache 子类的路径，例如 myapp.cache.RedisCache
+    :param options: 使用名称或路径时，传给缓存后端的构造参数
+    """
+    if isinstance(value, BaseCache):
+        return value
+    if value in _backends:
+        cls = _backends[value]
+    else:
+        modules = value.split('.')
+        cls = getattr(__import__('.'.join(modules[:-1]), fromlist=['']), modules[-1])
+    return cls(**(options or {}))
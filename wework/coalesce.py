@@ -0,0 +1,134 @@
+import asyncio
+import json
+import threading
+from .bulk import MAX_USERS
+
+
+__all__ = ['SendCoalescer', 'AsyncSendCoalescer', 'coalesce_key', 'split_result']
+
+
+def coalesce_key(access_token, agent_id, type, msg, safe):
+    """内容相同的消息才会被合并"""
+    return access_token, agent_id, type, json.dumps(msg, sort_keys=True), safe
+
+
+def split_result(data, users):
+    """从合并发送的结果中取出属于 users 的部分"""
+    data = dict(data)
+    invaliduser = data.get('invaliduser')
+    if invaliduser:
+        data['invaliduser'] = '|'.join(user for user in invaliduser.split('|') if user in users)
+    return data
+
+
+class _Batch(object):
+    def __init__(self, full, done):
+        self.users = {}
+        self.full = full
+        self.done = done
+        self.result = None
+        self.error = None
+        self.task = None
+
+
+class SendCoalescer(object):
+    """
+    合并短时间内发送的相同消息：第一个调用者等待 window 毫秒，期间内容相同、只指定了 touser 的消息
+    合并成一次调用发送，每个调用者得到的结果中 invaliduser 只包含自己的接收者。
+    重复的接收者只会收到一条消息；合并的接收者达到 max_users 个时立即发送，不再等待。
+    """
+    def __init__(self, window=5, max_users=MAX_USERS):
+        """
+        :param window: 合并窗口，单位毫秒
+        :param max_users: 每次调用的接收者上限
+        """
+        self.window = window
+        self.max_users = max_users
+        self._batches = {}
+        self._lock = threading.Lock()
+
+    def _new_batch(self):
+        return _Batch(threading.Event(), threading.Event())
+
+    def _join(self, key, users):
+        """将 users 加入 key 对应的批次，返回 (batch, 是否由当前调用者发送)"""
+        batch = self._batches.get(key)
+        leader = batch is None or len(batch.users.keys() | users) > self.max_users
+        if leader:
+            if batch is not None:
+                self._close(key, batch)
+            batch = self._batches[key] = self._new_batch()
+        batch.users.update(dict.fromkeys(users))
+        if len(batch.users) >= self.max_users:
+            self._close(key, batch)
+        return batch, leader
+
+    def _close(self, key, batch):
+        """批次不再接受新的接收者，并唤醒负责发送的调用者"""
+        if self._batches.get(key) is batch:
+            del self._batches[key]
+        batch.full.set()
+
+    def send(self, key, users, send):
+        """
+        :param key: coalesce_key 的返回值
+        :param users: 当前调用者的接收者
+        :param send: 发送函数，参数为合并后的 touser，返回接口的结果
+        """
+        users = dict.fromkeys(users).keys()
+        if len(users) >= self.max_users:
+            return send('|'.join(users))
+
+        with self._lock:
+            batch, leader = self._join(key, users)
+        if leader:
+            batch.full.wait(self.window / 1000)
+            with self._lock:
+                self._close(key, batch)
+            try:
+                batch.result = send('|'.join(batch.users))
+            except Exception as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+        else:
+            batch.done.wait()
+        if batch.error is not None:
+            raise batch.error
+        return split_result(batch.result, users)
+
+
+class AsyncSendCoalescer(SendCoalescer):
+    """
+    SendCoalescer 的协程版本，只合并同一个事件循环中的调用。
+    合并后的发送在单独的 task 中执行，某个调用者被取消时只有它自己收到 CancelledError，其余调用者仍然得到结果。
+    """
+    def _new_batch(self):
+        return _Batch(asyncio.Event(), None)
+
+    async def send(self, key, users, send):
+        """send 为协程函数，其余同 SendCoalescer.send"""
+        users = dict.fromkeys(users).keys()
+        if len(users) >= self.max_users:
+            return await send('|'.join(users))
+
+        key = id(asyncio.get_running_loop()), key
+        batch, leader = self._join(key, users)
+        if leader:
+            batch.task = asyncio.get_running_loop().create_task(self._send_batch(key, batch, send))
+            batch.task.add_done_callback(_retrieve_exception)
+        return split_result(await asyncio.shield(batch.task), users)
+
+    async def _send_batch(self, key, batch, send):
+        try:
+            await asyncio.wait_for(batch.full.wait(), self.window / 1000)
+        except asyncio.TimeoutError:
+            pass
+        self._close(key, batch)
+        return await send('|'.join(batch.users))
+
+
+def _retrieve_exception(task):
+    # 所有调用者都已被取消时没有人读取异常，避免 "exception was never retrieved" 警告
+    if not task.cancelled():
+        task.exception()
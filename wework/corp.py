@@ -1,9 +1,14 @@
+import hashlib
 import json
-import requests
 import time
-from .base import BaseWechatAPI
+from .base import BaseWechatAPI, _token_flight
 from .ierror import GetAccessTokenError
+from .lease import create_token_lease
 from .msg import MSG
+from .registry import TokenRegistry, default_registry
+from .respcache import cached_response
+from .transport import create_transport
+from .users import get_users
 import wework.rq as rq
 
 
@@ -12,19 +17,43 @@ __all__ = ['WorkWechatCorpAPI']
 
 class WorkWechatCorpAPI(BaseWechatAPI):
     """企业自建应用的api"""
-    def __init__(self, corp_id, secret, agent_id):
+    def __init__(self, corp_id, secret, agent_id, transport=None, registry=None, helper=None, lease=None,
+                 media_cache=None, user_cache=None, response_cache=None):
         """
         :param corp_id: 企业id 
         :param secret: 企业自建应用的secret
+        :param transport: 传输层，可以是 Transport 实例或其构造参数 dict，默认使用进程内共享的连接池
+        :param registry: TokenRegistry，同一个 (corp_id, secret) 的实例共享 access_token，默认使用进程内共享的注册表
+        :param helper: 继承至 BaseHelper 的类，传入时 access_token 保存在 helper 的缓存中，多个进程之间共享
+        :param lease: 跨进程的刷新租约，BaseLease 的实现或 TokenLease，需同时传入 helper
+        :param media_cache: MediaCache，msg 上传临时素材时使用
+        :param user_cache: UserCache，get_user_detail 与 get_users 使用
+        :param response_cache: ResponseCache，缓存部门列表、标签列表等变化较少的接口的返回值
         """
         self.corp_id = corp_id
         self.secret = secret
         self.agent_id = agent_id
-        self._global_access_token = {}
+        self.transport = create_transport(transport)
+        registry = default_registry if registry is None else registry
+        self._global_access_token = registry.get((corp_id, secret))
+        self._msg = None
+        self.media_cache = media_cache
+        self.user_cache = user_cache
+        self.response_cache = response_cache
+        self.settings = None
+        if helper is not None:
+            from .settings import Settings
+            self.settings = Settings({'HELPER': helper, 'TOKEN_LEASE': create_token_lease(lease)})
+            key = '{}_{}'.format(corp_id, hashlib.sha1(str(secret).encode()).hexdigest()[:10])
+            self._global_access_token['name'] = (
+                'wework_corp_access_token_{}'.format(key),
+                'wework_corp_expires_time_{}'.format(key),
+            )
 
     @classmethod
-    def new(cls, access_token, agent_id):
-        obj = cls('__', '__', agent_id)
+    def new(cls, access_token, agent_id, transport=None):
+        # 外部传入的 access_token 不放入共享的注册表
+        obj = cls('__', '__', agent_id, transport, TokenRegistry(1))
 
         def _get_access_token():
             nonlocal access_token
@@ -35,24 +64,67 @@ class WorkWechatCorpAPI(BaseWechatAPI):
 
     @property
     def msg(self):
-        return MSG(self.access_token, self.agent_id)
+        """
+        同一个实例的 msg 会被复用，每次发送时读取最新的 access_token。
+        多个线程共用时接收者应作为 send 的参数传入：``api.msg.send('text', msg, touser=['UserID1'])``
+        """
+        if self._msg is None:
+            self._msg = MSG(self, self.agent_id, self.transport, self.media_cache)
+        return self._msg
 
     def _get_access_token(self):
         url = 'https://qyapi.weixin.qq.com/cgi-bin/gettoken?corpid={}&corpsecret={}'.format(self.corp_id, self.secret)
-        data = requests.get(url).json()
+        data = self.transport.get(url).json()
         if 'access_token' not in data:
             raise GetAccessTokenError(data)
         return data['access_token'], data['expires_in']
 
+    def _refresh_access_token(self, g, force=False):
+        # 等待期间其它线程可能已经刷新完毕，再检查一次
+        if force or 'access_token' not in g or time.time() >= g['expires_time']:
+            access_token, expires_in = self._get_access_token()
+            g['expires_time'] = expires_in + int(time.time())
+            g['access_token'] = access_token
+        return g['access_token']
+
     @property
     def access_token(self):
+        if self.settings is not None:
+            return BaseWechatAPI.access_token.fget(self)
         g = self._global_access_token
         if 'access_token' not in g or time.time() >= g['expires_time']:
-            access_token, expires_in = self._get_access_token()
-            g['access_token'] = access_token
-            g['expires_time'] = expires_in + int(time.time())
-        return self._global_access_token['access_token']
+            return _token_flight.do(id(g), self._refresh_access_token, g)
+        return g['access_token']
 
+    @property
+    def access_token_expires_time(self):
+        """access_token 的过期时间戳，尚未获取过时为 None"""
+        if self.settings is not None:
+            return BaseWechatAPI.access_token_expires_time.fget(self)
+        return self._global_access_token.get('expires_time')
+
+    def refresh_access_token(self, expires_time=None):
+        """
+        不论是否过期，立即获取新的 access_token，供后台刷新使用
+        :param expires_time: 同 BaseWechatAPI.refresh_access_token，只在传入 helper 时使用
+        """
+        if self.settings is not None:
+            return BaseWechatAPI.refresh_access_token(self, expires_time)
+        g = self._global_access_token
+        return _token_flight.do(id(g), self._refresh_access_token, g, True)
+
+    def invalidate_access_token(self, access_token=None):
+        """
+        使当前的 access_token 失效，下一次访问时重新获取。
+        :param access_token: 请求时使用的 token，已经被刷新成其它 token 时不再使其失效
+        """
+        if self.settings is not None:
+            return BaseWechatAPI.invalidate_access_token(self, access_token)
+        g = self._global_access_token
+        if access_token is None or g.get('access_token') == access_token:
+            g['expires_time'] = 0
+
+    @cached_response('department/list')
     def get_department_list(self, id=None):
         """
         https://work.weixin.qq.com/api/doc#90000/90135/90208
@@ -69,8 +141,9 @@ class WorkWechatCorpAPI(BaseWechatAPI):
         url = 'https://qyapi.weixin.qq.com/cgi-bin/department/list?access_token={}'.format(self.access_token)
         if id is not None:
             url += '&id={}'.format(id)
-        return rq.get(url)['department']
+        return rq.get(url, self.transport, self)['department']
 
+    @cached_response('user/simplelist')
     def get_department_user_list(self, department_id, fetch_child=False):
         """
         https://work.weixin.qq.com/api/doc#90000/90135/90200
@@ -89,7 +162,14 @@ class WorkWechatCorpAPI(BaseWechatAPI):
         fetch_child = 1 if fetch_child else 0
         url = 'https://qyapi.weixin.qq.com/cgi-bin/user/simplelist?' \
               'access_token={}&department_id={}&fetch_child={}'.format(self.access_token, department_id, fetch_child)
-        return rq.get(url)['userlist']
+        return rq.get(url, self.transport, self)['userlist']
+
+    def iter_department_user_list(self, department_id, fetch_child=False):
+        """同 get_department_user_list，边读取响应边解析，逐个返回成员"""
+        fetch_child = 1 if fetch_child else 0
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/user/simplelist?' \
+              'access_token={}&department_id={}&fetch_child={}'.format(self.access_token, department_id, fetch_child)
+        return rq.stream(url, 'userlist', self.transport, self)
 
     def get_department_user_detail_list(self, department_id, fetch_child=False):
         """
@@ -168,22 +248,56 @@ class WorkWechatCorpAPI(BaseWechatAPI):
         fetch_child = 1 if fetch_child else 0
         url = 'https://qyapi.weixin.qq.com/cgi-bin/user/list?' \
               'access_token={}&department_id={}&fetch_child={}'.format(self.access_token, department_id, fetch_child)
-        return rq.get(url)['userlist']
+        return rq.get(url, self.transport, self)['userlist']
 
-    def get_user_detail(self, user_id):
+    def iter_department_user_detail_list(self, department_id, fetch_child=False):
+        """
+        同 get_department_user_detail_list，边读取响应边解析，逐个返回成员详情，
+        内存占用与成员数量无关，适合成员很多的部门
+        """
+        fetch_child = 1 if fetch_child else 0
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/user/list?' \
+              'access_token={}&department_id={}&fetch_child={}'.format(self.access_token, department_id, fetch_child)
+        return rq.stream(url, 'userlist', self.transport, self)
+
+    def get_user_detail(self, user_id, max_age=None):
         """
         https://work.weixin.qq.com/api/doc#90000/90135/90196
         获取成员详细信息
         :param user_id: 成员UserID。对应管理端的帐号，企业内必须唯一。不区分大小写，长度为1~64个字节
+        :param max_age: 配置了 user_cache 时，缓存中不超过 max_age 秒之前获取的数据直接返回，
+            None 表示缓存中有就返回，0 表示总是请求接口并更新缓存
         :return: dict
         内容与 get_department_user_detail_list 中的字典返回值是一样的。
         """
+        if self.user_cache is not None and max_age != 0:
+            user = self.user_cache.get(self.corp_id, user_id, max_age)
+            if user is not None:
+                return user
+        user = self._fetch_user_detail(user_id)
+        if self.user_cache is not None:
+            self.user_cache.set(self.corp_id, user_id, user)
+        return user
+
+    def _fetch_user_detail(self, user_id):
         url = 'https://qyapi.weixin.qq.com/cgi-bin/user/get?access_token={}&userid={}'.format(
             self.access_token,
             user_id
         )
-        return rq.get(url)
+        return rq.get(url, self.transport, self)
+
+    def get_users(self, user_ids, max_workers=8, max_age=None):
+        """
+        批量获取成员详细信息，重复的 userid 只请求一次，配置了 user_cache 时先从缓存中读取，
+        缓存中没有的成员在线程池中并发请求。
+        :param user_ids: userid 的列表
+        :param max_workers: 同时进行的请求数
+        :param max_age: 同 get_user_detail
+        :return: 与 user_ids 顺序一致的 UserResult 列表，result.user 为成员详情，请求失败时 result.error 为抛出的异常
+        """
+        return get_users(self, user_ids, max_workers, max_age)
 
+    @cached_response('tag/list')
     def get_tag_list(self):
         """
         https://work.weixin.qq.com/api/doc#90000/90135/90216
@@ -197,8 +311,9 @@ class WorkWechatCorpAPI(BaseWechatAPI):
         ]
         """
         url = 'https://qyapi.weixin.qq.com/cgi-bin/tag/list?access_token={}'.format(self.access_token)
-        return rq.get(url)['taglist']
+        return rq.get(url, self.transport, self)['taglist']
 
+    @cached_response('tag/get')
     def get_tag_user_list(self, tag_id):
         """
         https://work.weixin.qq.com/api/doc#90000/90135/90213
@@ -213,4 +328,9 @@ class WorkWechatCorpAPI(BaseWechatAPI):
         ],
         """
         url = 'https://qyapi.weixin.qq.com/cgi-bin/tag/get?access_token={}&tagid={}'.format(self.access_token, tag_id)
-        return rq.get(url)['userlist']
+        return rq.get(url, self.transport, self)['userlist']
+
+    def iter_tag_user_list(self, tag_id):
+        """同 get_tag_user_list，边读取响应边解析，逐个返回成员"""
+        url = 'https://qyapi.weixin.qq.com/cgi-bin/tag/get?access_token={}&tagid={}'.format(self.access_token, tag_id)
+        return rq.stream(url, 'userlist', self.transport, self)
@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+__all__ = ['DirectoryCrawler']
+
+
+class DirectoryCrawler(object):
+    """
+    并发拉取整个通讯录：先获取一次部门列表，再在线程池中逐个部门获取成员详情，
+    成员在拉取的同时逐个返回，属于多个部门的成员只返回一次。
+    请求经过 api 的传输层，传输层配置的 RateLimiter 与重试策略同样生效。
+    """
+    def __init__(self, api, max_workers=8):
+        """
+        :param api: WorkWechatCorpAPI
+        :param max_workers: 同时进行的请求数
+        """
+        self.api = api
+        self.max_workers = max_workers
+        self.departments = None
+
+    def iter_users(self, department_id=None):
+        """
+        逐个返回成员详情，顺序与部门的返回顺序无关
+        :param department_id: 只拉取该部门及其子部门，默认为整个通讯录
+        """
+        self.departments = self.api.get_department_list(department_id)
+        ids = iter([d['id'] for d in self.departments])
+        seen = set()
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            pending = set()
+            try:
+                while True:
+                    # 同时最多有 max_workers 个部门在拉取，避免结果堆积在内存中
+                    for id in ids:
+                        pending.add(executor.submit(self.api.get_department_user_detail_list, id))
+                        if len(pending) >= self.max_workers:
+                            break
+                    if not pending:
+                        return
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        for user in future.result():
+                            if user['userid'] not in seen:
+                                seen.add(user['userid'])
+                                yield user
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def crawl(self, callback, department_id=None):
+        """
+        对每个成员调用 callback(user)
+        :return: 成员数量
+        """
+        count = 0
+        for user in self.iter_users(department_id):
+            callback(user)
+            count += 1
+        return count
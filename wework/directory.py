@@ -0,0 +1,228 @@
+import threading
+from .crawler import DirectoryCrawler
+from .mapped import MappedSnapshot, dump_snapshot
+from .records import compact
+
+
+__all__ = ['DirectorySnapshot', 'DirectoryIndex']
+
+
+_EMPTY = frozenset()
+
+
+class DirectorySnapshot(object):
+    """
+    通讯录的只读快照，创建时建立各项索引，查询不再调用接口。
+    快照创建后不会再被修改，可以在多个线程中同时读取。
+    """
+    def __init__(self, departments, users, tags=()):
+        """
+        :param departments: get_department_list 的返回值
+        :param users: get_department_user_detail_list 的返回值，需要包含 department 与 is_leader_in_dept
+        :param tags: [{'tagid': 1, 'tagname': '...', 'userlist': ['zhangsan']}]
+        """
+        self.departments = {d['id']: d for d in departments}
+        self.users = {u['userid']: u for u in users}
+        self.tags = {t['tagid']: t for t in tags}
+
+        self.parent = {id: d.get('parentid') for id, d in self.departments.items()}
+        children = {id: [] for id in self.departments}
+        for id, parent in self.parent.items():
+            if parent in children:
+                children[parent].append(id)
+        for ids in children.values():
+            # order 值大的排序靠前
+            ids.sort(key=lambda id: -self.departments[id].get('order', 0))
+        self.children = {id: tuple(ids) for id, ids in children.items()}
+        self.roots = tuple(id for id, parent in self.parent.items() if parent not in self.departments)
+
+        self.ancestors = {}
+        for id in self.departments:
+            self._build_ancestors(id)
+        self.descendants = {}
+        for id in self.roots:
+            self._build_descendants(id)
+
+        department_users = {id: set() for id in self.departments}
+        leaders = {id: set() for id in self.departments}
+        for userid, user in self.users.items():
+            is_leader = user.get('is_leader_in_dept') or ()
+            for i, id in enumerate(user.get('department') or ()):
+                department_users.setdefault(id, set()).add(userid)
+                if i < len(is_leader) and is_leader[i]:
+                    leaders.setdefault(id, set()).add(userid)
+        self.department_users = {id: frozenset(ids) for id, ids in department_users.items()}
+        self.leaders = {id: frozenset(ids) for id, ids in leaders.items()}
+
+        self.tag_users = {id: frozenset(t.get('userlist') or ()) for id, t in self.tags.items()}
+        user_tags = {}
+        for id, userids in self.tag_users.items():
+            for userid in userids:
+                user_tags.setdefault(userid, set()).add(id)
+        self.user_tags = {userid: frozenset(ids) for userid, ids in user_tags.items()}
+        self._recursive_users = {}
+
+    def _build_ancestors(self, id):
+        """从父部门到根部门的id，结果缓存在 self.ancestors 中"""
+        chain = []
+        current = id
+        while current not in self.ancestors:
+            chain.append(current)
+            parent = self.parent.get(current)
+            if parent not in self.departments or parent in chain:
+                # 根部门，或者数据有误出现了环
+                self.ancestors[chain.pop()] = ()
+                break
+            current = parent
+        for node in reversed(chain):
+            parent = self.parent[node]
+            self.ancestors[node] = (parent, ) + self.ancestors[parent]
+        return self.ancestors[id]
+
+    def _build_descendants(self, root):
+        # 非递归的后序遍历，部门层级很深时也不会超过递归深度
+        stack = [(root, False)]
+        while stack:
+            id, visited = stack.pop()
+            if visited:
+                ids = {id}
+                for child in self.children[id]:
+                    ids |= self.descendants[child]
+                self.descendants[id] = frozenset(ids)
+            elif id not in self.descendants:
+                stack.append((id, True))
+                stack.extend((child, False) for child in self.children[id])
+
+    def get_user(self, userid):
+        return self.users.get(userid)
+
+    def get_department(self, id):
+        return self.departments.get(id)
+
+    def get_children(self, id):
+        return self.children.get(id, ())
+
+    def get_ancestors(self, id):
+        """父部门、祖父部门……直到根部门"""
+        return self.ancestors.get(id, ())
+
+    def get_descendants(self, id, include_self=True):
+        ids = self.descendants.get(id, _EMPTY)
+        return ids if include_self else ids - {id}
+
+    def get_department_users(self, id, recursive=False):
+        """部门中的成员，recursive 为 True 时包含所有子部门的成员"""
+        if not recursive:
+            return self.department_users.get(id, _EMPTY)
+        users = self._recursive_users.get(id)
+        if users is None:
+            users = frozenset().union(*(self.department_users[d] for d in self.get_descendants(id)))
+            self._recursive_users[id] = users
+        return users
+
+    def get_user_departments(self, userid):
+        user = self.users.get(userid)
+        return tuple(user.get('department') or ()) if user is not None else ()
+
+    def get_tag_users(self, tagid):
+        return self.tag_users.get(tagid, _EMPTY)
+
+    def get_user_tags(self, userid):
+        return self.user_tags.get(userid, _EMPTY)
+
+    def is_in_department(self, userid, id):
+        """成员是否属于部门 id 或其子部门"""
+        descendants = self.get_descendants(id)
+        return any(d in descendants for d in self.get_user_departments(userid))
+
+    def is_leader(self, userid, id, ancestors=True):
+        """
+        成员是否为部门 id 的上级
+        :param ancestors: 为 True 时，成员是任意一个上级部门的上级也算
+        """
+        if userid in self.leaders.get(id, _EMPTY):
+            return True
+        return ancestors and any(userid in self.leaders[d] for d in self.get_ancestors(id))
+
+
+class DirectoryIndex(object):
+    """
+    本地的通讯录索引，refresh() 从接口拉取完整的通讯录并建立新的快照，建好后一次性替换，
+    正在读取旧快照的线程不受影响。需要多次查询保持一致时先取出 snapshot 再查询：
+
+        snapshot = index.snapshot
+        if snapshot.is_leader(userid, department_id):
+            ...
+
+    其余属性与方法转发给当前的快照，例如 index.get_department_users(1, recursive=True)。
+    """
+    def __init__(self, api, fetch_tags=True, max_workers=None, compact=False):
+        """
+        :param api: WorkWechatCorpAPI，需要有读取通讯录的权限
+        :param fetch_tags: 是否拉取标签成员
+        :param max_workers: 传入时使用 DirectoryCrawler 按部门并发拉取成员，
+            默认每个根部门用一次 fetch_child 请求拉取全部成员
+        :param compact: 是否把部门、成员、标签保存为 records 中的紧凑记录，成员很多时可以大幅减少内存占用
+        """
+        self.api = api
+        self.fetch_tags = fetch_tags
+        self.max_workers = max_workers
+        self.compact = compact
+        self.snapshot = DirectorySnapshot((), ())
+        self._lock = threading.Lock()
+
+    def fetch(self):
+        """从接口拉取通讯录，返回新的 DirectorySnapshot"""
+        users = {}
+        if self.max_workers:
+            crawler = DirectoryCrawler(self.api, self.max_workers)
+            for user in crawler.iter_users():
+                users[user['userid']] = user
+            departments = crawler.departments
+        else:
+            departments = self.api.get_department_list()
+            ids = {d['id'] for d in departments}
+            for d in departments:
+                if d.get('parentid') not in ids:
+                    for user in self.api.get_department_user_detail_list(d['id'], fetch_child=True):
+                        users[user['userid']] = user
+        tags = []
+        if self.fetch_tags:
+            for tag in self.api.get_tag_list():
+                tags.append(dict(tag, userlist=[u['userid'] for u in self.api.get_tag_user_list(tag['tagid'])]))
+        return self.create_snapshot(departments, users.values(), tags)
+
+    def create_snapshot(self, departments, users, tags=()):
+        if self.compact:
+            departments, users, tags = compact(departments, users, tags)
+        return DirectorySnapshot(departments, users, tags)
+
+    def refresh(self):
+        # 同一时间只有一个线程在拉取
+        with self._lock:
+            self.load(self.fetch())
+        return self.snapshot
+
+    def load(self, snapshot):
+        """替换当前的快照"""
+        self.snapshot = snapshot
+
+    def dump(self, path, version=None):
+        """把当前的快照原子地写入文件，其它进程通过 load_file 打开，返回写入的版本"""
+        return dump_snapshot(self.snapshot, path, version)
+
+    def load_file(self, path):
+        """
+        通过 mmap 打开 dump 写入的快照文件，只读取文件头，启动时不需要调用接口。
+        可以定期调用，文件没有被替换时不会重新打开
+        """
+        snapshot = self.snapshot
+        if isinstance(snapshot, MappedSnapshot) and snapshot.path == path and not snapshot.changed():
+            return snapshot
+        self.load(MappedSnapshot(path))
+        return self.snapshot
+
+    def __getattr__(self, name):
+        if name == 'snapshot':
+            raise AttributeError(name)
+        return getattr(self.snapshot, name)
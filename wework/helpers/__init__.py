@@ -4,6 +4,8 @@ class HelperError(Exception):
 
 
 class BaseHelper(object):
+    # 缓存后端，BaseCache 的实例，可以通过 wework.init(CACHE=...) 配置
+    cache = None
 
     def get_current_path(self):
         raise HelperError('you have to customized YourHelper.get_current_path')
@@ -15,4 +17,41 @@ class BaseHelper(object):
         raise HelperError('you have to customized YourHelper.get_body')
 
     def redirect(self, url):
-        raise HelperError('you have to customized YourHelper.redirect')
\ No newline at end of file
+        raise HelperError('you have to customized YourHelper.redirect')
+
+    @classmethod
+    def get_cache(cls):
+        if cls.cache is None:
+            raise HelperError('you have to customized YourHelper.cache or YourHelper.cache_get/cache_set')
+        return cls.cache
+
+    @classmethod
+    def cache_get(cls, key):
+        return cls.get_cache().get(key)
+
+    @classmethod
+    def cache_set(cls, key, value, ttl=None, **kwargs):
+        cls.get_cache().set(key, value, ttl)
+
+    @classmethod
+    def cache_get_many(cls, keys):
+        if cls.cache is not None:
+            return cls.cache.get_many(keys)
+        # 只实现了 cache_get 的 Helper 逐个读取
+        data = {}
+        for key in keys:
+            value = cls.cache_get(key)
+            if value is not None:
+                data[key] = value
+        return data
+
+    @classmethod
+    def cache_set_many(cls, mapping, ttl=None):
+        if cls.cache is not None:
+            return cls.cache.set_many(mapping, ttl)
+        for key, value in mapping.items():
+            cls.cache_set(key, value, ttl=ttl)
+
+    @classmethod
+    def cache_delete(cls, key):
+        cls.get_cache().delete(key)
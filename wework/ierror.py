@@ -32,3 +32,7 @@ class SuiteTicketError(Exception):
 
 class CacheNotExistError(Exception):
     pass
+
+
+class RateLimitError(Exception):
+    pass
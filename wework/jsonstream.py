@@ -0,0 +1,139 @@
+import codecs
+import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+import requests
+
+
+__all__ = ['loads', 'decode_response', 'iter_json_array']
+
+
+# 安装了 orjson 时使用 orjson 解析完整的响应
+loads = orjson.loads if orjson is not None else json.loads
+
+
+def decode_response(response):
+    """解析 requests 的响应，安装了 orjson 时直接解析响应的 bytes"""
+    if orjson is not None and isinstance(response, requests.Response):
+        return orjson.loads(response.content)
+    return response.json()
+
+
+_decoder = json.JSONDecoder()
+_WS = re.compile(r'[ \t\r\n]*')
+_DELIMITERS = frozenset(',]} \t\r\n')
+
+
+class _Scanner(object):
+    """
+    从字节块的迭代器中逐个解析 json 值。
+    json.JSONDecoder.raw_decode 在 C 中同时完成切分与解析，值被块的边界截断时读取下一块后重新解析
+    """
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+
+    def _fill(self):
+        for chunk in self._chunks:
+            text = self._utf8.decode(chunk)
+            if text:
+                # 丢弃已经解析过的部分
+                self.buf = self.buf[self.pos:] + text
+                self.pos = 0
+                return True
+        return False
+
+    def peek(self):
+        """跳过空白，返回下一个字符，没有更多数据时返回 None"""
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return None
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError('json 格式错误，应为 {!r}'.format(char))
+        self.pos += 1
+
+    def value(self):
+        if self.peek() is None:
+            raise ValueError('json 不完整')
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # 数字、true 等后面不是分隔符时可能被块的边界截断，例如 12|34、1.5e|3
+            if self.buf[self.pos] not in '"{[' and self.buf[end:end + 1] not in _DELIMITERS and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def _members(scanner, fields):
+    """解析对象中剩余的字段放入 fields，遇到数组类型的值时返回 key，对象结束时返回 None"""
+    while True:
+        char = scanner.peek()
+        if char == '}':
+            scanner.pos += 1
+            return None
+        if char == ',':
+            scanner.pos += 1
+            continue
+        key = scanner.value()
+        scanner.expect(':')
+        if scanner.peek() == '[':
+            return key
+        fields[key] = scanner.value()
+
+
+def _items(scanner):
+    scanner.expect('[')
+    while True:
+        char = scanner.peek()
+        if char == ']':
+            scanner.pos += 1
+            return
+        if char == ',':
+            scanner.pos += 1
+            continue
+        yield scanner.value()
+
+
+def iter_json_array(chunks, key):
+    """
+    增量解析 json 对象中的 key 数组，例如 {"errcode": 0, "errmsg": "ok", "userlist": [...]}
+    :param chunks: bytes 的可迭代对象，例如 response.iter_content(65536)
+    :return: (fields, items)，fields 为数组之前的其它字段，items 逐个返回数组中的元素，
+        迭代结束后 fields 中会加入数组之后的字段。响应中没有 key 时 items 为空
+    """
+    scanner = _Scanner(chunks)
+    scanner.expect('{')
+    fields = {}
+
+    def items():
+        found = name
+        while found is not None:
+            if found == key:
+                yield from _items(scanner)
+            else:
+                fields[found] = scanner.value()
+            found = _members(scanner, fields)
+
+    # key 之前的其它数组直接解析
+    name = _members(scanner, fields)
+    while name is not None and name != key:
+        fields[name] = scanner.value()
+        name = _members(scanner, fields)
+    return fields, items()
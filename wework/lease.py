@@ -0,0 +1,205 @@
+import asyncio
+import fcntl
+import os
+import re
+import tempfile
+import time
+import uuid
+
+
+__all__ = ['BaseLease', 'FileLease', 'TokenLease', 'create_token_lease']
+
+
+_FETCH = object()
+
+
+class BaseLease(object):
+    """
+    跨进程的刷新锁（租约）接口，租约在 ttl 秒后自动失效，持有者崩溃也不会造成死锁。
+    基于 Redis 的实现可以用 ``SET name owner NX PX ttl`` 实现 acquire，
+    用比较 owner 后再 DEL 的 Lua 脚本实现 release。
+    """
+    def acquire(self, name, owner, ttl):
+        """
+        尝试获取租约，不阻塞
+        :param name: 租约名称
+        :param owner: 持有者标识，release 时用于校验
+        :param ttl: 租约有效期，单位秒
+        :return: 是否获取成功
+        """
+        raise NotImplementedError
+
+    def release(self, name, owner):
+        """释放租约，只有持有者才能释放"""
+        raise NotImplementedError
+
+
+class FileLease(BaseLease):
+    """基于 fcntl 文件锁的租约，适用于同一台机器上的多个进程"""
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'wework_lease')
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, re.sub(r'[^\w.-]', '_', name) + '.lease')
+
+    def _open(self, name):
+        fd = os.open(self._path(name), os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd
+
+    @staticmethod
+    def _read(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        data = os.read(fd, 1024).decode().split()
+        if len(data) != 2:
+            return None, 0
+        return data[0], float(data[1])
+
+    @staticmethod
+    def _write(fd, content):
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.ftruncate(fd, 0)
+        os.write(fd, content.encode())
+
+    def acquire(self, name, owner, ttl):
+        fd = self._open(name)
+        try:
+            holder, expires_time = self._read(fd)
+            if holder is not None and holder != owner and time.time() < expires_time:
+                return False
+            self._write(fd, '{} {}'.format(owner, time.time() + ttl))
+            return True
+        finally:
+            os.close(fd)
+
+    def release(self, name, owner):
+        fd = self._open(name)
+        try:
+            if self._read(fd)[0] == owner:
+                self._write(fd, '')
+        finally:
+            os.close(fd)
+
+
+class TokenLease(object):
+    """
+    多个进程共享同一份缓存时，保证每个过期周期内只有一个进程去获取新的 access_token。
+    - 距离过期不足 stale_window 秒时开始刷新，抢到租约的进程负责刷新，其余进程继续使用旧的 token；
+    - 缓存中没有可用的 token 时，未抢到租约的进程等待缓存被更新；
+    - 抢到租约后会再次读取缓存，如果过期时间已经变化说明其它进程刷新过了，不再重复获取；
+    - 后台刷新（force）同样需要抢到租约，缓存中的过期时间比调用者看到的更晚时直接使用缓存中的 token。
+    """
+    def __init__(self, backend, ttl=30, stale_window=300, wait_timeout=10, poll_interval=0.05):
+        """
+        :param backend: BaseLease 的实现
+        :param ttl: 租约有效期，应大于获取 token 所需的时间，单位秒
+        :param stale_window: 在过期前多少秒开始刷新，单位秒
+        :param wait_timeout: 没有可用 token 时等待其它进程刷新的最长时间，超时后自行获取，单位秒
+        :param poll_interval: 等待时读取缓存的间隔，单位秒
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.stale_window = stale_window
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+
+    def is_fresh(self, access_token, expires_time):
+        return access_token is not None and time.time() < expires_time - self.stale_window
+
+    def refresh(self, name, read, fetch, force=False, expires_time=None):
+        """
+        :param name: 租约名称，同一份凭证的所有进程需一致
+        :param read: 读取缓存的函数，返回 (access_token, expires_time)，缓存不存在时 access_token 为 None
+        :param fetch: 获取新 token 并写入缓存的函数，返回 access_token
+        :param force: 不论是否即将过期都获取新的 token，供后台刷新使用
+        :param expires_time: force 时调用者看到的过期时间，缓存中的过期时间比它晚说明其它进程已经刷新过，不再获取；
+            None 表示以调用时缓存中的过期时间为准
+        :return: access_token
+        """
+        steps = self._steps(name, read, force, expires_time)
+        result = error = None
+        try:
+            while True:
+                try:
+                    step = steps.throw(error) if error is not None else steps.send(result)
+                except StopIteration as e:
+                    return e.value
+                result = error = None
+                if step is _FETCH:
+                    try:
+                        result = fetch()
+                    except Exception as e:
+                        error = e
+                else:
+                    time.sleep(step)
+        finally:
+            # 被取消或中断时释放持有的租约
+            steps.close()
+
+    async def refresh_async(self, name, read, fetch, force=False, expires_time=None):
+        """refresh 的协程版本，fetch 返回 awaitable 对象，等待其它进程刷新时不阻塞事件循环"""
+        steps = self._steps(name, read, force, expires_time)
+        result = error = None
+        try:
+            while True:
+                try:
+                    step = steps.throw(error) if error is not None else steps.send(result)
+                except StopIteration as e:
+                    return e.value
+                result = error = None
+                if step is _FETCH:
+                    try:
+                        result = await fetch()
+                    except Exception as e:
+                        error = e
+                else:
+                    await asyncio.sleep(step)
+        finally:
+            # 被取消或中断时释放持有的租约
+            steps.close()
+
+    def _steps(self, name, read, force, expires_time):
+        """
+        refresh 的流程，yield _FETCH 表示需要获取新的 token（send 回结果），yield 数字表示需要等待的秒数。
+        同步与异步的版本共用这个流程，只是获取与等待的方式不同
+        """
+        owner = uuid.uuid4().hex
+        access_token, current_expires = read()
+        if force:
+            # 以过期时间作为版本号，比调用者看到的更晚说明已经被刷新过
+            version = current_expires if expires_time is None else expires_time
+
+            def usable(token, expires):
+                return token is not None and expires is not None and (version is None or expires > version)
+        else:
+            usable = self.is_fresh
+        deadline = time.time() + self.wait_timeout
+        while True:
+            if usable(access_token, current_expires):
+                return access_token
+            if self.backend.acquire(name, owner, self.ttl):
+                try:
+                    # 拿到租约前其它进程可能已经写入了新的 token
+                    access_token, current_expires = read()
+                    if usable(access_token, current_expires):
+                        return access_token
+                    return (yield _FETCH)
+                finally:
+                    self.backend.release(name, owner)
+            if not force and access_token is not None and time.time() < current_expires:
+                # 其它进程正在刷新，先使用尚未过期的旧 token；后台刷新则等待其完成，避免立即再次调度
+                return access_token
+            if time.time() >= deadline:
+                return (yield _FETCH)
+            yield self.poll_interval
+            access_token, current_expires = read()
+
+
+def create_token_lease(value):
+    """
+    :param value: None、BaseLease 的实现或 TokenLease
+    """
+    if value is None or isinstance(value, TokenLease):
+        return value
+    return TokenLease(value)
@@ -0,0 +1,375 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from collections.abc import Mapping
+
+
+__all__ = ['dump_snapshot', 'MappedSnapshot']
+
+
+MAGIC = b'WWDS'
+FORMAT_VERSION = 1
+# magic, 格式版本, 字节序, 快照版本, 创建时间, 段数量
+_HEADER = struct.Struct('<4sIIQQI')
+# 段名, 偏移, 长度
+_SECTION = struct.Struct('<8sQQ')
+_BYTEORDER = {'little': 1, 'big': 2}
+
+_EMPTY = frozenset()
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _to_dict(value):
+    return value.to_dict() if hasattr(value, 'to_dict') else dict(value)
+
+
+def _blob(items):
+    """把多个 bytes 拼接起来，返回 (数据, 每一项的起始偏移，最后一项为总长度)"""
+    offsets = array('q', [0])
+    parts = []
+    for item in items:
+        parts.append(item)
+        offsets.append(offsets[-1] + len(item))
+    return b''.join(parts), offsets
+
+
+def _csr(groups):
+    """把 [[int, ...], ...] 转换为 (偏移, 值)，第 i 组为 values[offsets[i]:offsets[i + 1]]"""
+    offsets = array('q', [0])
+    values = array('q')
+    for group in groups:
+        values.extend(group)
+        offsets.append(len(values))
+    return offsets, values
+
+
+def read_version(path):
+    """读取快照文件的版本，文件不存在或者格式不对时返回 None"""
+    try:
+        with open(path, 'rb') as f:
+            magic, _, _, version, _, _ = _HEADER.unpack(f.read(_HEADER.size))
+    except (OSError, struct.error):
+        return None
+    return version if magic == MAGIC else None
+
+
+def dump_snapshot(snapshot, path, version=None):
+    """
+    把 DirectorySnapshot 写入 path，先写入同一目录下的临时文件再原子地替换，
+    已经打开旧文件的进程不受影响。
+    :param version: 快照版本，默认为当前文件的版本加一
+    :return: 写入的版本
+    """
+    if version is None:
+        version = (read_version(path) or 0) + 1
+
+    userids = sorted(snapshot.users, key=lambda userid: userid.encode('utf-8'))
+    user_index = {userid: i for i, userid in enumerate(userids)}
+    department_ids = sorted(snapshot.departments)
+    department_index = {id: i for i, id in enumerate(department_ids)}
+    tag_ids = sorted(snapshot.tags)
+    tag_index = {id: i for i, id in enumerate(tag_ids)}
+
+    user_keys, user_key_offsets = _blob(userid.encode('utf-8') for userid in userids)
+    user_data, user_data_offsets = _blob(_dumps(_to_dict(snapshot.users[userid])) for userid in userids)
+
+    department_data, department_data_offsets = _blob(
+        _dumps(_to_dict(snapshot.departments[id])) for id in department_ids)
+    parents = array('q', [department_index.get(snapshot.parent.get(id), -1) for id in department_ids])
+    children_offsets, children = _csr(
+        [department_index[child] for child in snapshot.children[id]] for id in department_ids)
+    department_users_offsets, department_users = _csr(
+        sorted(user_index[u] for u in snapshot.department_users.get(id, ()) if u in user_index)
+        for id in department_ids)
+    leaders_offsets, leaders = _csr(
+        sorted(user_index[u] for u in snapshot.leaders.get(id, ()) if u in user_index) for id in department_ids)
+
+    tags = []
+    for id in tag_ids:
+        tag = _to_dict(snapshot.tags[id])
+        tag.pop('userlist', None)
+        tags.append(_dumps(tag))
+    tag_data, tag_data_offsets = _blob(tags)
+    tag_users_offsets, tag_users = _csr(
+        sorted(user_index[u] for u in snapshot.tag_users.get(id, ()) if u in user_index) for id in tag_ids)
+    user_tags_offsets, user_tags = _csr(
+        sorted(tag_index[t] for t in snapshot.user_tags.get(userid, ())) for userid in userids)
+
+    sections = [
+        (b'ukeys', user_keys), (b'ukoff', user_key_offsets),
+        (b'udata', user_data), (b'udoff', user_data_offsets),
+        (b'dids', array('q', department_ids)), (b'ddata', department_data), (b'ddoff', department_data_offsets),
+        (b'dparent', parents), (b'dchoff', children_offsets), (b'dch', children),
+        (b'duoff', department_users_offsets), (b'du', department_users),
+        (b'dloff', leaders_offsets), (b'dl', leaders),
+        (b'tids', array('q', tag_ids)), (b'tdata', tag_data), (b'tdoff', tag_data_offsets),
+        (b'tuoff', tag_users_offsets), (b'tu', tag_users),
+        (b'utoff', user_tags_offsets), (b'ut', user_tags),
+    ]
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix='.wework_snapshot_', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            offset = _HEADER.size + _SECTION.size * len(sections)
+            table = []
+            for name, data in sections:
+                # 每一段按 8 字节对齐，整数数组可以直接 cast
+                offset += -offset % 8
+                size = len(data) * data.itemsize if isinstance(data, array) else len(data)
+                table.append(_SECTION.pack(name, offset, size))
+                offset += size
+            f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, _BYTEORDER[sys.byteorder], version, int(time.time()),
+                                 len(sections)))
+            f.write(b''.join(table))
+            for name, data in sections:
+                f.write(b'\0' * (-f.tell() % 8))
+                f.write(data.tobytes() if isinstance(data, array) else data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return version
+
+
+class _LazyMapping(Mapping):
+    """按 key 读取时才解码记录"""
+    def __init__(self, keys, get):
+        self._keys = keys
+        self._get = get
+
+    def __getitem__(self, key):
+        value = self._get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+
+class MappedSnapshot(object):
+    """
+    通过 mmap 打开 dump_snapshot 写入的文件，提供与 DirectorySnapshot 相同的查询方法。
+    打开时只读取文件头，成员、部门等记录在查询时才解码，多个进程打开同一个文件时共享操作系统的页缓存。
+
+        index.load(MappedSnapshot('/var/lib/app/directory.snapshot'))
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        self._buffer = buffer = memoryview(self._mmap)
+        magic, format_version, byteorder, self.version, self.created_at, count = _HEADER.unpack_from(buffer)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError('{} 不是支持的通讯录快照文件'.format(path))
+        if byteorder != _BYTEORDER[sys.byteorder]:
+            raise ValueError('快照文件的字节序与当前机器不一致')
+        sections = {}
+        for i in range(count):
+            name, offset, size = _SECTION.unpack_from(buffer, _HEADER.size + _SECTION.size * i)
+            sections[name.rstrip(b'\0').decode()] = buffer[offset:offset + size]
+        for name in ('ukoff', 'udoff', 'dids', 'ddoff', 'dparent', 'dchoff', 'dch', 'duoff', 'du',
+                     'dloff', 'dl', 'tids', 'tdoff', 'tuoff', 'tu', 'utoff', 'ut'):
+            sections[name] = sections[name].cast('q')
+        self._s = sections
+        self._user_count = len(sections['ukoff']) - 1
+        self.users = _LazyMapping(self._userids, self.get_user)
+        self.departments = _LazyMapping(lambda: sections['dids'].tolist(), self.get_department)
+        self.tags = _LazyMapping(lambda: sections['tids'].tolist(), self.get_tag)
+        self.roots = tuple(sections['dids'][i] for i, parent in enumerate(sections['dparent']) if parent < 0)
+
+    def close(self):
+        """关闭后不能再查询，仍在使用这个快照的线程需要先换成新的快照"""
+        if self._s is None:
+            return
+        for view in self._s.values():
+            view.release()
+        self._buffer.release()
+        self._s = None
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def changed(self):
+        """path 指向的文件是否已经被新的快照替换"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size) != self._stat
+
+    def _userid(self, i):
+        offsets = self._s['ukoff']
+        return bytes(self._s['ukeys'][offsets[i]:offsets[i + 1]]).decode('utf-8')
+
+    def _userids(self):
+        return [self._userid(i) for i in range(self._user_count)]
+
+    def _find_user(self, userid):
+        """二分查找成员的序号，不存在时返回 -1"""
+        key = userid.encode('utf-8')
+        keys, offsets = self._s['ukeys'], self._s['ukoff']
+        lo, hi = 0, self._user_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if keys[offsets[mid]:offsets[mid + 1]].tobytes() < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._user_count and keys[offsets[lo]:offsets[lo + 1]].tobytes() == key:
+            return lo
+        return -1
+
+    @staticmethod
+    def _find_id(ids, id):
+        lo, hi = 0, len(ids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ids[mid] < id:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(ids) and ids[lo] == id else -1
+
+    def _record(self, data, offsets, i):
+        return json.loads(data[offsets[i]:offsets[i + 1]].tobytes())
+
+    def _group(self, name, i):
+        offsets = self._s[name + 'off']
+        return self._s[name][offsets[i]:offsets[i + 1]]
+
+    def _users(self, indexes):
+        return frozenset(self._userid(i) for i in indexes)
+
+    def get_user(self, userid):
+        i = self._find_user(userid)
+        return self._record(self._s['udata'], self._s['udoff'], i) if i >= 0 else None
+
+    def get_department(self, id):
+        i = self._find_id(self._s['dids'], id)
+        return self._record(self._s['ddata'], self._s['ddoff'], i) if i >= 0 else None
+
+    def get_tag(self, tagid):
+        i = self._find_id(self._s['tids'], tagid)
+        if i < 0:
+            return None
+        tag = self._record(self._s['tdata'], self._s['tdoff'], i)
+        tag['userlist'] = sorted(self._users(self._group('tu', i)))
+        return tag
+
+    def get_children(self, id):
+        i = self._find_id(self._s['dids'], id)
+        if i < 0:
+            return ()
+        ids = self._s['dids']
+        return tuple(ids[child] for child in self._group('dch', i))
+
+    def _ancestor_indexes(self, i):
+        parents = self._s['dparent']
+        seen = {i}
+        result = []
+        parent = parents[i]
+        # 数据有误出现环时停止
+        while parent >= 0 and parent not in seen:
+            result.append(parent)
+            seen.add(parent)
+            parent = parents[parent]
+        return result
+
+    def get_ancestors(self, id):
+        """父部门、祖父部门……直到根部门"""
+        i = self._find_id(self._s['dids'], id)
+        if i < 0:
+            return ()
+        ids = self._s['dids']
+        return tuple(ids[parent] for parent in self._ancestor_indexes(i))
+
+    def _descendant_indexes(self, i):
+        result = {i}
+        stack = [i]
+        while stack:
+            for child in self._group('dch', stack.pop()):
+                if child not in result:
+                    result.add(child)
+                    stack.append(child)
+        return result
+
+    def get_descendants(self, id, include_self=True):
+        i = self._find_id(self._s['dids'], id)
+        if i < 0:
+            return _EMPTY
+        ids = self._s['dids']
+        result = frozenset(ids[d] for d in self._descendant_indexes(i))
+        return result if include_self else result - {id}
+
+    def get_department_users(self, id, recursive=False):
+        """部门中的成员，recursive 为 True 时包含所有子部门的成员"""
+        i = self._find_id(self._s['dids'], id)
+        if i < 0:
+            return _EMPTY
+        if not recursive:
+            return self._users(self._group('du', i))
+        indexes = set()
+        for d in self._descendant_indexes(i):
+            indexes.update(self._group('du', d))
+        return self._users(indexes)
+
+    def get_user_departments(self, userid):
+        user = self.get_user(userid)
+        return tuple(user.get('department') or ()) if user is not None else ()
+
+    def get_tag_users(self, tagid):
+        i = self._find_id(self._s['tids'], tagid)
+        return self._users(self._group('tu', i)) if i >= 0 else _EMPTY
+
+    def get_user_tags(self, userid):
+        i = self._find_user(userid)
+        if i < 0:
+            return _EMPTY
+        ids = self._s['tids']
+        return frozenset(ids[t] for t in self._group('ut', i))
+
+    def is_in_department(self, userid, id):
+        """成员是否属于部门 id 或其子部门"""
+        target = self._find_id(self._s['dids'], id)
+        if target < 0:
+            return False
+        # 从成员所在的部门向上查找，部门层级通常远少于子部门的数量
+        for department in self.get_user_departments(userid):
+            i = self._find_id(self._s['dids'], department)
+            if i == target or (i >= 0 and target in self._ancestor_indexes(i)):
+                return True
+        return False
+
+    def is_leader(self, userid, id, ancestors=True):
+        """
+        成员是否为部门 id 的上级
+        :param ancestors: 为 True 时，成员是任意一个上级部门的上级也算
+        """
+        u = self._find_user(userid)
+        i = self._find_id(self._s['dids'], id)
+        if u < 0 or i < 0:
+            return False
+        departments = [i] + self._ancestor_indexes(i) if ancestors else [i]
+        return any(u in self._group('dl', d) for d in departments)
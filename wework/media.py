@@ -0,0 +1,91 @@
+import hashlib
+import os
+import time
+from .cache import MemoryCache, create_cache
+
+
+__all__ = ['MediaCache', 'media_digest', 'hashing']
+
+
+def media_digest(source, chunk_size=64 * 1024):
+    """
+    按块计算文件内容的 sha256，文件对象读取后会回到原来的位置。
+    source 为可迭代对象或者不能 seek 的文件对象时无法预先计算，返回 None
+    """
+    h = hashlib.sha256()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                h.update(chunk)
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        h.update(source)
+    elif hasattr(source, 'read'):
+        if not (hasattr(source, 'seekable') and source.seekable()):
+            return None
+        position = source.tell()
+        for chunk in iter(lambda: source.read(chunk_size), b''):
+            h.update(chunk)
+        source.seek(position)
+    else:
+        return None
+    return h.hexdigest()
+
+
+def hashing(chunks, h):
+    """在迭代的同时计算内容的摘要"""
+    for chunk in chunks:
+        h.update(chunk)
+        yield chunk
+
+
+class MediaCache(object):
+    """
+    以 (企业, 类型, 内容的 sha256) 为 key 缓存临时素材的 media_id，内容相同的文件在有效期内不再重复上传。
+    media_id 在同一企业内的应用之间可以共享，有效期为 3 天，过期前 margin 秒就不再使用。
+    """
+    EXPIRES_IN = 3 * 24 * 3600
+
+    def __init__(self, cache=None, margin=3600, maxsize=None, prefix='wework_media_'):
+        """
+        :param cache: 缓存后端，BaseCache 的实例或 create_cache 支持的名称，默认为进程内缓存
+        :param margin: 安全余量，单位秒
+        :param maxsize: 放在缓存后端之前的进程内 LRU 的大小，None 表示不使用
+        """
+        self.cache = MemoryCache() if cache is None else create_cache(cache)
+        self.l1 = MemoryCache(maxsize) if maxsize else None
+        self.margin = margin
+        self.prefix = prefix
+
+    def _key(self, corp_id, type, digest):
+        return '{}{}_{}_{}'.format(self.prefix, corp_id, type, digest)
+
+    def get(self, corp_id, type, digest):
+        """返回 {'media_id': ..., 'created_at': ...}，不存在或即将过期时返回 None"""
+        key = self._key(corp_id, type, digest)
+        value = self.l1.get(key) if self.l1 is not None else None
+        if value is None:
+            value = self.cache.get(key)
+            if value is None:
+                return None
+        valid_until = int(value['created_at']) + self.EXPIRES_IN - self.margin
+        if time.time() >= valid_until:
+            return None
+        if self.l1 is not None:
+            self.l1.set(key, value, valid_until - time.time())
+        return value
+
+    def set(self, corp_id, type, digest, media_id, created_at):
+        ttl = int(created_at) + self.EXPIRES_IN - self.margin - time.time()
+        if ttl <= 0:
+            return
+        key = self._key(corp_id, type, digest)
+        value = {'media_id': media_id, 'created_at': int(created_at)}
+        self.cache.set(key, value, ttl)
+        if self.l1 is not None:
+            self.l1.set(key, value, ttl)
+
+    def delete(self, corp_id, type, digest):
+        key = self._key(corp_id, type, digest)
+        self.cache.delete(key)
+        if self.l1 is not None:
+            self.l1.delete(key)
@@ -0,0 +1,39 @@
+import threading
+from collections import Counter
+
+
+__all__ = ['Metrics']
+
+
+class Metrics(object):
+    """
+    线程安全的计数器，用于统计请求、重试、限流等事件。
+    callback 不为 None 时每次计数都会调用 callback(name, value, tags)，可用于转发到 statsd、prometheus 等。
+    """
+    def __init__(self, callback=None):
+        self.callback = callback
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def incr(self, name, value=1, **tags):
+        key = name, tuple(sorted(tags.items()))
+        with self._lock:
+            self._counters[key] += value
+        if self.callback is not None:
+            self.callback(name, value, tags)
+
+    def get(self, name, **tags):
+        """返回 name 的计数，传入 tags 时只统计标签匹配的部分"""
+        tags = set(tags.items())
+        with self._lock:
+            return sum(value for (key, key_tags), value in self._counters.items()
+                       if key == name and tags.issubset(key_tags))
+
+    def snapshot(self):
+        """返回 {(name, ((tag, value), ...)): count}"""
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
@@ -1,29 +1,70 @@
+import hashlib
 import json
-import requests
 import wework.rq as rq
-from .ierror import SendMsgError, GetAccessTokenError, UploadTypeError, UploadError
+from . import bulk
+from .coalesce import coalesce_key
+from .validators import validate
+from .template import MessageTemplate
+from .multipart import MEDIA_SIZE_LIMITS, MultipartEncoder, check_media
+from .media import media_digest, hashing
+from .ierror import SendMsgError, UploadTypeError, UploadError
+from .transport import create_transport
 
 
 __all__ = ['MSG']
 
 
+def join_ids(values):
+    """将ID列表用‘|’连接，字符串与 None 原样返回"""
+    if values is None or isinstance(values, str):
+        return values
+    return '|'.join(str(value) for value in values)
+
+
 class MSG(object):
-    def __init__(self, access_token, agent_id):
+    """
+    发送应用消息。一个实例可以在多个线程中复用，接收者作为 send 的参数传入；
+    touser、toparty、totag 属性仅在 send 没有传入接收者时使用。
+    """
+    def __init__(self, access_token, agent_id, transport=None, media_cache=None):
+        """
+        :param access_token: access_token 字符串，或者提供 access_token 属性的对象（例如 WorkWechatCorpAPI）。
+            传入对象时每次发送都读取最新的 access_token，access_token 失效时自动刷新并重发
+        :param agent_id: 企业应用的id
+        :param media_cache: MediaCache，内容相同的临时素材在有效期内不再重复上传，需要 access_token 为带有 corp_id 的对象
+        """
         self.access_token = access_token
+        self.transport = create_transport(transport)
+        self.media_cache = media_cache
         self._touser = None
         self._toparty = None
         self._totag = None
         self.agent_id = agent_id
         self.safe = 0
 
+    @property
+    def access_token(self):
+        if self.api is not None:
+            return self.api.access_token
+        return self._access_token
+
+    @access_token.setter
+    def access_token(self, value):
+        if isinstance(value, str):
+            self._access_token, self.api = value, None
+        else:
+            self._access_token, self.api = None, value
+
+    @property
+    def scope(self):
+        """限流使用的 (corp_id, agent_id)"""
+        return getattr(self.api, 'corp_id', None), self.agent_id
+
     @classmethod
-    def new(cls, corp_id, secret, agent_id):
-        url = 'https://qyapi.weixin.qq.com/cgi-bin/gettoken?corpid={}&corpsecret={}'.format(corp_id, secret)
-        data = requests.get(url).json()
-        if 'access_token' not in data:
-            raise GetAccessTokenError(data)
-        obj = cls(data['access_token'], agent_id)
-        return obj
+    def new(cls, corp_id, secret, agent_id, transport=None):
+        """access_token 在第一次发送时才获取，同一个 (corp_id, secret) 在进程内共享 access_token"""
+        from .corp import WorkWechatCorpAPI
+        return cls(WorkWechatCorpAPI(corp_id, secret, agent_id, transport), agent_id, transport)
 
     @property
     def touser(self):
@@ -32,7 +73,7 @@ class MSG(object):
 
     @touser.setter
     def touser(self, values):
-        self._touser = '|'.join(values) if not isinstance(values, str) else values
+        self._touser = join_ids(values)
 
     @property
     def toparty(self):
@@ -41,7 +82,7 @@ class MSG(object):
 
     @toparty.setter
     def toparty(self, values):
-        self._toparty = '|'.join(values) if not isinstance(values, str) else values
+        self._toparty = join_ids(values)
 
     @property
     def totag(self):
@@ -50,7 +91,7 @@ class MSG(object):
 
     @totag.setter
     def totag(self, values):
-        self._totag = '|'.join(values) if not isinstance(values, str) else values
+        self._totag = join_ids(values)
 
     def check(self, type, msg):
         """
@@ -63,116 +104,24 @@ class MSG(object):
            "agentid" : 1, // 企业应用的id，整型。企业内部开发，可在应用的设置页面查看；第三方服务商，可通过接口 获取企业授权信息 获取该参数值
            "safe": 0, // 表示是否是保密消息，0表示否，1表示是，默认0
         """
-        if not (self.toparty or self.totag or self.touser):
-            raise SendMsgError('toparty、touser、totag不能同时为空')
+        self.get_recipients()
+        self.check_msg(type, msg)
 
-        def check_news(msg):
-            if 'articles' not in msg:
-                raise SendMsgError('msg 中缺少参数 articles')
-            """
-            参数前有井号说明不为必需参数。
-            title       标题，不超过128个字节，超过会自动截断
-            url         点击后跳转的链接。
-            # description 描述，不超过512个字节，超过会自动截断
-            # picurl      图文消息的图片链接，支持JPG、PNG格式，较好的效果为大图 1068*455，小图150*150
-            """
-            params = 'title', 'url'
-            for param in params:
-                for article in msg['articles']:
-                    if param not in article:
-                        raise SendMsgError(f'msg 中缺少参数 {param}')
-
-        def check_mpnews(msg):
-            """
-            mpnews类型的图文消息，跟普通的图文消息一致，唯一的差异是图文内容存储在企业微信。
-            多次发送mpnews，会被认为是不同的图文，阅读、点赞的统计会被分开计算。
-            """
-            if 'articles' not in msg:
-                raise SendMsgError('msg 中缺少参数 articles')
-            """
-            参数前有井号说明不为必需参数。
-            title                   标题，不超过128个字节，超过会自动截断
-            thumb_media_id          图文消息缩略图的media_id，可以通过素材管理接口获得。此处thumb_media_id即上传接口返回的media_id
-            content                 图文消息的内容，支持html标签，不超过666 K个字节
-            # author                图文消息的作者，不超过64个字节
-            # content_source_url    图文消息点击“阅读原文”之后的页面链接
-            # digest                图文消息的描述，不超过512个字节，超过会自动截断
-            """
-            params = 'title', 'thumb_media_id', 'content'
-            for param in params:
-                for article in msg['articles']:
-                    if param not in article:
-                        raise SendMsgError(f'msg 中缺少参数 {param}')
-
-        msg_tables = {
-            'text': (
-                # 消息内容，最长不超过2048个字节，超过将截断
-                'content',
-            ),
-            'image': (
-                # 图片媒体文件id，可以调用上传临时素材接口获取
-                'media_id',
-            ),
-            'voice': (
-                # 语音文件id，可以调用上传临时素材接口获取
-                'media_id',
-            ),
-            'video': (
-                # 视频媒体文件id，可以调用上传临时素材接口获取
-                'media_id',
-                # 视频消息的标题，不超过128个字节，超过会自动截断
-                # 'title', -----> 该参数不为必需
-                # 视频消息的描述，不超过512个字节，超过会自动截断
-                # 'description', -----> 该参数不为必需
-            ),
-            'file': (
-                # 文件id，可以调用上传临时素材接口获取
-                'media_id',
-            ),
-            'textcard': (
-                # 标题，不超过128个字节，超过会自动截断
-                'title',
-                # 描述，不超过512个字节，超过会自动截断
-                'description',
-                # 点击后跳转的链接。
-                'url',
-                # 按钮文字。 默认为“详情”， 不超过4个文字，超过自动截断。
-                # 'btntxt', -----> 该参数不为必需
-            ),
-            'markdown': (
-                # markdown内容，最长不超过2048个字节，必须是utf8编码
-                'content',
-            ),
-            'miniprogram_notice': (
-                # 小程序appid，必须是与当前小程序应用关联的小程序
-                'appid',
-                # 点击消息卡片后的小程序页面，仅限本小程序内的页面。该字段不填则消息点击后不跳转。
-                # 'page', -----> 该参数不为必需
-                # 消息标题，长度限制4-12个汉字
-                'title',
-                # 消息描述，长度限制4-12个汉字
-                # 'description', -----> 该参数不为必需
-                # 是否放大第一个content_item， 参数为 True 或者 False
-                # 'emphasis_first_item', -----> 该参数不为必需
-                # 消息内容键值对，最多允许10个item
-                # 'content_item', {'key': key, 'value': value} -----> 该参数不为必需
-            ),
-            'news': (
-                check_news,
-            ),
-            'mpnews': (
-                check_mpnews,
-            )
-        }
+    def get_recipients(self, touser=None, toparty=None, totag=None):
+        """返回 (touser, toparty, totag)，都为 None 时使用实例的属性"""
+        if touser is None and toparty is None and totag is None:
+            touser, toparty, totag = self.touser, self.toparty, self.totag
+        else:
+            touser, toparty, totag = join_ids(touser), join_ids(toparty), join_ids(totag)
+        if not (toparty or totag or touser):
+            raise SendMsgError('toparty、touser、totag不能同时为空')
+        return touser, toparty, totag
 
-        for param in msg_tables[type]:
-            if hasattr(param, '__call__'):
-                param(msg)
-            else:
-                if param not in msg:
-                    raise SendMsgError(f'type 为 {type} 的msg 中缺少参数 {param}')
+    def check_msg(self, type, msg):
+        """校验 msg 中的必需参数与长度限制，不检查接收者，规则见 wework.validators.MSG_SPECS"""
+        validate(type, msg)
 
-    def send(self, type, msg):
+    def send(self, type, msg, touser=None, toparty=None, totag=None, safe=None):
         """
            "touser" : "UserID1|UserID2|UserID3", // 成员ID列表（消息接收者，多个接收者用‘|’分隔，最多支持1000个）。
            特殊情况：指定为@all，则向该企业应用的全部成员发送
@@ -181,28 +130,86 @@ class MSG(object):
            "msgtype" : "text", // 消息类型
            "agentid" : 1, // 企业应用的id，整型。企业内部开发，可在应用的设置页面查看；第三方服务商，可通过接口 获取企业授权信息 获取该参数值
            "safe": 0, // 表示是否是保密消息，0表示否，1表示是，默认0
+        touser、toparty、totag 可以是字符串或ID列表，都不传时使用实例的属性；safe 不传时使用实例的属性
         :return: 
         """
-        self.check(type, msg)
+        touser, toparty, totag = self.get_recipients(touser, toparty, totag)
+        safe = self.safe if safe is None else safe
+        self.check_msg(type, msg)
+        access_token = self.access_token
+        url = f'https://qyapi.weixin.qq.com/cgi-bin/message/send?access_token={access_token}'
+        data = self._get_send_data(type, msg, touser, toparty, totag, safe)
+        if self._can_coalesce(touser, toparty, totag):
+            return self.transport.coalescer.send(
+                coalesce_key(access_token, self.agent_id, type, msg, safe),
+                touser.split('|'),
+                lambda touser: rq.post(url, dict(data, touser=touser), self.transport, self.api, self.scope),
+            )
+        return rq.post(url, data, self.transport, self.api, self.scope)
+
+    def _can_coalesce(self, touser, toparty, totag):
+        """传输层配置了 coalescer，并且只指定了 touser 的消息才会被合并"""
+        return (getattr(self.transport, 'coalescer', None) is not None and touser and touser != '@all'
+                and not toparty and not totag)
+
+    def template(self, type, msg, fields=()):
+        """创建使用当前应用与 safe 设置的 MessageTemplate，参数同 MessageTemplate"""
+        return MessageTemplate(type, msg, self.agent_id, self.safe, fields)
+
+    def send_template(self, template, touser=None, toparty=None, totag=None, **values):
+        """
+        发送预先序列化的消息，接收者都为 None 时使用 touser、toparty、totag 属性
+        :param template: MessageTemplate
+        :param values: template.fields 中各字段的值
+        """
+        body = template.render(*self.get_recipients(touser, toparty, totag), **values)
         url = f'https://qyapi.weixin.qq.com/cgi-bin/message/send?access_token={self.access_token}'
-        data = {
-            'touser': self.touser,
-            'toparty': self.toparty,
-            'totag': self.totag,
+        return rq.post(url, body, self.transport, self.api, self.scope)
+
+    def send_bulk(self, type, msg, users=None, parties=None, tags=None, max_workers=4):
+        """
+        向大量接收者发送同一条消息，忽略 touser、toparty、totag 属性。
+        接收者按接口限制自动分批（成员每批 1000 个，部门、标签每批 100 个），各批次在线程池中并发发送。
+        :param users: 成员ID的可迭代对象，按需读取
+        :param parties: 部门ID的可迭代对象
+        :param tags: 标签ID的可迭代对象
+        :param max_workers: 同时发送的批次数
+        :return: wework.bulk.BulkResult，单个批次失败不会抛出异常，记录在 BulkResult.failed 中
+        """
+        if users is None and parties is None and tags is None:
+            raise SendMsgError('users、parties、tags不能同时为空')
+        self.check_msg(type, msg)
+        data = self._get_send_data(type, msg, None, None, None, self.safe)
+
+        def send(touser, toparty, totag):
+            url = f'https://qyapi.weixin.qq.com/cgi-bin/message/send?access_token={self.access_token}'
+            batch = dict(data, touser=touser, toparty=toparty, totag=totag)
+            return rq.post(url, batch, self.transport, self.api, self.scope)
+
+        return bulk.run_batches(send, bulk.iter_batches(users, parties, tags), max_workers)
+
+    def _get_send_data(self, type, msg, touser, toparty, totag, safe):
+        return {
+            'touser': touser,
+            'toparty': toparty,
+            'totag': totag,
             'msgtype': type,
             type: msg,
             'agentid': self.agent_id,
-            'safe': self.safe
+            'safe': safe
         }
-        return rq.post(url, data)
 
-    def upload_temp_media(self, type, file, filename):
+    def upload_temp_media(self, type, file, filename, size=None, content_type=None, progress=None):
         """
         https://work.weixin.qq.com/api/doc#90000/90135/90253
         上传临时素材
         素材上传得到media_id，该media_id仅三天内有效
         media_id在同一企业内应用之间可以共享
+        文件以流的方式上传，不会整个读入内存，大小超过限制时在发送前抛出 UploadError
         :param type: 媒体文件类型，分别有图片（image）、语音（voice）、视频（video），普通文件（file） 
+        :param file: 文件路径、文件对象、bytes，或者 bytes 的可迭代对象
+        :param size: 文件大小，file 为可迭代对象时必须传入
+        :param progress: 进度回调函数，参数为 (已发送的字节数, 总字节数)
         :return: 
         {
            "errcode": 0,
@@ -212,16 +219,52 @@ class MSG(object):
            "created_at": "1380000000"
         }
         """
-        if type not in ['image', 'voice', 'video', 'file']:
-            raise UploadTypeError('type的值应为以下几种之一：image、voice、video、file')
-        files = {
-            "media": (filename, file, )
-        }
+        cached, encoder, save = self._prepare_media(type, file, filename, size, content_type, progress)
+        if cached is not None:
+            return cached
         url = 'https://qyapi.weixin.qq.com/cgi-bin/media/upload?access_token={}&type={}'.format(
             self.access_token,
             type,
         )
-        data = requests.post(url, files=files).json()
+        data = self.transport.post(url, data=encoder, headers=encoder.headers).json()
         if data['errcode'] != 0:
             raise UploadError(data)
+        save(data)
         return data
+
+    def _prepare_media(self, type, file, filename, size, content_type, progress):
+        """
+        返回 (缓存的上传结果, MultipartEncoder, 上传成功后保存结果的函数)。
+        可以预先计算摘要的文件先查询 media_cache，可迭代对象在上传的同时计算摘要
+        """
+        if type not in MEDIA_SIZE_LIMITS:
+            raise UploadTypeError('type的值应为以下几种之一：image、voice、video、file')
+        cache, corp_id = self.media_cache, self.scope[0]
+        if cache is None or corp_id is None:
+            return None, self._get_media_encoder(type, file, filename, size, content_type, progress), lambda data: None
+
+        digest = media_digest(file)
+        if digest is not None:
+            value = cache.get(corp_id, type, digest)
+            if value is not None:
+                return dict(value, errcode=0, errmsg='ok', type=type), None, None
+            h = None
+        else:
+            if size is None:
+                size = MultipartEncoder.get_size(file)
+            h = hashlib.sha256()
+            if hasattr(file, 'read'):
+                source = file
+                file = iter(lambda: source.read(64 * 1024), b'')
+            file = hashing(file, h)
+        encoder = self._get_media_encoder(type, file, filename, size, content_type, progress)
+
+        def save(data):
+            cache.set(corp_id, type, digest or h.hexdigest(), data['media_id'], data['created_at'])
+        return None, encoder, save
+
+    @staticmethod
+    def _get_media_encoder(type, file, filename, size, content_type, progress):
+        encoder = MultipartEncoder('media', file, filename, size, content_type, progress=progress)
+        check_media(type, encoder.size)
+        return encoder
@@ -0,0 +1,126 @@
+import asyncio
+import io
+import mimetypes
+import os
+import uuid
+from .ierror import UploadTypeError, UploadError
+
+
+__all__ = ['MEDIA_SIZE_LIMITS', 'MultipartEncoder', 'check_media']
+
+
+# 上传临时素材的大小限制，单位字节，所有文件都不能小于 5 个字节
+MEDIA_SIZE_LIMITS = {
+    'image': 10 * 1024 * 1024,
+    'voice': 2 * 1024 * 1024,
+    'video': 10 * 1024 * 1024,
+    'file': 20 * 1024 * 1024,
+}
+MEDIA_MIN_SIZE = 5
+
+
+def check_media(type, size):
+    if type not in MEDIA_SIZE_LIMITS:
+        raise UploadTypeError('type的值应为以下几种之一：image、voice、video、file')
+    if size < MEDIA_MIN_SIZE:
+        raise UploadError('文件不能小于 {} 个字节'.format(MEDIA_MIN_SIZE))
+    if size > MEDIA_SIZE_LIMITS[type]:
+        raise UploadError('{} 类型的文件不能超过 {} 个字节，当前为 {} 个字节'.format(type, MEDIA_SIZE_LIMITS[type], size))
+
+
+class MultipartEncoder(object):
+    """
+    流式的 multipart/form-data 编码，只包含一个文件字段，迭代时按 chunk_size 读取文件，内存占用与文件大小无关。
+    实现了 __len__，requests 与 aiohttp 会设置 Content-Length 后逐块发送。
+    """
+    def __init__(self, name, source, filename, size=None, content_type=None, chunk_size=64 * 1024, progress=None):
+        """
+        :param name: 字段名
+        :param source: 文件路径、文件对象、bytes，或者 bytes 的可迭代对象
+        :param filename: 文件名
+        :param size: 文件大小，source 为可迭代对象时必须传入
+        :param content_type: 文件的 Content-Type，默认根据文件名推断
+        :param chunk_size: 每次读取的字节数
+        :param progress: 进度回调函数，参数为 (已发送的字节数, 总字节数)
+        """
+        self.boundary = uuid.uuid4().hex
+        self.content_type = 'multipart/form-data; boundary={}'.format(self.boundary)
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self._source = source
+        self.size = self.get_size(source) if size is None else size
+        content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        self._head = (
+            '--{}\r\n'
+            'Content-Disposition: form-data; name="{}"; filename="{}"; filelength={}\r\n'
+            'Content-Type: {}\r\n\r\n'
+        ).format(self.boundary, name, filename.replace('"', '%22'), self.size, content_type).encode('utf-8')
+        self._tail = '\r\n--{}--\r\n'.format(self.boundary).encode('utf-8')
+
+    @staticmethod
+    def get_size(source):
+        """返回文件的大小，可迭代对象无法预先知道大小时抛出 UploadError"""
+        if isinstance(source, (str, os.PathLike)):
+            return os.path.getsize(source)
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return len(source)
+        if hasattr(source, 'read'):
+            try:
+                return os.fstat(source.fileno()).st_size - source.tell()
+            except (AttributeError, OSError, io.UnsupportedOperation):
+                position = source.tell()
+                size = source.seek(0, os.SEEK_END) - position
+                source.seek(position)
+                return size
+        raise UploadError('使用可迭代对象上传时需要传入 size')
+
+    def __len__(self):
+        return len(self._head) + self.size + len(self._tail)
+
+    def _chunks(self):
+        source = self._source
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, 'rb') as f:
+                yield from iter(lambda: f.read(self.chunk_size), b'')
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            view = memoryview(source)
+            for i in range(0, len(view), self.chunk_size):
+                yield view[i:i + self.chunk_size].tobytes()
+        elif hasattr(source, 'read'):
+            yield from iter(lambda: source.read(self.chunk_size), b'')
+        else:
+            yield from source
+
+    def __iter__(self):
+        total = len(self)
+        sent = 0
+        yield self._head
+        sent += len(self._head)
+        read = 0
+        for chunk in self._chunks():
+            read += len(chunk)
+            if read > self.size:
+                raise UploadError('文件的实际大小超过了 {} 个字节'.format(self.size))
+            yield chunk
+            sent += len(chunk)
+            if self.progress is not None:
+                self.progress(sent, total)
+        if read != self.size:
+            raise UploadError('文件的实际大小 {} 与 size {} 不一致'.format(read, self.size))
+        yield self._tail
+        if self.progress is not None:
+            self.progress(total, total)
+
+    async def __aiter__(self):
+        # aiohttp 通过 async for 读取请求体，读取文件会阻塞，每一块都在线程池中读取，progress 也在其中调用
+        loop = asyncio.get_running_loop()
+        chunks = iter(self)
+        while True:
+            chunk = await loop.run_in_executor(None, next, chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    @property
+    def headers(self):
+        return {'Content-Type': self.content_type, 'Content-Length': str(len(self))}
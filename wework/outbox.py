@@ -0,0 +1,251 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from .ierror import APIValueError, SendMsgError
+from .retry import RetryPolicy
+
+
+__all__ = ['Outbox']
+
+
+logger = logging.getLogger(__name__)
+
+
+class Outbox(object):
+    """
+    持久化的消息发件箱：enqueue 只写入本地的 SQLite（WAL 模式）后立即返回，后台线程批量取出并通过 MSG.send 发送。
+    - 至少发送一次：消息在发送成功后立即删除，进程崩溃时已取出但未确认的消息在 visibility_timeout 秒后会被重新发送，
+      发送较慢的批次会为尚未发送的消息续期，visibility_timeout 只需大于单条消息的发送时间（包括重试）；
+    - 发送失败时按 retry_policy 退避后重试，超过最大重试次数、消息本身不合法或者 errcode 不属于
+      retry_policy.transient_errcodes（例如 40003 无效的 UserID）时移入 dead_letter 表；
+    - 多个进程可以使用同一个数据库文件，取出消息时持有写锁，同一条消息不会被同时取出。
+    """
+    def __init__(self, api, path='wework_outbox.sqlite3', workers=4, batch_size=100, visibility_timeout=60,
+                 poll_interval=0.5, retry_policy=None, timeout=10):
+        """
+        :param api: 提供 msg 属性的对象，例如 WorkWechatCorpAPI，通过 api.msg.send 发送
+        :param path: 数据库文件路径
+        :param workers: 后台发送线程数
+        :param batch_size: 每次取出的消息数量
+        :param visibility_timeout: 取出的消息在多少秒内未确认时视为发送中断，单位秒
+        :param poll_interval: 发件箱为空时的轮询间隔，单位秒
+        :param retry_policy: 重试策略，max_retries 为最大重试次数，backoff_time 为重试前的等待时间
+        :param timeout: 等待数据库锁的超时时间，单位秒
+        """
+        self.api = api
+        self.path = path
+        self.workers = workers
+        self.batch_size = batch_size
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+        self.retry_policy = retry_policy or RetryPolicy(max_retries=5, backoff=5, max_backoff=600)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._threads = []
+        self._stop = threading.Event()
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_time REAL NOT NULL,
+                locked_until REAL NOT NULL DEFAULT 0,
+                created_time REAL NOT NULL,
+                last_error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS outbox_next_time ON outbox (next_time);
+            CREATE TABLE IF NOT EXISTS dead_letter (
+                id INTEGER PRIMARY KEY,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                created_time REAL NOT NULL,
+                failed_time REAL NOT NULL,
+                error TEXT
+            );
+        ''')
+
+    @property
+    def connection(self):
+        # 同 SQLiteCache，每个线程（以及 fork 后的子进程）持有自己的连接
+        conn = getattr(self._local, 'connection', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def enqueue(self, type, msg, touser=None, toparty=None, totag=None, safe=0, delay=0):
+        """
+        将消息写入发件箱，参数同 MSG.send 与 MSG 的接收者属性
+        :param delay: 延迟多少秒后发送
+        :return: 消息的 id
+        """
+        now = time.time()
+        payload = json.dumps({
+            'type': type,
+            'msg': msg,
+            'touser': touser,
+            'toparty': toparty,
+            'totag': totag,
+            'safe': safe,
+        })
+        return self.connection.execute(
+            'INSERT INTO outbox (payload, next_time, created_time) VALUES (?, ?, ?)',
+            (payload, now + delay, now),
+        ).lastrowid
+
+    def claim(self):
+        """取出最多 batch_size 条到期的消息，返回 [(id, payload, attempts, created_time)]"""
+        conn = self.connection
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                'SELECT id, payload, attempts, created_time FROM outbox WHERE next_time <= ? AND locked_until <= ? '
+                'ORDER BY next_time LIMIT ?',
+                (now, now, self.batch_size),
+            ).fetchall()
+            conn.executemany('UPDATE outbox SET locked_until = ? WHERE id = ?',
+                             [(now + self.visibility_timeout, row[0]) for row in rows])
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return rows
+
+    def deliver(self, payload):
+        data = json.loads(payload)
+        return self.api.msg.send(data['type'], data['msg'], data['touser'], data['toparty'], data['totag'],
+                                 data['safe'])
+
+    def process(self, rows):
+        """
+        逐条发送取出的消息，每条发送后立即确认成功、安排重试或移入 dead_letter。
+        剩余的锁定时间不足 visibility_timeout 的一半时，为批次中尚未发送的消息续期，
+        整个批次的发送时间超过 visibility_timeout 时也不会被其它线程重新取出
+        """
+        count = 0
+        locked_until = time.time() + self.visibility_timeout
+        for i, (id, payload, attempts, created_time) in enumerate(rows):
+            if locked_until - time.time() < self.visibility_timeout / 2:
+                locked_until = self.renew([row[0] for row in rows[i:]])
+            try:
+                self.deliver(payload)
+            except Exception as e:
+                error = '{}: {}'.format(type(e).__name__, e)
+                logger.warning('发送消息 %s 失败：%s', id, error)
+                if not self.retryable(e) or attempts >= self.retry_policy.max_retries:
+                    self._ack(dead=[(id, payload, attempts + 1, created_time, time.time(), error)])
+                else:
+                    self._ack(retry=[(time.time() + self.retry_policy.backoff_time(attempts), error, id)])
+            else:
+                self._ack(done=[(id, )])
+                count += 1
+        return count
+
+    def retryable(self, e):
+        """消息不合法，或者接口返回的 errcode 不是系统繁忙、频率限制等临时错误时，重试也不会成功"""
+        if isinstance(e, SendMsgError):
+            return False
+        if isinstance(e, APIValueError):
+            data = e.args[0] if e.args else None
+            errcode = data.get('errcode') if isinstance(data, dict) else None
+            return errcode in self.retry_policy.transient_errcodes or errcode in self.retry_policy.token_errcodes
+        return True
+
+    def renew(self, ids):
+        """延长已取出的消息的锁定时间，返回新的 locked_until"""
+        locked_until = time.time() + self.visibility_timeout
+        self.connection.executemany('UPDATE outbox SET locked_until = ? WHERE id = ?',
+                                    [(locked_until, id) for id in ids])
+        return locked_until
+
+    def _ack(self, done=(), retry=(), dead=()):
+        """在同一个事务中确认成功、安排重试或移入 dead_letter"""
+        conn = self.connection
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('DELETE FROM outbox WHERE id = ?', list(done) + [(row[0], ) for row in dead])
+            conn.executemany(
+                'UPDATE outbox SET attempts = attempts + 1, next_time = ?, locked_until = 0, last_error = ? '
+                'WHERE id = ?', retry)
+            conn.executemany(
+                'INSERT OR REPLACE INTO dead_letter (id, payload, attempts, created_time, failed_time, error) '
+                'VALUES (?, ?, ?, ?, ?, ?)', dead)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def drain(self):
+        """在当前线程中发送所有到期的消息，返回发送成功的数量"""
+        count = 0
+        while True:
+            rows = self.claim()
+            if not rows:
+                return count
+            count += self.process(rows)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                rows = self.claim()
+                if rows:
+                    self.process(rows)
+                    continue
+            except Exception:
+                logger.exception('发件箱处理失败')
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        if self._threads:
+            return self
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name='wework-outbox-{}'.format(i), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        """通知后台线程退出，正在发送的批次完成后才会退出"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def pending(self):
+        """发件箱中尚未发送成功的消息数量"""
+        return self.connection.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+
+    def dead_letters(self):
+        """返回 dead_letter 表中的消息，[{id, type, msg, touser, toparty, totag, safe, attempts, error}]"""
+        rows = self.connection.execute('SELECT id, payload, attempts, error FROM dead_letter ORDER BY id').fetchall()
+        return [dict(json.loads(payload), id=id, attempts=attempts, error=error) for id, payload, attempts, error in rows]
+
+    def requeue(self, id):
+        """将 dead_letter 中的消息重新放回发件箱"""
+        conn = self.connection
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT payload, created_time FROM dead_letter WHERE id = ?', (id, )).fetchone()
+            if row is not None:
+                conn.execute('INSERT INTO outbox (id, payload, next_time, created_time) VALUES (?, ?, ?, ?)',
+                             (id, row[0], time.time(), row[1]))
+                conn.execute('DELETE FROM dead_letter WHERE id = ?', (id, ))
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return row is not None
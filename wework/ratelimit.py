@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from .ierror import RateLimitError
+
+
+__all__ = ['TokenBucket', 'RateLimiter', 'get_endpoint_family']
+
+
+class TokenBucket(object):
+    """令牌桶，每秒补充 rate 个令牌，最多积累 capacity 个"""
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = rate if capacity is None else capacity
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, n=1, max_wait=None):
+        """
+        预定 n 个令牌，返回需要等待的时间，单位秒。
+        需要等待的时间超过 max_wait 时不预定，返回 None
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            wait = max(n - self._tokens, 0) / self.rate
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= n
+            return wait
+
+
+def get_endpoint_family(endpoint):
+    """/cgi-bin/message/send 的接口族为 message"""
+    parts = [part for part in endpoint.split('/') if part and part != 'cgi-bin']
+    return parts[0] if parts else ''
+
+
+class RateLimiter(object):
+    """
+    客户端限流，按 (企业, 应用, 接口族) 划分令牌桶，请求发出前先获取令牌，避免触发企业微信的频率限制（45009、45033）。
+    limits 中的 key 为接口族名称，'*' 为未单独配置的接口族的默认值，value 为 (次数, 秒)，例如
+    {'message': (600, 60), '*': (10000, 60)}
+    """
+    DEFAULT_LIMITS = {'*': (10000, 60)}
+
+    def __init__(self, limits=None, blocking=True, max_wait=None, maxsize=10000):
+        """
+        :param limits: 各接口族的频率限制
+        :param blocking: 没有令牌时是否等待，为 False 时直接抛出 RateLimitError
+        :param max_wait: 最长等待时间，超过时抛出 RateLimitError，单位秒，None 表示不限制
+        :param maxsize: 最多保存的令牌桶数量，超过时淘汰最久未使用的
+        """
+        self.limits = dict(self.DEFAULT_LIMITS, **(limits or {}))
+        self.max_wait = max_wait if blocking else 0
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_bucket(self, corp_id, agent_id, family):
+        key = corp_id, agent_id, family
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                count, period = self.limits.get(family, self.limits['*'])
+                bucket = self._buckets[key] = TokenBucket(count / period, count)
+                while len(self._buckets) > self.maxsize:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket
+
+    def reserve(self, corp_id, agent_id, endpoint):
+        bucket = self.get_bucket(corp_id, agent_id, get_endpoint_family(endpoint))
+        wait = bucket.reserve(1, self.max_wait)
+        if wait is None:
+            raise RateLimitError('{} 超过频率限制'.format(endpoint))
+        return wait
+
+    def acquire(self, corp_id, agent_id, endpoint):
+        """获取令牌，必要时阻塞等待，返回等待的时间"""
+        wait = self.reserve(corp_id, agent_id, endpoint)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, corp_id, agent_id, endpoint):
+        """acquire 的协程版本，等待时不阻塞事件循环"""
+        wait = self.reserve(corp_id, agent_id, endpoint)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
@@ -0,0 +1,169 @@
+import json
+from array import array
+
+
+__all__ = ['StringPool', 'UserRecord', 'DepartmentRecord', 'TagRecord', 'compact']
+
+
+class StringPool(object):
+    """相同的字符串只保留一份，用于部门名称、职务等大量重复的值"""
+    def __init__(self):
+        self._strings = {}
+
+    def __call__(self, value):
+        if value.__class__ is not str:
+            return value
+        return self._strings.setdefault(value, value)
+
+    def __len__(self):
+        return len(self._strings)
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class Record(object):
+    """
+    使用 __slots__ 的只读记录，可以像 dict 一样通过 record['name'] 与 record.get('name') 读取，
+    也可以通过属性读取。不在 _fields 中的字段（例如 extattr、external_profile）序列化为 json 保存，读取时才解析。
+    """
+    __slots__ = ('_extra', )
+    # 字段名 -> 转换函数
+    _fields = {}
+    # 需要放入字符串池的字段
+    _interned = ()
+
+    def __init__(self, data, pool=None):
+        """
+        :param data: 接口返回的 dict
+        :param pool: StringPool，多个记录共用一个字符串池
+        """
+        pool = StringPool() if pool is None else pool
+        extra = {}
+        for key, value in data.items():
+            if key in self._fields:
+                if key in self._interned:
+                    value = pool(value)
+                elif value is not None and self._fields[key] is not None:
+                    value = self._fields[key](value)
+                object.__setattr__(self, key, value)
+            elif key not in ('errcode', 'errmsg'):
+                extra[key] = value
+        for key in self._fields:
+            if key not in data:
+                object.__setattr__(self, key, None)
+        object.__setattr__(self, '_extra', _dumps(extra) if extra else None)
+
+    @classmethod
+    def from_dict(cls, data, pool=None):
+        return data if isinstance(data, cls) else cls(data, pool)
+
+    @property
+    def extra(self):
+        """_fields 之外的字段，每次读取时解析"""
+        return json.loads(self._extra) if self._extra is not None else {}
+
+    def __getattr__(self, name):
+        # 只在 __slots__ 中找不到时调用
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self.extra[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} 是只读的'.format(self.__class__.__name__))
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+            raise KeyError(key)
+        return self.extra[key]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def keys(self):
+        return [key for key in self._fields if getattr(self, key) is not None] + list(self.extra)
+
+    def to_dict(self):
+        """转换为接口返回的 dict 形式，数组转换为 list"""
+        data = {}
+        for key in self._fields:
+            value = getattr(self, key)
+            if value is not None:
+                data[key] = list(value) if isinstance(value, (array, tuple)) else value
+        data.update(self.extra)
+        return data
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return self.__class__, (self.to_dict(), )
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.to_dict())
+
+
+def _ids(values):
+    return array('q', values)
+
+
+def _flags(values):
+    return array('b', values)
+
+
+class UserRecord(Record):
+    _fields = {
+        'userid': str, 'name': str, 'department': _ids, 'order': _ids, 'position': None, 'mobile': str,
+        'gender': None, 'email': str, 'is_leader_in_dept': _flags, 'avatar': str, 'thumb_avatar': str,
+        'telephone': str, 'alias': str, 'status': int, 'main_department': int, 'qr_code': str,
+        'open_userid': str, 'address': str, 'enable': int, 'hide_mobile': int, 'english_name': str,
+    }
+    _interned = ('userid', 'position', 'gender')
+    __slots__ = tuple(_fields)
+
+
+class DepartmentRecord(Record):
+    _fields = {'id': int, 'name': None, 'name_en': None, 'parentid': int, 'order': int, 'department_leader': tuple}
+    _interned = ('name', 'name_en')
+    __slots__ = tuple(_fields)
+
+
+class TagRecord(Record):
+    _fields = {'tagid': int, 'tagname': str, 'userlist': tuple}
+    __slots__ = tuple(_fields)
+
+    def __init__(self, data, pool=None):
+        pool = StringPool() if pool is None else pool
+        userlist = data.get('userlist')
+        if userlist is not None:
+            data = dict(data, userlist=[pool(userid) for userid in userlist])
+        super(TagRecord, self).__init__(data, pool)
+
+
+def compact(departments, users, tags=(), pool=None):
+    """把接口返回的部门、成员、标签列表转换为紧凑的记录，共用一个字符串池"""
+    pool = StringPool() if pool is None else pool
+    # 先转换成员，标签中的 userlist 与成员的 userid 共用同一个字符串
+    users = [UserRecord.from_dict(u, pool) for u in users]
+    return (
+        [DepartmentRecord.from_dict(d, pool) for d in departments],
+        users,
+        [TagRecord.from_dict(t, pool) for t in tags],
+    )
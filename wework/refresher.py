@@ -0,0 +1,131 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+
+
+__all__ = ['TokenRefresher']
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenRefresher(object):
+    """
+    后台线程提前刷新 access_token，使请求路径不再因为 token 过期而阻塞在 gettoken 上。
+    可注册任何提供 refresh_access_token(expires_time=None) 与 access_token_expires_time 的对象，
+    例如 WorkWechatCorpAPI、WorkWechatSuiteApi、WorkProviderWechatApi 以及 suite_api.get_corp_api() 返回的授权企业api。
+
+    WSGI 下可以在应用加载时调用 start()，在进程退出时调用 stop()；
+    ASGI 下可以在 lifespan 的 startup/shutdown 事件中调用。
+
+    刷新时传入上次看到的过期时间，配置了 TOKEN_LEASE 时多个进程的刷新线程在同一个周期内只有一个会获取新的 token，
+    其余的直接使用缓存中已经更新的 token。
+    """
+    def __init__(self, fraction=0.8, jitter=0.05, retry_interval=30, default_expires_in=7200):
+        """
+        :param fraction: 在 token 有效期过去多少比例时刷新，例如 0.8 表示 7200 秒的 token 在 5760 秒时刷新
+        :param jitter: 随机提前的比例，避免多个 token 或多个进程在同一时刻刷新
+        :param retry_interval: 刷新失败后的重试间隔，单位秒
+        :param default_expires_in: 尚未刷新过的 token 估算使用的有效期，单位秒
+        """
+        if not 0 < fraction < 1:
+            raise ValueError('fraction 必须在 0 与 1 之间')
+        self.fraction = fraction
+        self.jitter = jitter
+        self.retry_interval = retry_interval
+        self.default_expires_in = default_expires_in
+        self._queue = []
+        self._apis = {}
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def add(self, api):
+        """注册一个需要后台刷新的 api，重复注册会被忽略"""
+        with self._cond:
+            if id(api) in self._apis:
+                return
+            entry = self._apis[id(api)] = [api, self.default_expires_in, None]
+            self._schedule(api, self._first_refresh_time(entry))
+
+    def remove(self, api):
+        with self._cond:
+            self._apis.pop(id(api), None)
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='wework-token-refresher', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def next_refresh_time(self, expires_time, expires_in, now=None):
+        """根据过期时间与有效期计算下一次刷新的时间戳"""
+        now = time.time() if now is None else now
+        lead = expires_in * (1 - self.fraction + self.jitter * random.random())
+        return max(now, expires_time - lead)
+
+    def _first_refresh_time(self, entry):
+        entry[2] = expires_time = entry[0].access_token_expires_time
+        if expires_time is None:
+            return time.time()
+        return self.next_refresh_time(expires_time, self.default_expires_in)
+
+    def _schedule(self, api, when):
+        heapq.heappush(self._queue, (when, next(self._counter), id(api)))
+        self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    if self._queue and self._queue[0][0] <= time.time():
+                        break
+                    timeout = self._queue[0][0] - time.time() if self._queue else None
+                    self._cond.wait(timeout)
+                if self._stopping:
+                    return
+                _, _, key = heapq.heappop(self._queue)
+                entry = self._apis.get(key)
+            if entry is not None:
+                self._refresh(key, entry)
+
+    def _refresh(self, key, entry):
+        api, expires_in, expires_time = entry
+        started = time.time()
+        try:
+            api.refresh_access_token(expires_time=expires_time)
+            # 刷新后缓存被清除等情况下过期时间为 None，同样按失败处理
+            expires_time = api.access_token_expires_time
+            # 以本次刷新得到的有效期作为之后的估算值
+            expires_in = max(int(expires_time - started), 1)
+        except Exception:
+            logger.exception('后台刷新 access_token 失败，%s 秒后重试', self.retry_interval)
+            when = time.time() + self.retry_interval
+        else:
+            entry[1], entry[2] = expires_in, expires_time
+            when = self.next_refresh_time(expires_time, expires_in)
+        with self._cond:
+            if key in self._apis:
+                self._schedule(api, when)
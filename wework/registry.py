@@ -0,0 +1,46 @@
+import threading
+from collections import OrderedDict
+
+
+__all__ = ['TokenRegistry', 'default_registry']
+
+
+class TokenRegistry(object):
+    """
+    进程内共享的 access_token 注册表。
+    同一份凭证（例如 (corp_id, secret)）的所有 api 实例共用同一个 token 状态，
+    超过 maxsize 时淘汰最久未使用的凭证，适用于多租户的部署。
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key):
+        """获取 key 对应的 token 状态，不存在时创建一个空的状态"""
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+                return self._data[key]
+            except KeyError:
+                state = self._data[key] = {}
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+                return state
+
+    def pop(self, key):
+        with self._lock:
+            return self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
+default_registry = TokenRegistry()
@@ -0,0 +1,260 @@
+import functools
+import inspect
+import json
+import threading
+import time
+from .cache import MemoryCache, create_cache
+from .singleflight import SingleFlight, AsyncSingleFlight
+
+
+__all__ = ['DEFAULT_TTLS', 'ResponseCache', 'cached_response']
+
+
+# 默认缓存的接口与有效期，单位秒
+DEFAULT_TTLS = {
+    'department/list': 300,
+    'user/simplelist': 300,
+    'tag/list': 300,
+    'tag/get': 300,
+}
+
+# change_contact 事件影响的接口
+_EVENT_ENDPOINTS = {
+    'create_user': ('user/simplelist', ),
+    'update_user': ('user/simplelist', 'tag/get'),
+    'delete_user': ('user/simplelist', 'tag/get'),
+    'create_party': ('department/list', 'user/simplelist'),
+    'update_party': ('department/list', 'user/simplelist'),
+    'delete_party': ('department/list', 'user/simplelist'),
+    'update_tag': ('tag/list', ),
+}
+
+
+def _normalize(value):
+    """参数的不同写法对应同一个请求，例如 fetch_child=0 与 False、tag_id='1' 与 1，转换后使用同一个 key"""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, str) and value.isascii() and value.lstrip('-').isdigit():
+        return int(value)
+    return value
+
+
+class _HelperCache(object):
+    """把 BaseHelper 的 cache_get/cache_set/cache_delete 作为缓存后端"""
+    def __init__(self, helper):
+        self.helper = helper
+
+    def get(self, key):
+        return self.helper.cache_get(key)
+
+    def set(self, key, value, ttl=None):
+        self.helper.cache_set(key, value, ttl=ttl)
+
+    def delete(self, key):
+        self.helper.cache_delete(key)
+
+
+class ResponseCache(object):
+    """
+    读穿透的接口响应缓存，key 为 (企业, 接口, 参数)。
+    先读进程内的 LRU，再读共享的缓存后端，都没有时请求接口；同一个 key 的并发请求只会请求一次接口。
+    返回值在多个调用者之间共享，不要修改。
+
+    invalidate 通过递增 (企业, 接口) 的版本号使缓存失效，旧版本的缓存不再被读取，随 LRU 淘汰或过期，
+    共享的缓存后端不需要支持按前缀删除。配置了共享后端时，进程内的缓存与版本号最多保留 local_ttl 秒，
+    其它进程调用的 invalidate 最多在 local_ttl 秒后生效。
+    """
+    def __init__(self, ttls=None, maxsize=1000, backend=None, local_ttl=10, prefix='wework_response_'):
+        """
+        :param ttls: {接口: 有效期}，与 DEFAULT_TTLS 合并，有效期为 None 的接口不缓存
+        :param maxsize: 进程内 LRU 最多保存的响应数量
+        :param backend: 共享的缓存后端，BaseCache 的实例、create_cache 支持的名称，或者 BaseHelper（使用其 cache_get/cache_set）
+        :param local_ttl: 配置了共享后端时，进程内缓存的有效期，单位秒
+        """
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.local = MemoryCache(maxsize)
+        if backend is None:
+            self.backend = None
+        elif hasattr(backend, 'cache_get'):
+            self.backend = _HelperCache(backend)
+        else:
+            self.backend = create_cache(backend)
+        self.local_ttl = local_ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._async_flight = AsyncSingleFlight()
+
+    def _generation_key(self, corp_id, endpoint):
+        return '{}{}_{}_generation'.format(self.prefix, corp_id, endpoint)
+
+    def _generation(self, corp_id, endpoint):
+        """(企业, 接口) 当前的版本号，共享后端中的版本号在进程内缓存 local_ttl 秒"""
+        key = self._generation_key(corp_id, endpoint)
+        if self.backend is None:
+            return self._generations.get(key, 0)
+        generation, expires = self._generations.get(key, (0, 0))
+        now = time.monotonic()
+        if expires <= now:
+            generation = self.backend.get(key) or 0
+            self._generations[key] = generation, now + self.local_ttl
+        return generation
+
+    def _key(self, corp_id, endpoint, params, generation):
+        params = json.dumps({k: _normalize(v) for k, v in params.items()}, sort_keys=True, separators=(',', ':'), default=str)
+        return '{}{}_{}_{}_{}'.format(self.prefix, corp_id, endpoint, generation, params)
+
+    def _lookup(self, corp_id, endpoint, params):
+        """返回 (key, 版本号, 缓存的值)，值被包装为 {'data': ...}，空的列表也可以缓存"""
+        generation = self._generation(corp_id, endpoint)
+        key = self._key(corp_id, endpoint, params, generation)
+        value = self.local.get(key)
+        if value is None and self.backend is not None:
+            value = self.backend.get(key)
+            if value is not None:
+                self.local.set(key, value, self.local_ttl)
+        return key, generation, value
+
+    def _store(self, corp_id, endpoint, key, generation, value, ttl):
+        # 请求期间缓存被 invalidate 时，结果可能是旧的，不写入
+        if self._generation(corp_id, endpoint) != generation:
+            return
+        if self.backend is not None:
+            self.backend.set(key, value, ttl)
+            ttl = min(ttl, self.local_ttl)
+        self.local.set(key, value, ttl)
+
+    def get_or_fetch(self, corp_id, endpoint, params, fetch):
+        """
+        :param params: 请求参数的 dict，与 corp_id、endpoint 一起组成 key
+        :param fetch: 缓存中没有时调用，返回值需要可以被 json 序列化
+        """
+        ttl = self.ttls.get(endpoint)
+        if ttl is None:
+            return fetch()
+        key, generation, value = self._lookup(corp_id, endpoint, params)
+        if value is not None:
+            self.hits += 1
+            return value['data']
+
+        def load():
+            # 等待期间其它调用者可能已经写入
+            key, generation, value = self._lookup(corp_id, endpoint, params)
+            if value is None:
+                self.misses += 1
+                value = {'data': fetch()}
+                self._store(corp_id, endpoint, key, generation, value, ttl)
+            return value
+        # key 包含版本号，invalidate 之后的调用者不会合并到之前发出的请求
+        return self._flight.do(key, load)['data']
+
+    async def get_or_fetch_async(self, corp_id, endpoint, params, fetch):
+        """同 get_or_fetch，fetch 返回 awaitable 对象"""
+        ttl = self.ttls.get(endpoint)
+        if ttl is None:
+            return await fetch()
+        key, generation, value = self._lookup(corp_id, endpoint, params)
+        if value is not None:
+            self.hits += 1
+            return value['data']
+
+        async def load():
+            key, generation, value = self._lookup(corp_id, endpoint, params)
+            if value is None:
+                self.misses += 1
+                value = {'data': await fetch()}
+                self._store(corp_id, endpoint, key, generation, value, ttl)
+            return value
+        return (await self._async_flight.do(key, load))['data']
+
+    def invalidate(self, corp_id, endpoint=None, params=None):
+        """
+        使缓存失效
+        :param endpoint: 接口，例如 department/list，None 表示所有接口
+        :param params: 只使这组参数的缓存失效，需要包含方法的所有参数（包括默认值），
+            例如 invalidate(corp_id, 'tag/get', {'tag_id': 1})；None 表示该接口的所有缓存
+        """
+        if endpoint is None:
+            for endpoint in self.ttls:
+                self.invalidate(corp_id, endpoint)
+            return
+        if params is not None:
+            key = self._key(corp_id, endpoint, params, self._generation(corp_id, endpoint))
+            self.local.delete(key)
+            if self.backend is not None:
+                self.backend.delete(key)
+            return
+        key = self._generation_key(corp_id, endpoint)
+        with self._lock:
+            if self.backend is None:
+                self._generations[key] = self._generations.get(key, 0) + 1
+                return
+            # 多个进程同时递增时可能得到相同的值，但都与原来的版本号不同，旧的缓存都会失效
+            generation = (self.backend.get(key) or 0) + 1
+            self.backend.set(key, generation, None)
+            self._generations[key] = generation, time.monotonic() + self.local_ttl
+
+    def invalidate_event(self, corp_id, event):
+        """
+        根据 change_contact 回调事件使受影响的接口缓存失效
+        :param event: parse_event 或 parse_xml 的返回值
+        """
+        if event.get('Event') != 'change_contact':
+            return
+        change_type = event.get('ChangeType')
+        for endpoint in _EVENT_ENDPOINTS.get(change_type, ()):
+            self.invalidate(corp_id, endpoint)
+        if change_type == 'update_tag' and event.get('TagId'):
+            self.invalidate(corp_id, 'tag/get', {'tag_id': int(event['TagId'])})
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': len(self.local),
+        }
+
+
+def cached_response(endpoint):
+    """
+    api 的方法使用 api.response_cache 缓存返回值，方法的参数（包括默认值）作为 key 的一部分。
+    api.response_cache 为 None 时直接调用。同时支持普通方法与 async 方法。
+
+        @cached_response('tag/list')
+        def get_tag_list(self):
+            ...
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        def get_params(args, kwargs):
+            bound = signature.bind(None, *args, **kwargs)
+            bound.apply_defaults()
+            params = dict(bound.arguments)
+            params.pop(next(iter(signature.parameters)))
+            return params
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(self, *args, **kwargs):
+                cache = self.response_cache
+                if cache is None:
+                    return await fn(self, *args, **kwargs)
+                return await cache.get_or_fetch_async(self.corp_id, endpoint, get_params(args, kwargs),
+                                                      lambda: fn(self, *args, **kwargs))
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            cache = self.response_cache
+            if cache is None:
+                return fn(self, *args, **kwargs)
+            return cache.get_or_fetch(self.corp_id, endpoint, get_params(args, kwargs),
+                                      lambda: fn(self, *args, **kwargs))
+        return wrapper
+    return decorator
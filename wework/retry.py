@@ -0,0 +1,76 @@
+import random
+import re
+from urllib.parse import urlparse
+
+
+__all__ = ['RetryPolicy', 'NO_RETRY', 'TOKEN_INVALID_ERRCODES', 'TRANSIENT_ERRCODES']
+
+
+# access_token 无效或已过期
+TOKEN_INVALID_ERRCODES = (40014, 42001, 40082, 42009)
+# 系统繁忙、接口调用超过限制、接口并发调用超过限制
+TRANSIENT_ERRCODES = (-1, 45009, 45033)
+
+_token_pattern = re.compile(r'([?&](?:suite_|provider_)?access_token=)([^&]*)')
+
+
+class RetryPolicy(object):
+    """
+    请求失败时的重试策略。
+    - errcode 属于 token_errcodes 时使缓存的 access_token 失效，获取新的 token 后重放一次请求；
+    - errcode 属于 transient_errcodes 或者连接失败时，按指数退避并加上随机抖动后重试，最多 max_retries 次。
+    为避免重复发送，POST 请求只在建立连接失败（请求未发出）时重试，GET 请求在连接中断、读取超时时也会重试。
+    """
+    def __init__(self, max_retries=3, backoff=0.2, max_backoff=5, jitter=0.5,
+                 token_errcodes=TOKEN_INVALID_ERRCODES, transient_errcodes=TRANSIENT_ERRCODES,
+                 retry_connection_errors=True):
+        """
+        :param max_retries: 最大重试次数，不包含 token 失效后的重放
+        :param backoff: 第一次重试前等待的时间，之后每次翻倍，单位秒
+        :param max_backoff: 等待时间的上限，单位秒
+        :param jitter: 随机减少等待时间的比例，0 表示不加抖动
+        :param token_errcodes: 表示 access_token 无效的错误码
+        :param transient_errcodes: 可以重试的错误码
+        :param retry_connection_errors: 连接失败时是否重试
+        """
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.token_errcodes = frozenset(token_errcodes)
+        self.transient_errcodes = frozenset(transient_errcodes)
+        self.retry_connection_errors = retry_connection_errors
+
+    def backoff_time(self, attempt):
+        """第 attempt 次（从 0 开始）重试前等待的时间"""
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return delay * (1 - self.jitter * random.random())
+
+
+NO_RETRY = RetryPolicy(max_retries=0, token_errcodes=(), retry_connection_errors=False)
+
+
+def get_endpoint(url):
+    return urlparse(url).path
+
+
+def match_policy(policies, default, url):
+    """
+    按接口路径的最长前缀匹配重试策略
+    :param policies: {路径前缀: RetryPolicy}，例如 {'/cgi-bin/message/send': RetryPolicy(max_retries=1)}
+    """
+    if policies:
+        path = get_endpoint(url)
+        prefixes = [prefix for prefix in policies if path.startswith(prefix)]
+        if prefixes:
+            return policies[max(prefixes, key=len)]
+    return default
+
+
+def get_url_token(url):
+    match = _token_pattern.search(url)
+    return match.group(2) if match else None
+
+
+def replace_url_token(url, access_token):
+    return _token_pattern.sub(lambda m: m.group(1) + access_token, url, count=1)
@@ -1,25 +1,114 @@
+import time
 import requests
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
 from .ierror import APIValueError
+from .jsonstream import iter_json_array, decode_response
+from .retry import get_endpoint, get_url_token, replace_url_token
+from .transport import get_default_transport
 
 
-__all__ = ['get', 'post']
+__all__ = ['get', 'post', 'stream']
 
 
-def get(url):
-    data = requests.get(url).json()
-    try:
-        if data['errcode'] != 0:
-            raise APIValueError(data)
-    except KeyError:
-        raise APIValueError(data)
-    return data
+JSON_HEADERS = {'Content-Type': 'application/json; charset=utf-8'}
+
+
+def get(url, transport=None, api=None, scope=None):
+    """
+    :param transport: 传输层，默认使用进程内共享的连接池
+    :param api: 提供 access_token 与 invalidate_access_token() 的对象，access_token 失效时用于刷新并重放请求
+    :param scope: 限流使用的 (corp_id, agent_id)，默认取 api 的 corp_id 与 agent_id
+    """
+    return request('GET', url, transport, api, scope)
+
+
+def post(url, data, transport=None, api=None, scope=None):
+    """data 为 bytes 时视为已经序列化的 json，直接作为请求体发送"""
+    if isinstance(data, bytes):
+        return request('POST', url, transport, api, scope, data=data, headers=JSON_HEADERS)
+    return request('POST', url, transport, api, scope, json=data)
+
+
+def stream(url, key, transport=None, api=None, scope=None, chunk_size=64 * 1024):
+    """
+    GET 请求，边读取响应边解析，逐个返回响应中 key 数组的元素，不把整个响应解析为一个 list。
+    参数同 get，重试与 access_token 失效时的重放在返回第一个元素之前完成
+    """
+    def decode(response):
+        fields, items = iter_json_array(response.iter_content(chunk_size), key)
+        # errcode 在数组之后时迭代结束才能确定，先视为成功
+        fields.setdefault('errcode', 0)
+        fields[key] = _stream_items(response, fields, items)
+        return fields
+    return request('GET', url, transport, api, scope, decode=decode, stream=True)[key]
 
 
-def post(url, data):
-    data = requests.post(url, json=data).json()
+def _stream_items(response, fields, items):
     try:
-        if data['errcode'] != 0:
-            raise APIValueError(data)
-    except KeyError:
+        yield from items
+    finally:
+        response.close()
+    if fields.get('errcode') != 0:
+        raise APIValueError(fields)
+
+
+def get_scope(api, scope=None):
+    if scope is None:
+        scope = getattr(api, 'corp_id', None), getattr(api, 'agent_id', None)
+    return scope
+
+
+def _connect_failed(e):
+    """建立连接失败（连接超时、连接被拒绝、域名解析失败），请求没有发出"""
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    reason = getattr(e.args[0], 'reason', None) if e.args else None
+    return isinstance(reason, (ConnectTimeoutError, NewConnectionError))
+
+
+def request(method, url, transport=None, api=None, scope=None, decode=None, **kwargs):
+    """:param decode: 把响应转换为 dict 的函数，默认为 decode_response"""
+    transport = transport or get_default_transport()
+    policy = transport.get_retry_policy(url)
+    metrics = transport.metrics
+    limiter = transport.rate_limiter
+    endpoint = get_endpoint(url)
+    scope = get_scope(api, scope)
+    attempt = 0
+    token_replayed = False
+    while True:
+        if limiter is not None and limiter.acquire(*scope, endpoint) > 0:
+            metrics.incr('ratelimit_wait', endpoint=endpoint)
+        metrics.incr('request', endpoint=endpoint)
+        try:
+            response = transport.request(method, url, **kwargs)
+            data = decode_response(response) if decode is None else decode(response)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            # POST 只在建立连接失败时重试，避免重复发送
+            if method == 'POST' and not _connect_failed(e):
+                raise
+            if not policy.retry_connection_errors or attempt >= policy.max_retries:
+                metrics.incr('error', endpoint=endpoint, reason='connection')
+                raise
+            metrics.incr('retry', endpoint=endpoint, reason='connection')
+            time.sleep(policy.backoff_time(attempt))
+            attempt += 1
+            continue
+
+        errcode = data.get('errcode')
+        if errcode == 0:
+            return data
+        if errcode in policy.token_errcodes and api is not None and not token_replayed:
+            # access_token 被提前吊销或过期，刷新后重放一次
+            token_replayed = True
+            metrics.incr('retry', endpoint=endpoint, reason='token', errcode=errcode)
+            api.invalidate_access_token(get_url_token(url))
+            url = replace_url_token(url, api.access_token)
+            continue
+        if errcode in policy.transient_errcodes and attempt < policy.max_retries:
+            metrics.incr('retry', endpoint=endpoint, reason='errcode', errcode=errcode)
+            time.sleep(policy.backoff_time(attempt))
+            attempt += 1
+            continue
+        metrics.incr('error', endpoint=endpoint, reason='errcode', errcode=errcode)
         raise APIValueError(data)
-    return data
\ No newline at end of file
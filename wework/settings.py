@@ -1,6 +1,9 @@
+from .cache import create_cache
 from .helpers import BaseHelper
 from .wechat import WorkWechatApi
 from .ierror import InitError
+from .lease import create_token_lease
+from .transport import create_transport
 
 
 class Settings(object):
@@ -35,3 +38,12 @@ def check(settings):
 
     if not issubclass(settings['HELPER'], BaseHelper):
         raise InitError('Helper 必须继承至 helper.BaseHelper')
+
+    if 'CACHE' in settings:
+        # 不修改原有的 Helper，生成一个使用指定缓存后端的子类
+        cache = create_cache(settings['CACHE'], settings.get('CACHE_OPTIONS'))
+        helper = settings['HELPER']
+        settings['HELPER'] = type(helper.__name__, (helper, ), {'cache': cache})
+
+    settings['TRANSPORT'] = create_transport(settings.get('TRANSPORT'))
+    settings['TOKEN_LEASE'] = create_token_lease(settings.get('TOKEN_LEASE'))
@@ -0,0 +1,73 @@
+import asyncio
+import functools
+import threading
+
+
+__all__ = ['SingleFlight', 'AsyncSingleFlight']
+
+
+class _Call(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    对同一个 key 的并发调用进行合并：只有第一个调用者真正执行 fn，
+    其余调用者等待其完成并共享同一个结果，fn 抛出的异常也会传递给所有等待者。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+
+class AsyncSingleFlight(object):
+    """
+    SingleFlight 的协程版本，同一个事件循环内对同一个 key 的并发调用只会执行一次 coro_fn。
+    coro_fn 在单独的 task 中执行，某个调用者被取消时只有它自己收到 CancelledError，
+    其余调用者继续等待同一个结果。
+    """
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, coro_fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        key = id(loop), key
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = loop.create_task(coro_fn(*args, **kwargs))
+            task.add_done_callback(functools.partial(self._done, key))
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # 所有调用者都已被取消时没有人读取异常，避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,268 @@
+import logging
+import threading
+import time
+import xml.etree.ElementTree as ET
+from .ierror import APIValueError
+
+
+__all__ = ['DirectorySync', 'parse_event']
+
+
+logger = logging.getLogger(__name__)
+
+
+# 成员、部门、标签不存在时的错误码
+USER_NOT_FOUND = 60111
+DEPARTMENT_NOT_FOUND = 60123
+TAG_NOT_FOUND = 40068
+
+
+def parse_event(xml):
+    """
+    把解密后的回调 XML 转换为 dict。
+    parse_xml 只解析 CDATA 中的值，change_contact 事件的 CreateTime、Id 等字段不在 CDATA 中
+    """
+    if isinstance(xml, bytes):
+        xml = xml.decode('utf-8')
+    return {child.tag: child.text or '' for child in ET.fromstring(xml)}
+
+
+def _errcode(e):
+    data = e.args[0] if e.args else None
+    return data.get('errcode') if isinstance(data, dict) else None
+
+
+class DirectorySync(object):
+    """
+    根据 change_contact 回调事件增量更新 DirectoryIndex，只拉取变更的成员、部门或标签，
+    并定期全量拉取一次进行校正。
+
+    每个成员、部门、标签记录最后一次应用的事件的 CreateTime，
+    时间更早的事件（乱序到达）会被忽略，同一个事件重复推送时再应用一次结果不变。
+
+        sync = DirectorySync(DirectoryIndex(api))
+        sync.start()
+        ...
+        # 回调中，xml 为 WXBizMsgCrypt.DecryptMsg 解密后的内容
+        sync.handle(parse_event(xml))
+    """
+    def __init__(self, index, reconcile_interval=24 * 3600, skew=60):
+        """
+        :param index: DirectoryIndex
+        :param reconcile_interval: 全量校正的间隔，单位秒
+        :param skew: 允许的本地与企业微信服务器的时钟偏差，单位秒。
+            全量拉取开始前 skew 秒之前的事件已经包含在全量结果中，不再应用
+        """
+        self.index = index
+        self.api = index.api
+        self.reconcile_interval = reconcile_interval
+        self.skew = skew
+        self.departments = {}
+        self.users = {}
+        self.tags = {}
+        # (类型, id) -> 最后一次应用的事件时间，删除后仍然保留，用于忽略迟到的旧事件
+        self.versions = {}
+        self.floor = 0
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _store(self, kind):
+        return {'user': self.users, 'department': self.departments, 'tag': self.tags}[kind]
+
+    def _stale(self, kind, id, version):
+        """事件比已应用的版本旧"""
+        return version < self.floor or version < self.versions.get((kind, id), 0)
+
+    def _accept(self, kind, id, version):
+        """事件比已应用的版本新时记录版本并返回 True，需要持有 _lock"""
+        if self._stale(kind, id, version):
+            return False
+        self.versions[(kind, id)] = version
+        return True
+
+    def apply(self, event):
+        """
+        应用一个 change_contact 事件，不更新 index，需要随后调用 publish()。
+        拉取变更的成员、部门、标签时不持有锁，拉取完成后再检查版本并替换，
+        期间应用了更新的事件时丢弃本次的结果
+        :param event: parse_event 的返回值
+        :return: 事件是否被应用，不是 change_contact 事件或者已经过期时返回 False
+        """
+        if event.get('Event') != 'change_contact':
+            return False
+        # 先使 response_cache 中受影响的接口失效，随后拉取的部门、标签不会读到旧的缓存
+        response_cache = getattr(self.api, 'response_cache', None)
+        if response_cache is not None:
+            response_cache.invalidate_event(self.api.corp_id, event)
+        change_type = event.get('ChangeType')
+        version = int(event.get('CreateTime') or 0)
+        if change_type in ('create_user', 'update_user'):
+            userid = event['UserID']
+            new_userid = event.get('NewUserID') or userid
+            with self._lock:
+                if self._stale('user', new_userid, version):
+                    return False
+            user = self._fetch_user(new_userid)
+            with self._lock:
+                if new_userid != userid and self._accept('user', userid, version):
+                    # 成员的 UserID 被修改，旧的 UserID 视为删除
+                    self._remove_user(userid, new_userid)
+                if not self._accept('user', new_userid, version):
+                    return False
+                if user is None:
+                    self._remove_user(new_userid)
+                else:
+                    self.users[new_userid] = user
+        elif change_type == 'delete_user':
+            with self._lock:
+                if not self._accept('user', event['UserID'], version):
+                    return False
+                self._remove_user(event['UserID'])
+        elif change_type in ('create_party', 'update_party', 'delete_party'):
+            id = int(event['Id'])
+            with self._lock:
+                if self._stale('department', id, version):
+                    return False
+            department = None if change_type == 'delete_party' else self._fetch_department(id)
+            with self._lock:
+                if not self._accept('department', id, version):
+                    return False
+                if department is None:
+                    self.departments.pop(id, None)
+                else:
+                    self.departments[id] = department
+        elif change_type == 'update_tag':
+            id = int(event['TagId'])
+            with self._lock:
+                if self._stale('tag', id, version):
+                    return False
+                tag = self.tags.get(id)
+            tag = self._fetch_tag(id, tag)
+            with self._lock:
+                if not self._accept('tag', id, version):
+                    return False
+                if tag is None:
+                    self.tags.pop(id, None)
+                else:
+                    self.tags[id] = tag
+        else:
+            return False
+        return True
+
+    def _remove_user(self, userid, new_userid=None):
+        """删除成员，并从标签的成员列表中移除；new_userid 不为 None 时表示 UserID 被修改，标签中替换为新的 UserID"""
+        self.users.pop(userid, None)
+        for id, tag in list(self.tags.items()):
+            userlist = tag.get('userlist') or ()
+            if userid not in userlist:
+                continue
+            if new_userid is None:
+                userlist = [u for u in userlist if u != userid]
+            else:
+                userlist = list(dict.fromkeys(new_userid if u == userid else u for u in userlist))
+            self.tags[id] = dict(tag, userlist=userlist)
+        cache = getattr(self.api, 'user_cache', None)
+        if cache is not None:
+            cache.delete(self.api.corp_id, userid)
+
+    def _fetch_user(self, userid):
+        """返回成员详情，成员不存在时返回 None"""
+        try:
+            # 不使用 user_cache 中的旧数据，同时更新缓存
+            user = self.api.get_user_detail(userid, max_age=0)
+        except APIValueError as e:
+            if _errcode(e) != USER_NOT_FOUND:
+                raise
+            return None
+        return {k: v for k, v in user.items() if k not in ('errcode', 'errmsg')}
+
+    def _fetch_department(self, id):
+        """返回部门，部门不存在时返回 None"""
+        try:
+            departments = self.api.get_department_list(id)
+        except APIValueError as e:
+            if _errcode(e) != DEPARTMENT_NOT_FOUND:
+                raise
+            departments = []
+        return next((d for d in departments if d['id'] == id), None)
+
+    def _fetch_tag(self, id, tag=None):
+        """返回包含 userlist 的标签，标签不存在时返回 None"""
+        try:
+            users = self.api.get_tag_user_list(id)
+        except APIValueError as e:
+            if _errcode(e) != TAG_NOT_FOUND:
+                raise
+            return None
+        if tag is None:
+            # 新的标签，从标签列表中获取名称
+            tag = next((t for t in self.api.get_tag_list() if t['tagid'] == id), {'tagid': id})
+        return dict(tag, userlist=[u['userid'] for u in users])
+
+    def publish(self):
+        """用当前的数据建立新的快照并替换 index 的快照"""
+        with self._lock:
+            snapshot = self.index.create_snapshot(list(self.departments.values()), list(self.users.values()),
+                                                  list(self.tags.values()))
+        self.index.load(snapshot)
+        return snapshot
+
+    def handle(self, *events):
+        """应用事件，有事件被应用时更新 index"""
+        applied = [self.apply(event) for event in events]
+        if any(applied):
+            self.publish()
+        return applied
+
+    def reconcile(self):
+        """
+        全量拉取并替换当前数据。拉取期间应用过的事件可能比全量结果更新，这些成员、部门、标签保留当前的数据
+        """
+        started = int(time.time()) - self.skew
+        snapshot = self.index.fetch()
+        with self._lock:
+            fetched = {'user': snapshot.users, 'department': snapshot.departments, 'tag': snapshot.tags}
+            for kind, items in fetched.items():
+                current = self._store(kind)
+                merged = dict(items)
+                for (k, id), version in self.versions.items():
+                    if k == kind and version >= started:
+                        if id in current:
+                            merged[id] = current[id]
+                        else:
+                            merged.pop(id, None)
+                current.clear()
+                current.update(merged)
+            self.floor = started
+            self.versions = {key: version for key, version in self.versions.items() if version >= started}
+        return self.publish()
+
+    def start(self):
+        """启动后台线程，立即全量拉取一次，之后每隔 reconcile_interval 秒校正一次"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='wework-directory-sync', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.reconcile()
+            except Exception:
+                logger.exception('全量拉取通讯录失败')
+            self._stop.wait(self.reconcile_interval)
@@ -0,0 +1,106 @@
+import json
+from .ierror import SendMsgError
+from .validators import validate, get_field_limit
+
+
+__all__ = ['MessageTemplate']
+
+
+_RECIPIENTS = 'touser', 'toparty', 'totag'
+
+
+def _placeholder(index):
+    return '\x00wework_field_{}\x00'.format(index)
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+class MessageTemplate(object):
+    """
+    预先序列化的消息，用于大量发送内容相似的消息。
+    msg 中不变的部分在创建时完成校验与序列化，render 时只序列化接收者与 fields 中的字段并拼接，
+    fields 中的字段在 render 时检查长度限制。
+
+        template = MessageTemplate('textcard', {'title': '审批通知', 'url': url}, agent_id, fields=['description'])
+        body = template.render(touser='UserID1', description='...')
+    """
+    def __init__(self, type, msg, agent_id, safe=0, fields=()):
+        """
+        :param type: 消息类型
+        :param msg: 消息内容，fields 中的字段可以省略
+        :param agent_id: 企业应用的id
+        :param fields: 每次发送时变化的字段，可以是 msg 中的 key 组成的列表，
+            也可以是 {名称: 路径}，路径用 . 分隔，例如 {'title': 'articles.0.title'}
+        """
+        if not isinstance(fields, dict):
+            fields = {name: name for name in fields}
+        self.type = type
+        self.agent_id = agent_id
+        self.safe = safe
+        self.fields = fields
+
+        names = list(_RECIPIENTS) + list(fields)
+        placeholders = {name: _placeholder(i) for i, name in enumerate(names)}
+        msg = json.loads(json.dumps(msg))
+        for name, path in fields.items():
+            self._set(msg, path, placeholders[name])
+        validate(type, msg)
+        self._limits = {name: get_field_limit(type, path) for name, path in fields.items()}
+
+        body = _dumps({
+            'touser': placeholders['touser'],
+            'toparty': placeholders['toparty'],
+            'totag': placeholders['totag'],
+            'msgtype': type,
+            type: msg,
+            'agentid': agent_id,
+            'safe': safe,
+        })
+        # 按占位符把 json 切分成不变的片段，render 时在片段之间插入字段的值
+        self._names = []
+        self._segments = []
+        quoted = {name: _dumps(placeholder) for name, placeholder in placeholders.items()}
+        positions = sorted((body.index(quoted[name]), name) for name in names)
+        start = 0
+        for position, name in positions:
+            self._segments.append(body[start:position].encode('utf-8'))
+            self._names.append(name)
+            start = position + len(quoted[name])
+        self._segments.append(body[start:].encode('utf-8'))
+
+    @staticmethod
+    def _set(msg, path, value):
+        keys = [int(key) if key.isdigit() else key for key in path.split('.')]
+        for key in keys[:-1]:
+            msg = msg[key]
+        msg[keys[-1]] = value
+
+    def render(self, touser=None, toparty=None, totag=None, **values):
+        """
+        返回 message/send 接口的请求体，utf-8 编码的 json
+        :param touser: 成员ID列表，可以是字符串或列表，同 MSG.touser
+        :param values: fields 中各字段的值
+        """
+        recipients = {'touser': touser, 'toparty': toparty, 'totag': totag}
+        if not (touser or toparty or totag):
+            raise SendMsgError('toparty、touser、totag不能同时为空')
+        parts = [self._segments[0]]
+        for name, segment in zip(self._names, self._segments[1:]):
+            if name in recipients:
+                value = recipients[name]
+                if value is not None and not isinstance(value, str):
+                    value = '|'.join(str(v) for v in value)
+            else:
+                try:
+                    value = values[name]
+                except KeyError:
+                    raise SendMsgError(f'缺少参数 {name}')
+                limit = self._limits[name]
+                if limit is not None:
+                    check, limit = limit
+                    check(name, value, limit)
+            parts.append(_dumps(value).encode('utf-8'))
+            parts.append(segment)
+        return b''.join(parts)
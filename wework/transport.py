@@ -0,0 +1,93 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from .metrics import Metrics
+from .retry import RetryPolicy, match_policy
+
+
+__all__ = ['Transport', 'get_default_transport', 'set_default_transport', 'create_transport']
+
+
+class Transport(object):
+    """
+    基于连接池的 HTTP 传输层。
+    所有的 api 调用共用同一个 requests.Session，连接会被保持（keep-alive）并复用，
+    避免每次调用都重新建立 TCP + TLS 连接。
+    """
+    def __init__(self, pool_connections=10, pool_maxsize=10, connect_timeout=5, read_timeout=30,
+                 max_retries=0, session=None, retry_policy=None, retry_policies=None, metrics=None,
+                 rate_limiter=None, coalescer=None):
+        """
+        :param pool_connections: 缓存的连接池数量（每个 host 一个连接池）
+        :param pool_maxsize: 每个 host 连接池中保持的最大连接数
+        :param connect_timeout: 建立连接的超时时间，单位秒
+        :param read_timeout: 读取响应的超时时间，单位秒
+        :param max_retries: 连接失败时 urllib3 层面的重试次数
+        :param session: 自定义的 requests.Session，传入时忽略连接池参数
+        :param retry_policy: 默认的 RetryPolicy，传入 retry.NO_RETRY 关闭重试
+        :param retry_policies: 按接口路径前缀配置的 RetryPolicy，例如 {'/cgi-bin/message/send': RetryPolicy(max_retries=1)}
+        :param metrics: Metrics，统计请求与重试次数
+        :param rate_limiter: RateLimiter，请求发出前按企业、应用、接口族限流
+        :param coalescer: SendCoalescer，合并短时间内发送给不同成员的相同消息
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.retry_policies = retry_policies or {}
+        self.metrics = metrics or Metrics()
+        self.rate_limiter = rate_limiter
+        self.coalescer = coalescer
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_connections,
+                                  pool_maxsize=pool_maxsize,
+                                  max_retries=max_retries)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+
+    def get_retry_policy(self, url):
+        return match_policy(self.retry_policies, self.retry_policy, url)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_default_transport = None
+_default_lock = threading.Lock()
+
+
+def get_default_transport():
+    """获取进程内共享的默认传输层，首次调用时创建"""
+    global _default_transport
+    if _default_transport is None:
+        with _default_lock:
+            if _default_transport is None:
+                _default_transport = Transport()
+    return _default_transport
+
+
+def set_default_transport(transport):
+    global _default_transport
+    with _default_lock:
+        _default_transport = create_transport(transport) if transport is not None else None
+
+
+def create_transport(value=None):
+    """
+    :param value: None 表示使用默认传输层；dict 表示 Transport 的构造参数；也可以直接传入 Transport 实例
+    """
+    if value is None:
+        return get_default_transport()
+    if isinstance(value, dict):
+        return Transport(**value)
+    return value
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .cache import MemoryCache, create_cache
+
+
+__all__ = ['UserCache', 'UserResult', 'get_users', 'get_users_async']
+
+
+class UserCache(object):
+    """
+    以 (企业, userid) 为 key 缓存 get_user_detail 的结果，同时记录获取的时间，
+    读取时可以用 max_age 要求更新的数据。
+    """
+    def __init__(self, cache=None, ttl=600, maxsize=10000, prefix='wework_user_'):
+        """
+        :param cache: 缓存后端，BaseCache 的实例或 create_cache 支持的名称，默认为进程内的 LRU 缓存
+        :param ttl: 缓存的有效期，单位秒
+        :param maxsize: 默认的进程内缓存最多保存的成员数量
+        """
+        self.cache = MemoryCache(maxsize) if cache is None else create_cache(cache)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, corp_id, userid):
+        return '{}{}_{}'.format(self.prefix, corp_id, userid)
+
+    @staticmethod
+    def _fresh(value, max_age):
+        return value is not None and (max_age is None or time.time() - value['time'] <= max_age)
+
+    def get(self, corp_id, userid, max_age=None):
+        """
+        :param max_age: 只返回不超过 max_age 秒之前获取的数据，None 表示只要在缓存中就返回
+        """
+        value = self.cache.get(self._key(corp_id, userid))
+        return value['user'] if self._fresh(value, max_age) else None
+
+    def get_many(self, corp_id, userids, max_age=None):
+        """返回 {userid: user}，不在缓存中或者过旧的成员不在返回值中"""
+        keys = {self._key(corp_id, userid): userid for userid in userids}
+        values = self.cache.get_many(list(keys))
+        return {keys[key]: value['user'] for key, value in values.items() if self._fresh(value, max_age)}
+
+    def set(self, corp_id, userid, user):
+        self.cache.set(self._key(corp_id, userid), {'user': user, 'time': time.time()}, self.ttl)
+
+    def set_many(self, corp_id, users):
+        """:param users: {userid: user}"""
+        now = time.time()
+        self.cache.set_many({self._key(corp_id, userid): {'user': user, 'time': now}
+                             for userid, user in users.items()}, self.ttl)
+
+    def delete(self, corp_id, userid):
+        self.cache.delete(self._key(corp_id, userid))
+
+
+class UserResult(object):
+    """单个成员的查询结果，失败时 error 为抛出的异常"""
+    def __init__(self, userid, user=None, error=None, cached=False):
+        self.userid = userid
+        self.user = user
+        self.error = error
+        self.cached = cached
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return '<UserResult {} {}>'.format(self.userid, 'ok' if self.ok else repr(self.error))
+
+
+def _prepare(api, user_ids, max_age):
+    """去重后先从缓存中读取，返回 (结果, 需要请求的 userid)"""
+    unique = list(dict.fromkeys(user_ids))
+    results = {}
+    cache = api.user_cache
+    if cache is not None and max_age != 0:
+        for userid, user in cache.get_many(api.corp_id, unique, max_age).items():
+            results[userid] = UserResult(userid, user, cached=True)
+    return results, [userid for userid in unique if userid not in results]
+
+
+def _finish(api, user_ids, results):
+    cache = api.user_cache
+    if cache is not None:
+        fetched = {r.userid: r.user for r in results.values() if r.ok and not r.cached}
+        if fetched:
+            cache.set_many(api.corp_id, fetched)
+    return [results[userid] for userid in user_ids]
+
+
+def get_users(api, user_ids, max_workers=8, max_age=None):
+    """WorkWechatCorpAPI.get_users 的实现，在线程池中请求缓存中没有的成员"""
+    user_ids = list(user_ids)
+    results, misses = _prepare(api, user_ids, max_age)
+    lock = threading.Lock()
+
+    def fetch(userid):
+        try:
+            result = UserResult(userid, api._fetch_user_detail(userid))
+        except Exception as e:
+            result = UserResult(userid, error=e)
+        with lock:
+            results[userid] = result
+
+    if misses:
+        with ThreadPoolExecutor(min(max_workers, len(misses))) as executor:
+            list(executor.map(fetch, misses))
+    return _finish(api, user_ids, results)
+
+
+async def get_users_async(api, user_ids, max_workers=8, max_age=None):
+    """AsyncCorpAPI.get_users 的实现，同时最多有 max_workers 个请求"""
+    user_ids = list(user_ids)
+    results, misses = _prepare(api, user_ids, max_age)
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def fetch(userid):
+        async with semaphore:
+            try:
+                results[userid] = UserResult(userid, await api._fetch_user_detail(userid))
+            except Exception as e:
+                results[userid] = UserResult(userid, error=e)
+
+    await asyncio.gather(*(fetch(userid) for userid in misses))
+    return _finish(api, user_ids, results)
@@ -0,0 +1,157 @@
+from .ierror import SendMsgError
+
+
+__all__ = ['MSG_SPECS', 'validate', 'validate_field', 'get_field_limit']
+
+
+# 各消息类型的必需参数与长度限制，https://work.weixin.qq.com/api/doc#90000/90135/90236
+# required 为必需参数；bytes 为 utf-8 编码后的字节数上限；chars 为字符数上限；
+# articles 为图文消息中每篇文章的规则，max_articles 为文章数量上限
+MSG_SPECS = {
+    'text': {
+        # 消息内容，最长不超过2048个字节
+        'required': ('content', ),
+        'bytes': {'content': 2048},
+    },
+    'image': {
+        # 图片媒体文件id，可以调用上传临时素材接口获取
+        'required': ('media_id', ),
+    },
+    'voice': {
+        'required': ('media_id', ),
+    },
+    'video': {
+        # 标题不超过128个字节，描述不超过512个字节
+        'required': ('media_id', ),
+        'bytes': {'title': 128, 'description': 512},
+    },
+    'file': {
+        'required': ('media_id', ),
+    },
+    'textcard': {
+        # 按钮文字默认为“详情”，不超过4个文字
+        'required': ('title', 'description', 'url'),
+        'bytes': {'title': 128, 'description': 512, 'url': 2048},
+        'chars': {'btntxt': 4},
+    },
+    'markdown': {
+        # markdown内容，最长不超过2048个字节，必须是utf8编码
+        'required': ('content', ),
+        'bytes': {'content': 2048},
+    },
+    'miniprogram_notice': {
+        # 消息标题、描述长度限制4-12个汉字，content_item 最多允许10个
+        'required': ('appid', 'title'),
+        'chars': {'title': 12, 'description': 12},
+        'max_items': {'content_item': 10},
+    },
+    'news': {
+        # 图文消息，1到8条图文
+        'required': ('articles', ),
+        'max_articles': 8,
+        'articles': {
+            'required': ('title', 'url'),
+            'bytes': {'title': 128, 'description': 512, 'url': 2048, 'picurl': 2048},
+        },
+    },
+    'mpnews': {
+        # 图文内容存储在企业微信，content 支持html标签，不超过666 K个字节
+        'required': ('articles', ),
+        'max_articles': 8,
+        'articles': {
+            'required': ('title', 'thumb_media_id', 'content'),
+            'bytes': {'title': 128, 'content': 666 * 1024, 'author': 64, 'digest': 512},
+        },
+    },
+}
+
+
+def _check_bytes(name, value, limit):
+    # 每个字符编码后最多4个字节，短字符串不需要编码
+    if isinstance(value, str) and len(value) * 4 > limit and len(value.encode('utf-8')) > limit:
+        raise SendMsgError(f'{name} 不能超过 {limit} 个字节')
+
+
+def _check_chars(name, value, limit):
+    if isinstance(value, str) and len(value) > limit:
+        raise SendMsgError(f'{name} 不能超过 {limit} 个字')
+
+
+def _compile_fields(type, spec, prefix=''):
+    required = spec.get('required', ())
+    checks = []
+    for name, limit in spec.get('bytes', {}).items():
+        checks.append((name, _check_bytes, limit))
+    for name, limit in spec.get('chars', {}).items():
+        checks.append((name, _check_chars, limit))
+
+    def validate_fields(msg):
+        for param in required:
+            if param not in msg:
+                if prefix:
+                    raise SendMsgError(f'msg 中缺少参数 {param}')
+                raise SendMsgError(f'type 为 {type} 的msg 中缺少参数 {param}')
+        for name, check, limit in checks:
+            if name in msg:
+                check(prefix + name, msg[name], limit)
+    return validate_fields
+
+
+def _compile(type, spec):
+    validate_fields = _compile_fields(type, spec)
+    max_items = spec.get('max_items', {})
+    article_spec = spec.get('articles')
+    if article_spec is None:
+        validate_article = None
+    else:
+        validate_article = _compile_fields(type, article_spec, 'articles.')
+        max_articles = spec['max_articles']
+
+    def validate(msg):
+        validate_fields(msg)
+        for name, limit in max_items.items():
+            if len(msg.get(name) or ()) > limit:
+                raise SendMsgError(f'{name} 最多允许 {limit} 个')
+        if validate_article is not None:
+            articles = msg['articles']
+            if not 0 < len(articles) <= max_articles:
+                raise SendMsgError(f'articles 应包含 1 到 {max_articles} 条图文')
+            for article in articles:
+                validate_article(article)
+    return validate
+
+
+_validators = {type: _compile(type, spec) for type, spec in MSG_SPECS.items()}
+
+
+def validate(type, msg):
+    """校验 msg 中的必需参数与长度限制，不合法时抛出 SendMsgError"""
+    try:
+        validator = _validators[type]
+    except KeyError:
+        raise SendMsgError(f'不支持的消息类型 {type}')
+    validator(msg)
+
+
+def get_field_limit(type, path):
+    """
+    返回字段的长度检查函数，没有限制时返回 None
+    :param path: msg 中的字段路径，例如 content、articles.0.title
+    """
+    spec = MSG_SPECS[type]
+    name = path.split('.')[-1]
+    if path.startswith('articles.'):
+        spec = spec.get('articles', {})
+    if name in spec.get('bytes', {}):
+        return _check_bytes, spec['bytes'][name]
+    if name in spec.get('chars', {}):
+        return _check_chars, spec['chars'][name]
+    return None
+
+
+def validate_field(type, path, value):
+    """校验单个字段的长度限制"""
+    limit = get_field_limit(type, path)
+    if limit is not None:
+        check, limit = limit
+        check(path, value, limit)
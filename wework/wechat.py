@@ -1,12 +1,14 @@
 import json
 import time
-import requests
 from .ierror import (
     InitError,
     GetAccessTokenError,
     SuiteTicketError,
 )
 from .base import BaseWechatAPI
+from .corp import WorkWechatCorpAPI
+from .refresher import TokenRefresher
+from .transport import create_transport
 import wework.rq as rq
 
 
@@ -52,32 +54,70 @@ class WorkWechatApi(object):
     def set_suite_ticket(self, value):
         self.suite_api.suite_ticket = value
 
+    def start_token_refresher(self, *apis, **kwargs):
+        """
+        启动后台刷新 access_token 的线程，已配置的 suite_api、provider_api 会被自动注册。
+        :param apis: 额外需要刷新的api，例如 suite_api.get_corp_api() 返回的授权企业api
+        :param kwargs: TokenRefresher 的构造参数
+        :return: TokenRefresher，进程退出时调用其 stop()
+        """
+        refresher = self._create_token_refresher(**kwargs)
+        for api in self._get_refresh_apis() + list(apis):
+            refresher.add(api)
+        refresher.start()
+        return refresher
+
+    def _create_token_refresher(self, **kwargs):
+        return TokenRefresher(**kwargs)
+
+    def _get_refresh_apis(self):
+        apis = []
+        data = self.settings.data
+        if 'SUITE_ID' in data and 'SUITE_SECRET' in data:
+            apis.append(self.suite_api)
+        if 'CROP_ID' in data and 'PROVIDER_SECRET' in data:
+            apis.append(self.provider_api)
+        return apis
+
 
 class WorkWechatSuiteApi(BaseWechatAPI):
     """第三方应用api"""
     def __init__(self, settings, wechat_api):
         self.wechat_api = wechat_api
         self.settings = settings
+        self.transport = create_transport(settings.data.get('TRANSPORT'))
         self._global_access_token = {'name': ('suite_access_token', 'suite_expires_time')}
         self._auth_code = {}
 
     @property
     def suite_ticket(self):
         helper = self.settings.HELPER
-        ticket = helper.cache_get('wework_suite_ticket')
+        l1 = self._l1_cache
+        ticket = l1.get((helper, 'wework_suite_ticket')) if l1 else None
         if ticket is None:
-            raise SuiteTicketError('suite ticket 为空')
+            ticket = helper.cache_get('wework_suite_ticket')
+            if ticket is None:
+                raise SuiteTicketError('suite ticket 为空')
+            self.__set_l1_suite_ticket(ticket)
         return ticket
 
     @suite_ticket.setter
     def suite_ticket(self, value):
         helper = self.settings.HELPER
         helper.cache_set('wework_suite_ticket', value)
+        self.__set_l1_suite_ticket(value)
+
+    def __set_l1_suite_ticket(self, ticket):
+        # suite_ticket 每十分钟推送一次，有效期三十分钟，其它进程更新后最多 SUITE_TICKET_L1_TTL 秒内可见
+        l1 = self._l1_cache
+        if l1:
+            ttl = self.settings.data.get('SUITE_TICKET_L1_TTL', 60)
+            l1.set((self.settings.HELPER, 'wework_suite_ticket'), ticket, time.time() + ttl, margin=0)
 
     def _get_access_token(self):
         """获取第三方应用凭证"""
         url = 'https://qyapi.weixin.qq.com/cgi-bin/service/get_suite_token'
-        data = requests.post(url, json={
+        data = self.transport.post(url, json={
             'suite_id': self.settings.SUITE_ID,
             'suite_secret': self.settings.SUITE_SECRET,
             'suite_ticket': self.suite_ticket,
@@ -154,7 +194,7 @@ class WorkWechatSuiteApi(BaseWechatAPI):
             'session_info': {
                 'auth_type': 1 if test else 0
             }
-        })
+        }, self.transport, self)
         return pre_auth_code
 
     @pre_auth_code.setter
@@ -164,7 +204,7 @@ class WorkWechatSuiteApi(BaseWechatAPI):
     def _get_pre_auth_code(self):
         url = 'https://qyapi.weixin.qq.com/cgi-bin/service/get_pre_auth_code?suite_access_token={}'.format(
             self.access_token)
-        data = rq.get(url)
+        data = rq.get(url, self.transport, self)
         self._auth_code['pre_auth_code'] = data['pre_auth_code']
         self._auth_code['expires_time'] = data['expires_in'] + int(time.time())
 
@@ -173,7 +213,7 @@ class WorkWechatSuiteApi(BaseWechatAPI):
         url = 'https://qyapi.weixin.qq.com/cgi-bin/service/getuserinfo3rd?access_token={}&code={}'.format(
             self.access_token, code
         )
-        return rq.get(url)['user_ticket']
+        return rq.get(url, self.transport, self)['user_ticket']
 
     def get_user_info(self, code):
         """
@@ -188,7 +228,7 @@ class WorkWechatSuiteApi(BaseWechatAPI):
         """
         user_ticket = self._get_user_ticket(code)
         url = 'https://qyapi.weixin.qq.com/cgi-bin/service/getuserdetail3rd?access_token={}'.format(self.access_token)
-        data = rq.post(url, {'user_ticket': user_ticket})
+        data = rq.post(url, {'user_ticket': user_ticket}, self.transport, self)
         del data['errcode']
         del data['errmsg']
         return WechatUser(data)
@@ -232,21 +272,40 @@ class WorkWechatSuiteApi(BaseWechatAPI):
         url = 'https://qyapi.weixin.qq.com/cgi-bin/service/get_permanent_code?suite_access_token={}'.format(
             self.access_token
         )
-        return requests.post(url, json={
+        return self.transport.post(url, json={
             'auth_code': auth_code
         }).json()
 
     def get_corp_access_token(self, corp_id, permanent_code):
+        return self._get_corp_access_token(corp_id, permanent_code)[0]
+
+    def _get_corp_access_token(self, corp_id, permanent_code):
         url = 'https://qyapi.weixin.qq.com/cgi-bin/service/get_corp_token?suite_access_token={}'.format(
             self.access_token
         )
-        data = requests.post(url, json={
+        data = self.transport.post(url, json={
             'auth_corpid': corp_id,
             'permanent_code': permanent_code,
         }).json()
         if 'access_token' not in data:
             raise GetAccessTokenError(data)
-        return data['access_token']
+        return data['access_token'], data['expires_in']
+
+    def get_corp_api(self, corp_id, permanent_code, agent_id):
+        """
+        获取授权企业的 api，其 access_token 通过 get_corp_token 获取并在过期后自动刷新
+        :param corp_id: 授权方企业id
+        :param permanent_code: 永久授权码
+        :param agent_id: 授权方应用id
+        :return: WorkWechatCorpAPI
+        """
+        api = WorkWechatCorpAPI(corp_id, permanent_code, agent_id, self.transport,
+                                helper=self.settings.HELPER, lease=self.settings.data.get('TOKEN_LEASE'),
+                                media_cache=self.settings.data.get('MEDIA_CACHE'),
+                                user_cache=self.settings.data.get('USER_CACHE'),
+                                response_cache=self.settings.data.get('RESPONSE_CACHE'))
+        api._get_access_token = lambda: self._get_corp_access_token(corp_id, permanent_code)
+        return api
 
     def get_corp_info(self, corp_id, permanent_code):
         """
@@ -315,7 +374,7 @@ class WorkWechatSuiteApi(BaseWechatAPI):
         url = 'https://qyapi.weixin.qq.com/cgi-bin/service/get_auth_info?suite_access_token={}'.format(
             self.access_token
         )
-        return requests.post(url, json={
+        return self.transport.post(url, json={
             'auth_corpid': corp_id,
             'permanent_code': permanent_code,
         }).json()
@@ -340,6 +399,7 @@ class WorkProviderWechatApi(BaseWechatAPI):
     def __init__(self, settings, wechat_api):
         self.wechat_api = wechat_api
         self.settings = settings
+        self.transport = create_transport(settings.data.get('TRANSPORT'))
         self._global_access_token = {'name': ('provider_access_token', 'provider_expires_time')}
 
     def get_login_url(self, login_path):
@@ -356,7 +416,7 @@ class WorkProviderWechatApi(BaseWechatAPI):
 
     def _get_access_token(self):
         url = 'https://qyapi.weixin.qq.com/cgi-bin/service/get_provider_token'
-        data = requests.post(url, json={
+        data = self.transport.post(url, json={
             'corpid': self.settings.CROP_ID,
             'provider_secret': self.settings.PROVIDER_SECRET
         }).json()
@@ -364,7 +424,7 @@ class WorkProviderWechatApi(BaseWechatAPI):
 
     def get_user_info(self, code):
         url = 'https://qyapi.weixin.qq.com/cgi-bin/service/get_login_info?access_token={}'.format(self.access_token)
-        data = requests.post(url, json={
+        data = self.transport.post(url, json={
             'auth_code': code,
         }).json()
         return WechatUser(data)